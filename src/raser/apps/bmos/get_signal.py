@@ -47,7 +47,7 @@ def get_signal(sensor):
 #     print(my_d.device)
 #     print(voltage)
     
-    my_f = devfield.DevsimField(my_d.device, my_d.dimension, voltage, my_d.read_out_contact, my_d.mesher, is_plugin=my_d.is_plugin(), irradiation_flux=my_d.irradiation_flux, bounds=my_d.bound,)
+    my_f = devfield.DevsimField(my_d.device, my_d.dimension, voltage, my_d.read_out_contact, my_d.mesher, is_plugin=my_d.is_plugin(), irradiation_flux=my_d.irradiation_flux, bounds=my_d.bound, e_field_mode=my_d.e_field_mode, cache_max_mb=my_d.field_cache_max_mb,)
 
     my_g4 = bmos.bmosG4Interaction(my_d)
 
@@ -0,0 +1,227 @@
+'''
+Description:  Bunch-train pile-up synthesis from in-memory single-primary crossing templates
+@Date       : 2026/10/18
+@version    : 1.0
+'''
+
+import os
+import re
+
+import numpy as np
+
+from raser.supports.output import output
+
+# 与 p1_sample 一致: 每个束团交叉平均击中数, 三列束团串, 每列 268 个束团, 间隔 600 ns
+AVERAGE_HITS = 3.06
+TRAIN_BUNCHES = 268
+BUNCH_SPACING = 600e-9
+TRAIN_STARTS = (0.0, 333373e-9, 666746e-9)
+DURATION = 1e-3
+T_BIN = 1e-10
+# 一次散射相加的最多样本数, 限制下标数组的内存
+ADD_CHUNK = 1 << 22
+
+_HEADER = re.compile(r"^(detector_[\w-]+):$")
+_CURRENT_FILE = re.compile(r"^(\d+)_(I|II)\.txt$")
+
+
+def bunch_times(train_bunches=TRAIN_BUNCHES, bunch_spacing=BUNCH_SPACING, train_starts=TRAIN_STARTS):
+    """束团交叉时刻 (s), 与 p1_sample 的 time_table 相同"""
+    bunches = np.arange(train_bunches) * bunch_spacing
+    return np.concatenate([start + bunches for start in train_starts])
+
+
+def rebin(samples, t_bin, new_t_bin):
+    """
+    Bin-averaged resampling of samples[j] (constant over [j t_bin, (j+1) t_bin)) onto new_t_bin
+    bins; the integrated charge is conserved
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    if len(samples) == 0:
+        return samples
+    charge = np.concatenate([[0.0], np.cumsum(samples) * t_bin])
+    n_bins = int(np.ceil(len(samples) * t_bin / new_t_bin * (1 - 1e-9)))
+    edges = np.arange(n_bins + 1) * new_t_bin
+    return np.diff(np.interp(edges, np.arange(len(samples) + 1) * t_bin, charge)) / new_t_bin
+
+
+class CrossingLibrary:
+    """
+    Description:
+        Recorded bunch crossings, each the per-pixel currents of all primaries of one crossing,
+        on one t_bin grid. The pixel currents of a crossing are the sum over its primaries;
+        the crossings with exactly one primary are the single-hit templates synthesise draws from
+    """
+    def __init__(self, t_bin=T_BIN):
+        self.t_bin = t_bin
+        self.primaries = []
+        self._crossings = []
+        self._blocks = {}
+
+    @property
+    def pixels(self):
+        return sorted({pixel for crossing in self._crossings for pixel in crossing})
+
+    @property
+    def recorded_mu(self):
+        """Mean primaries per recorded crossing"""
+        if not self.primaries:
+            raise ValueError("crossing library has no crossings")
+        return sum(self.primaries) / len(self.primaries)
+
+    def single_hits(self):
+        """Indices of the crossings with exactly one primary (including those hitting no pixel)"""
+        singles = np.flatnonzero(np.asarray(self.primaries) == 1)
+        if len(singles) == 0:
+            raise ValueError("crossing library has no single-primary crossings")
+        return singles
+
+    def add_crossing(self, primaries):
+        """A new crossing with that many primaries; returns its index"""
+        self.primaries.append(int(primaries))
+        self._crossings.append({})
+        self._blocks.clear()
+        return len(self._crossings) - 1
+
+    def add(self, crossing, pixel, samples, t_bin=None):
+        """Pixel current (A) of a crossing, samples[j] at j t_bin; other t_bin are bin-averaged"""
+        samples = np.asarray(samples, dtype=np.float64)
+        if t_bin is not None and not np.isclose(t_bin, self.t_bin, rtol=1e-6, atol=0):
+            samples = rebin(samples, t_bin, self.t_bin)
+        currents = self._crossings[crossing]
+        if pixel in currents:
+            total = np.zeros(max(len(currents[pixel]), len(samples)))
+            total[:len(currents[pixel])] += currents[pixel]
+            total[:len(samples)] += samples
+            samples = total
+        currents[pixel] = samples
+        self._blocks.pop(pixel, None)
+
+    def currents(self, pixel):
+        """(n_crossings, n_samples) 数组, 没有击中该像素的交叉为零, 较短的电流补零"""
+        if pixel not in self._blocks:
+            rows = [crossing.get(pixel, ()) for crossing in self._crossings]
+            block = np.zeros((len(rows), max(len(row) for row in rows)))
+            for k, samples in enumerate(rows):
+                block[k, :len(samples)] = samples
+            self._blocks[pixel] = block
+        return self._blocks[pixel]
+
+    @classmethod
+    def from_event_folders(cls, output_folder, t_bin=T_BIN):
+        """
+        Read the per-event current files written by get_current_p1 (event_i/<time>_I.txt,
+        event_i/<time>_II.txt) once. Every line of PossionHit.txt is one crossing whose
+        Poisson number of primaries (first column) went through one Geant4 event together;
+        crossings without an event folder are kept as empty ones
+        """
+        library = cls(t_bin)
+        with open(os.path.join(output_folder, "PossionHit.txt")) as f:
+            hits = [int(line.split()[0]) for line in f if line.strip()]
+        for i, primaries in enumerate(hits):
+            crossing = library.add_crossing(primaries)
+            event_folder = os.path.join(output_folder, f"event_{i}")
+            if not os.path.isdir(event_folder):
+                continue
+            for filename in sorted(os.listdir(event_folder)):
+                if _CURRENT_FILE.match(filename):
+                    for pixel, times, currents in read_current_blocks(os.path.join(event_folder, filename)):
+                        step = times[1] - times[0] if len(times) > 1 else t_bin
+                        library.add(crossing, pixel, currents, step)
+        return library
+
+
+def read_current_blocks(file_path):
+    """get_current_p1 的电流文本: "detector_<l>_<y>_<z>:" 行后接 "time current" 行"""
+    blocks = []
+    pixel, rows = None, []
+    with open(file_path) as f:
+        for line in f:
+            header = _HEADER.match(line.strip())
+            if header:
+                if pixel is not None:
+                    blocks.append((pixel, rows))
+                pixel, rows = header.group(1), []
+            elif pixel is not None and len(line.split()) == 2:
+                rows.append(line)
+    if pixel is not None:
+        blocks.append((pixel, rows))
+    result = []
+    for pixel, rows in blocks:
+        data = np.loadtxt(rows, ndmin=2) if rows else np.zeros((0, 2))
+        result.append((pixel, data[:, 0], data[:, 1]))
+    return result
+
+
+def add_shifted(buffer, starts, templates):
+    """buffer[starts[h] + j] += templates[h, j]; 超出 buffer 的部分丢弃"""
+    n_hits, length = templates.shape
+    per_chunk = max(1, ADD_CHUNK // max(length, 1))
+    offsets = np.arange(length)
+    for first in range(0, n_hits, per_chunk):
+        index = starts[first:first + per_chunk, None] + offsets
+        valid = index < len(buffer)
+        np.add.at(buffer, index[valid], templates[first:first + per_chunk][valid])
+
+
+def synthesise(library, mu, times=None, duration=DURATION, rng=None):
+    """
+    Bunch-train waveforms: per bunch crossing Poisson(mu) hits, each a randomly drawn
+    single-primary crossing of the library whose pixel currents are added at the crossing time.
+    Returns (waveforms (n_pixels, n_samples) float32 in A, hits (n_bunches,))
+    """
+    if times is None:
+        times = bunch_times()
+    if rng is None:
+        rng = np.random.default_rng()
+    pixels = library.pixels
+    singles = library.single_hits()
+    n_samples = int(round(duration / library.t_bin))
+    starts = np.rint(np.asarray(times) / library.t_bin).astype(np.int64)
+    hits = rng.poisson(mu, len(starts))
+    hit_starts = np.repeat(starts, hits)
+    templates = singles[rng.integers(len(singles), size=len(hit_starts))]
+    waveforms = np.zeros((len(pixels), n_samples), dtype=np.float32)
+    buffer = np.zeros(n_samples)
+    for p, pixel in enumerate(pixels):
+        currents = library.currents(pixel)
+        # 只散射击中了该像素的模板
+        hit = currents.any(axis=1)[templates]
+        buffer[:] = 0
+        add_shifted(buffer, hit_starts[hit], currents[templates[hit]])
+        waveforms[p] = buffer
+    return waveforms, hits
+
+
+def save_train(file_path, library, mu, times, waveforms, hits):
+    """单个 .npz 文件; 先写临时文件再改名"""
+    tmp_path = "{}.{}.tmp".format(file_path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            pixels=np.array(library.pixels),
+            t_bin=library.t_bin,
+            mu=mu,
+            bunch_times=np.asarray(times),
+            hits=hits,
+            waveforms=waveforms,
+        )
+    os.replace(tmp_path, file_path)
+
+
+def main(mu_values=None, seed=3020122):
+    """One bunch train per mu in mu_values (default AVERAGE_HITS), all from one library read"""
+    if mu_values is None:
+        mu_values = (AVERAGE_HITS,)
+    output_folder = output(__file__, "N0_3_4")
+    library = CrossingLibrary.from_event_folders(output_folder)
+    times = bunch_times()
+    rng = np.random.default_rng(seed)
+    for mu in mu_values:
+        waveforms, hits = synthesise(library, mu, times, rng=rng)
+        save_train(os.path.join(output_folder, f"pileup_mu_{mu:g}.npz"), library, mu, times, waveforms, hits)
+        # 与 DAQ_system_sim 相同的 1 ms 采样求和
+        sample_sum = waveforms.sum(axis=1, dtype=np.float64)
+        for pixel, value in zip(library.pixels, sample_sum):
+            print(f"mu {mu:g} {pixel}: {value}")
+        print(f"mu {mu:g} total sample value in 1ms: {sample_sum.sum()}")
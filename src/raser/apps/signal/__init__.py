@@ -18,6 +18,26 @@ def _command_tail(kwargs):
     )
 
 
+def job_worker(kwargs):
+    """Persistent local worker for indexed signal jobs, or None for one subprocess per job."""
+    if not kwargs.get("persistent_workers"):
+        return None
+    # same arguments a `--job` subprocess would see
+    job_kwargs = dict(kwargs, scan=None, signal_batch=False, job=None)
+    return (prepare_worker, run_worker_job, job_kwargs)
+
+
+def prepare_worker(kwargs):
+    runs.apply_run_config(kwargs)
+    from . import gen_signal_scan
+    return gen_signal_scan.prepare_job(kwargs)
+
+
+def run_worker_job(context, index):
+    from . import gen_signal_scan
+    gen_signal_scan.run_job(context, index)
+
+
 def _run_scan(kwargs):
     scan_number = kwargs['scan']
     mem = kwargs['mem']
@@ -33,6 +53,7 @@ def _run_scan(kwargs):
         use_cluster=use_cluster,
         mem=mem,
         destination=command_prefix[0],
+        worker=job_worker(kwargs),
     )
 
 
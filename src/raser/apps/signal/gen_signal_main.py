@@ -83,6 +83,8 @@ def main(kwargs):
         irradiation_flux=my_d.irradiation_flux,
         bounds=my_d.bound,
         field_set=kwargs["_field_set"],
+        e_field_mode=my_d.e_field_mode,
+        cache_max_mb=my_d.field_cache_max_mb,
     )
     if "lgad" in my_d.det_model:
         my_d.gain_rate_cal(my_f)
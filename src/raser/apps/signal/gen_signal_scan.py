@@ -13,6 +13,7 @@ import subprocess
 import json
 import random
 
+import numpy as np
 import ROOT
 ROOT.gROOT.SetBatch(True)
 
@@ -20,16 +21,19 @@ ELECTRON_CHARGE_C = 1.60217733e-19
 
 from raser.core.device import build_device as bdv
 from raser.core.interaction.interaction import GeneralG4Interaction
+from raser.core.interaction.deposit_store import G4DepositReplay, deposit_file, save_deposits
 from raser.core.field import devsim_field as devfield
 from raser.core.current import cal_current as ccrt
 from raser.core.current.cross_talk import cross_talk
 from raser.core.analog.readout import Amplifier
-from raser.core.metrics import waveform_stats
+from raser.core.metrics import batch_metrics
 from raser.supports.math import inversed_fast_fourier_transform as ifft
 from raser.supports.output import create_path
 from raser.supports.paths import component_path
 from raser.supports.paths import optional_component_path
+from raser.supports.paths import project_path
 from raser.supports import runs
+from raser.supports.waveform_columns import WaveformColumnSink, hist_bin_array
 from .experiments import apply_signal_experiment
 from .draw_save import draw_drift_path
 
@@ -66,17 +70,11 @@ def _event_stats_file_path(output_path, instance_number):
 
 
 def _hist_abs_max(hist):
-    max_value = 0.0
-    for bin_idx in range(1, hist.GetNbinsX() + 1):
-        max_value = max(max_value, abs(hist.GetBinContent(bin_idx)))
-    return max_value
+    return float(np.max(np.abs(hist_bin_array(hist, dtype=np.float64)), initial=0.0))
 
 
 def _hist_abs_integral(hist, t_bin):
-    charge = 0.0
-    for bin_idx in range(1, hist.GetNbinsX() + 1):
-        charge += abs(hist.GetBinContent(bin_idx)) * t_bin
-    return charge
+    return float(np.abs(hist_bin_array(hist, dtype=np.float64)).sum() * t_bin)
 
 
 def _daq_thresholds(my_d):
@@ -92,63 +90,18 @@ def _nan_number(value):
 
 
 def _amplified_metrics(ele_current, my_d, threshold, amplitude_threshold):
-    amplitudes = []
-    charges = []
-    toas = []
-    tots = []
-    cfd50s = []
+    waveforms = ele_current.amplified_waveforms[None, :my_d.read_ele_num]
+    n_bins, t_start, t_end = ele_current.waveform_axis
+    centers = t_start + (np.arange(n_bins) + 0.5) * (t_end - t_start) / n_bins
+    electrodes = batch_metrics.electrode_metrics(waveforms, centers, threshold, batch_metrics.CFD)
     row = {}
     for i in range(my_d.read_ele_num):
-        amplified_current = ele_current.amplified_currents[i]
-        amplitude, peak_bin = waveform_stats.get_amplitude(amplified_current)
-        if amplitude < threshold:
-            amplitude = 0
-            charge = 0
-            toa = None
-            tot = 0
-            cfd50 = None
-        else:
-            charge = waveform_stats.get_charge(amplified_current)
-            toa = waveform_stats.get_ToA(amplified_current, threshold, peak_bin)
-            tot = waveform_stats.get_ToT(amplified_current, threshold, peak_bin)
-            cfd50 = waveform_stats.get_CFD50(
-                amplified_current,
-                waveform_stats.CFD,
-                peak_bin,
-            )
-        amplitudes.append(amplitude)
-        charges.append(charge)
-        toas.append(toa)
-        tots.append(tot)
-        cfd50s.append(cfd50)
-        row["amplified_amplitude_%s"%(i)] = amplitude
-        row["amplified_charge_%s"%(i)] = charge
-        row["amplified_ToA_%s"%(i)] = _nan_number(toa)
-        row["amplified_ToT_%s"%(i)] = tot
-        row["amplified_CFD50_%s"%(i)] = _nan_number(cfd50)
-
-    if max(amplitudes) < amplitude_threshold:
-        row["amplified_amplitude"] = float("nan")
-        row["amplified_charge"] = float("nan")
-        row["amplified_ToA"] = float("nan")
-        row["amplified_ToT"] = float("nan")
-        row["amplified_CFD50"] = float("nan")
-    elif my_d.read_ele_num == 1:
-        row["amplified_amplitude"] = amplitudes[0]
-        row["amplified_charge"] = charges[0]
-        row["amplified_ToA"] = _nan_number(toas[0])
-        row["amplified_ToT"] = tots[0]
-        row["amplified_CFD50"] = _nan_number(cfd50s[0])
-    else:
-        row["amplified_amplitude"] = _nan_number(
-            waveform_stats.get_total_amp(amplitudes, amplitude_threshold)
-        )
-        row["amplified_charge"] = _nan_number(waveform_stats.get_total_amp(charges, 0.0))
-        row["amplified_ToA"] = _nan_number(waveform_stats.get_conjoined_time(toas))
-        row["amplified_ToT"] = _nan_number(waveform_stats.get_total_amp(tots, 10e-9))
-        row["amplified_CFD50"] = _nan_number(
-            waveform_stats.get_conjoined_time(cfd50s)
-        )
+        for name in ("amplitude", "charge", "ToA", "ToT", batch_metrics.CFD_LABEL):
+            row["amplified_%s_%s"%(name, i)] = float(electrodes[name][0, i])
+    # 事件级量只用到 ToA/ToT/amplitude/charge/CFD50, 与位置无关
+    event = batch_metrics.event_metrics(electrodes, amplitude_threshold, [0.0], 1.0)
+    for name in ("amplitude", "charge", "ToA", "ToT", batch_metrics.CFD_LABEL):
+        row["amplified_%s"%(name)] = float(event[name][0])
     return row
 
 
@@ -159,6 +112,7 @@ def _write_cce_event_stats(
     total_events,
     instance_number,
     output_path,
+    spice_mode="transient",
 ):
     start_n = instance_number * total_events
     end_n = (instance_number + 1) * total_events
@@ -212,7 +166,7 @@ def _write_cce_event_stats(
             keep_drift_paths=False,
         )
         if ("strip" in my_d.det_model or "pixel" in my_d.det_model) and my_d.cross_talk != None:
-            my_current.cross_talk_cu = cross_talk(my_d.det_name, my_d.cross_talk, my_current.sum_cu)
+            my_current.cross_talk_cu = cross_talk(my_d.det_name, my_d.cross_talk, my_current.sum_cu, spice_mode)
         else:
             my_current.cross_talk_cu = my_current.sum_cu
 
@@ -222,6 +176,7 @@ def _write_cce_event_stats(
             seed=event,
             CDet=my_d.capacitance,
             is_cut=True,
+            spice_mode=spice_mode,
         )
         par_in = my_g4.p_steps_current[my_g4.selected_batch_number][0]
         par_out = my_g4.p_steps_current[my_g4.selected_batch_number][-1]
@@ -289,6 +244,88 @@ def _draw_signal_sample(my_d, my_g4, my_f, my_current, ele_current, event, outpu
     ele_current.draw_waveform(my_current.cross_talk_cu, sample_path)
 
 
+def _signal_file_path(my_d, instance_number, output_path):
+    return os.path.join(
+        output_path,
+        "signal_"+
+        str(instance_number)+
+        str(my_d.voltage)+
+        str(my_d.irradiation_flux)+
+        str(my_d.bound)+
+        str(my_d.g4experiment)+
+        str(my_d.amplifier)+
+        ".root",
+    )
+
+
+def _event_signal(my_d, my_f, my_g4, event, start_n, keep_drift_paths, spice_mode="transient"):
+    my_current = ccrt.CalCurrentG4P(
+        my_d,
+        my_f,
+        my_g4,
+        event-start_n,
+        keep_drift_paths=keep_drift_paths,
+    )
+    if ("strip" in my_d.det_model or "pixel" in my_d.det_model) and my_d.cross_talk != None:
+        my_current.cross_talk_cu = cross_talk(my_d.det_name, my_d.cross_talk, my_current.sum_cu, spice_mode)
+    else:
+        my_current.cross_talk_cu = my_current.sum_cu
+    ele_current = Amplifier(
+        my_current.cross_talk_cu,
+        my_d.amplifier,
+        seed=event,
+        CDet=my_d.capacitance,
+        is_cut=True,
+        spice_mode=spice_mode,
+    )
+    return my_current, ele_current
+
+
+def _columnar_batch_loop(my_d, my_f, my_g4, start_n, end_n, plot_events, output_path, file_path, spice_mode="transient"):
+    """Same events as batch_loop, written through WaveformColumnSink while they are simulated"""
+    n_bins, time_start, time_end = _current_axis(my_d)
+    sink = WaveformColumnSink(
+        file_path,
+        my_d.read_ele_num,
+        n_bins,
+        time_start,
+        time_end,
+        run_info={
+            "voltage": my_d.voltage,
+            "irradiation_flux": my_d.irradiation_flux,
+            "g4experiment": my_d.g4experiment,
+            "amplifier": my_d.amplifier,
+        },
+    )
+    effective_number = 0
+    try:
+        for event in range(start_n,end_n):
+            print("run events number:%s"%(event))
+            if len(my_g4.p_steps[event-start_n]) <= 5:
+                continue
+            effective_number += 1
+            my_current, ele_current = _event_signal(
+                my_d, my_f, my_g4, event, start_n, event in plot_events, spice_mode,
+            )
+            if event in plot_events:
+                _draw_signal_sample(my_d, my_g4, my_f, my_current, ele_current, event, output_path)
+            sink.fill(
+                event,
+                my_g4.edep_devices[event-start_n],
+                my_g4.p_steps_current[my_g4.selected_batch_number][0],
+                my_g4.p_steps_current[my_g4.selected_batch_number][-1],
+                {
+                    "current": my_current.sum_cu,
+                    "cross_talked_current": my_current.cross_talk_cu,
+                    "amplified_waveform": ele_current.amplified_waveforms,
+                },
+            )
+    finally:
+        sink.close()
+    detection_efficiency =  effective_number/(end_n-start_n) 
+    print("detection_efficiency=%s"%detection_efficiency, flush=True)
+
+
 def batch_loop(
     my_d,
     my_f,
@@ -299,6 +336,8 @@ def batch_loop(
     output_path,
     store_waveforms=True,
     plot_samples=0,
+    waveform_format="th1f",
+    spice_mode="transient",
 ):
     """
     Description:
@@ -311,6 +350,12 @@ def batch_loop(
         end number of the event 
     detection_efficiency: float
         The ration of hit particles/total_particles           
+    waveform_format : str
+        "th1f": one TH1F branch per electrode and stage;
+        "columnar": float32 arrays per event and electrode (see supports.waveform_columns)
+    spice_mode : str
+        .cir amplifiers and cross talk: "transient" ngspice run per event or "linear"
+        convolution with the cached impulse responses
     @Returns:
     ---------
         None
@@ -326,6 +371,7 @@ def batch_loop(
             total_events,
             instance_number,
             output_path,
+            spice_mode,
         )
         return
 
@@ -335,6 +381,13 @@ def batch_loop(
     effective_number = 0
     plot_events = _sample_plot_events(start_n, end_n, plot_samples)
 
+    file_path = _signal_file_path(my_d, instance_number, output_path)
+    if waveform_format == "columnar":
+        _columnar_batch_loop(my_d, my_f, my_g4, start_n, end_n, plot_events, output_path, file_path, spice_mode)
+        return
+    if waveform_format != "th1f":
+        raise ValueError("Unsupported waveform_format: {}".format(waveform_format))
+
     # datas that varies in each event
 
     event_array = array('i', [0])
@@ -401,30 +454,10 @@ def batch_loop(
         print("run events number:%s"%(event))
         if len(my_g4.p_steps[event-start_n]) > 5:
             effective_number += 1
-            my_current = ccrt.CalCurrentG4P(
-                my_d,
-                my_f,
-                my_g4,
-                event-start_n,
-                keep_drift_paths=event in plot_events,
+            my_current, ele_current = _event_signal(
+                my_d, my_f, my_g4, event, start_n, event in plot_events, spice_mode,
             )
 
-            if ("strip" in my_d.det_model or "pixel" in my_d.det_model) and my_d.cross_talk != None:
-                my_current.cross_talk_cu = cross_talk(my_d.det_name, my_d.cross_talk, my_current.sum_cu)
-            else:
-                my_current.cross_talk_cu = my_current.sum_cu
-
-            if store_waveforms:
-                ele_current = Amplifier(
-                    my_current.cross_talk_cu,
-                    my_d.amplifier,
-                    seed=event,
-                    CDet=my_d.capacitance,
-                    is_cut=True,
-                )
-            else:
-                ele_current = None
-
             if event in plot_events:
                 _draw_signal_sample(
                     my_d,
@@ -457,22 +490,16 @@ def batch_loop(
     detection_efficiency =  effective_number/(end_n-start_n) 
     print("detection_efficiency=%s"%detection_efficiency, flush=True)
 
-    file_path = os.path.join(
-        output_path,
-        "signal_"+
-        str(instance_number)+
-        str(my_d.voltage)+
-        str(my_d.irradiation_flux)+
-        str(my_d.bound)+
-        str(my_d.g4experiment)+
-        str(my_d.amplifier)+
-        ".root",
-    )
     file = ROOT.TFile(file_path, "RECREATE")
     tree.Write()
     file.Close()
 
-def main(kwargs):
+def prepare_job(kwargs):
+    """
+    Description:
+        Load the detector and field once; the returned context can run
+        several job indices in the same process with run_job
+    """
     det_name = kwargs['det_name']
     my_d = bdv.Detector(det_name)
     apply_signal_experiment(my_d, kwargs)
@@ -505,19 +532,48 @@ def main(kwargs):
         irradiation_flux=my_d.irradiation_flux,
         bounds=my_d.bound,
         field_set=kwargs["_field_set"],
+        e_field_mode=my_d.e_field_mode,
+        cache_max_mb=my_d.field_cache_max_mb,
     )
     if "lgad" in my_d.det_model:
         my_d.gain_rate_cal(my_f)
+    return {"kwargs": kwargs, "my_d": my_d, "my_f": my_f, "my_g4": None}
+
+
+def run_job(context, job_number):
+    """
+    Description:
+        Simulate the events of one job index, reusing the detector, field
+        and Geant4 setup kept in the context by earlier jobs
+    """
+    kwargs = context["kwargs"]
+    my_d = context["my_d"]
+    my_f = context["my_f"]
 
     g4_dic = my_d.g4_config
     total_events = int(g4_dic['total_events'])
 
-    job_number = kwargs['job']
     instance_number = job_number
 
     g4_seed = instance_number * total_events
     random.seed(g4_seed)
-    my_g4 = GeneralG4Interaction(my_d, my_d.g4_config, g4_seed, kwargs.get("g4_vis", False))
+    deposits = None
+    if kwargs.get("reuse_g4_deposits") and not kwargs.get("g4_vis"):
+        cache_path = project_path("g4_deposits")
+        create_path(cache_path)
+        deposits = deposit_file(cache_path, my_d, g4_dic, g4_seed)
+    if deposits is not None and os.path.exists(deposits):
+        print("Replaying Geant4 deposits from %s"%deposits)
+        my_g4 = G4DepositReplay(my_d, g4_dic, deposits)
+    else:
+        my_g4 = context["my_g4"]
+        if my_g4 is None:
+            my_g4 = GeneralG4Interaction(my_d, my_d.g4_config, g4_seed, kwargs.get("g4_vis", False))
+            context["my_g4"] = my_g4
+        else:
+            my_g4.beam_on(g4_seed)
+        if deposits is not None:
+            save_deposits(deposits, my_g4, my_d, g4_seed)
 
     ele_json = optional_component_path(
         "electronics", "analog", my_d.amplifier + ".json"
@@ -554,8 +610,14 @@ def main(kwargs):
         kwargs["_run_batch_path"],
         store_waveforms=store_waveforms,
         plot_samples=kwargs.get("_signal_plot_samples", 0),
+        waveform_format=kwargs.get("waveform_format") or "th1f",
+        spice_mode=kwargs.get("spice_mode") or "transient",
     )
+
+
+def main(kwargs):
+    context = prepare_job(kwargs)
+    run_job(context, kwargs['job'])
     sys.stdout.flush()
     sys.stderr.flush()
     os._exit(0)
-    del my_g4
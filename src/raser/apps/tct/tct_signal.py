@@ -69,7 +69,7 @@ def main(kwargs):
     else:
         amplifier = my_d.amplifier
 
-    my_f = devfield.DevsimField(my_d.device, my_d.dimension, voltage, my_d.read_out_contact, my_d.mesher, is_plugin=my_d.is_plugin(), irradiation_flux=my_d.irradiation_flux, bounds=my_d.bound,)
+    my_f = devfield.DevsimField(my_d.device, my_d.dimension, voltage, my_d.read_out_contact, my_d.mesher, is_plugin=my_d.is_plugin(), irradiation_flux=my_d.irradiation_flux, bounds=my_d.bound, e_field_mode=my_d.e_field_mode, cache_max_mb=my_d.field_cache_max_mb,)
     if "lgad" in my_d.det_model:
         my_d.gain_rate_cal(my_f)
     my_l = LaserInjection(my_d, laser_dic)
@@ -25,111 +25,46 @@ from raser.core.analog.readout import Amplifier
 from ..signal import draw_save
 from raser.supports.output import output
 from raser.supports.paths import component_path
-from raser.supports.paths import project_path
 from raser.supports.root_tree import root_tree_to_csv as rt2csv
 
 from raser.core.interaction.laser import LaserInjection
 
-def is_number(s):
+def scan_positions(laser_dic):
+    """激光扫描点 (序号, fx_rel), 跳过 0.428<fx_rel<0.5714 的区间"""
+    positions = []
+    for i in range(laser_dic['pos_points_num']+1):
+        fx_rel = (laser_dic["pos_start_fx"]+(laser_dic["pos_end_fx"]-laser_dic["pos_start_fx"])/laser_dic["pos_points_num"]*i
+        )
+        if (fx_rel>0.428) and (fx_rel<0.5714):
+            continue
+        positions.append((i, fx_rel))
+    return positions
+
+def max_amplitudes(ele_current):
+    """每个读出电极放大后波形的最大幅度 |V|"""
+    return np.max(np.abs(ele_current.amplified_waveforms), axis=1).tolist()
+
+def position_scan(input_file, pos_scan):
     """
-    Define the input s is number or not.
-    if Yes, return True, else return False.
-    """ 
-    try:
-        float(s)
-        return True
-    except ValueError:
-        pass
-    try:
-        import unicodedata
-        unicodedata.numeric(s)
-        return True
-    except (TypeError, ValueError):
-        pass
-    return False
-
-def position_scan(kwargs,my_l,laser_dic,effective_pos_num):
-    input_file = str(project_path("tct", my_l.model+'position'))
-    # 根据strip电极条数+1确定数字形状
-    pos_scan_pos = []
-    pos_scan_strip1 =[]
-    pos_scan_strip2 =[]
-    pos_scan_strip3 =[]
-    for root,dirs,files in os.walk(input_file):
-        for i in range(laser_dic['pos_points_num']+1):
-            for file in files:
-                # pos_scan[i][0] = laser_dic["pos_start_fx"]+(laser_dic["pos_end_fx"]-laser_dic["pos_start_fx"])/laser_dic["pos_points_num"]*i
-                if ('.csv' in file) and(('pos'+str(i)+'_') in file):
-                    if'No_0' in file:    
-                        path = os.path.join(input_file, file)
-                        list_c = []
-                        with open(path, 'r') as file_in: 
-                            for line in file_in:
-                                if not (is_number(line.split(",")[0])):
-                                    continue
-                                list_c.append(line)
-                        if len(list_c)>5:
-                            ampl_signal_list = []
-                            for j in range (0,len(list_c)):
-                                ampl_s=abs(float(list(filter(None,list_c[j].split(",")))[1]))
-                                ampl_signal_list.append(ampl_s)
-                            max_signal_height=max(ampl_signal_list)
-                            pos_scan_strip1.append(max_signal_height)
-                            for s in range(1):
-                                pos_scan_pos.append(round(420*(laser_dic["pos_start_fx"]+(laser_dic["pos_end_fx"]-laser_dic["pos_start_fx"])/laser_dic["pos_points_num"]*i),2,))
-                    elif'No_1' in file:
-                        path = os.path.join(input_file, file)
-                        list_c = []
-                        with open(path, 'r') as file_in: 
-                            for line in file_in:
-                                if not (is_number(line.split(",")[0])):
-                                    continue
-                                list_c.append(line)
-                        if len(list_c)>5:
-                            ampl_signal_list = []
-                            for j in range (0,len(list_c)):
-                                ampl_s=abs(float(list(filter(None,list_c[j].split(",")))[1]))
-                                ampl_signal_list.append(ampl_s)
-                            max_signal_height=max(ampl_signal_list)
-                            pos_scan_strip2.append(max_signal_height)
-
-                    elif'No_2' in file:
-                        path = os.path.join(input_file, file)
-                        list_c = []
-                        with open(path, 'r') as file_in: 
-                            for line in file_in:
-                                if not (is_number(line.split(",")[0])):
-                                    continue
-                                list_c.append(line)
-                        if len(list_c)>5:
-                            ampl_signal_list = []
-                            for j in range (0,len(list_c)):
-                                ampl_s=abs(float(list(filter(None,list_c[j].split(",")))[1]))
-                                ampl_signal_list.append(ampl_s)
-                            max_signal_height=max(ampl_signal_list)
-                            pos_scan_strip3.append(max_signal_height)
-    pos_scan = np.column_stack((pos_scan_pos,  pos_scan_strip1, pos_scan_strip2, pos_scan_strip3))
+    把扫描结果写成一张表 position-scan.root / .csv
+    列: position_um, volt0_mV, volt1_mV, ... (每个读出电极一列)
+    """
+    pos_scan = np.asarray(pos_scan, dtype=np.float64)
     pos = array('d', [0.0])
-    volt_No_0 = array('d', [0.0])
-    volt_No_1 = array('d', [0.0])
-    volt_No_2 = array('d', [0.0])
+    volts = [array('d', [0.0]) for _ in range(pos_scan.shape[1]-1)]
     tree_file_name = os.path.join(input_file, "position-scan") +".root"
     csv_file_name = os.path.join(input_file, "position-scan") + ".csv"
-    
+
     tree_file = ROOT.TFile(tree_file_name, "RECREATE")
     t_out = ROOT.TTree("tree", "signal")
     t_out.Branch("position_um", pos, "position_um/D")
-    t_out.Branch("volt0_mV", volt_No_0 , "volt0_mV/D")
-    t_out.Branch("volt1_mV", volt_No_1 , "volt1_mV/D")
-    t_out.Branch("volt2_mV", volt_No_2 , "volt2_mV/D")
+    for j, volt in enumerate(volts):
+        t_out.Branch("volt%d_mV"%j, volt, "volt%d_mV/D"%j)
 
-    for i in range(pos_scan.shape[0]):
-        pos[0]=pos_scan[i][0]
-        # pos[0]=round(pos_scan[i][0]*420,1)
-        volt_No_0[0] = pos_scan[i][1]
-        volt_No_1[0] = pos_scan[i][2]
-        volt_No_2[0] = pos_scan[i][3]
-        # print(f"Writing: {pos[0]}, {volt_No_0[0]}, {volt_No_1[0]}, {volt_No_2[0]}")
+    for row in pos_scan:
+        pos[0] = row[0]
+        for j, volt in enumerate(volts):
+            volt[0] = row[j+1]
         t_out.Fill()
     tree_file.Write()
     tree_file.Close()
@@ -227,51 +162,42 @@ def job_main(kwargs):
     else:
         voltage = my_d.voltage
 
+    if kwargs['amplifier'] != None:
+        amplifier = kwargs['amplifier']
+    else:
+        amplifier = my_d.amplifier
+
     if kwargs['laser'] != None:
         laser = kwargs['laser']
         laser_json = component_path("source", "laser", laser + ".json")
         with open(laser_json) as f:
             laser_dic = json.load(f)
             print(laser_dic)
-            effective_pos_num = 0
-            for i in range(laser_dic['pos_points_num']+1):
-                laser_dic["fx_rel"]= (laser_dic["pos_start_fx"]+(laser_dic["pos_end_fx"]-laser_dic["pos_start_fx"])/laser_dic["pos_points_num"]*i
-                )
-                if (laser_dic["fx_rel"]>0.428) and  (laser_dic["fx_rel"]<0.5714):
-                    pass
-                else:
-                    print(laser_dic["fx_rel"])
-                    effective_pos_num = effective_pos_num +1
-                    if kwargs['amplifier'] != None:
-                        amplifier = kwargs['amplifier']
-                    else:
-                        amplifier = my_d.amplifier
-
-                    my_f = devfield.DevsimField(my_d.device, my_d.dimension, voltage, my_d.read_out_contact, my_d.mesher, is_plugin=my_d.is_plugin(), irradiation_flux=my_d.irradiation_flux, bounds=my_d.bound,)
-                    if "lgad" in my_d.det_model:
-                        my_d.gain_rate_cal(my_f)
-                    my_l = LaserInjection(my_d, laser_dic)
-
-                    my_current = ccrt.CalCurrentLaser(my_d, my_f, my_l)
-                    path = output(__file__, my_l.model+'position')
-
-                    ele_current = Amplifier(my_current.sum_cu, amplifier, CDet=my_d.capacitance)
-                    if kwargs['scan'] != None: #assume parameter alter
-                        # key = my_l.fz_rel
-                        tag = 'pos'+str(i)+'_'+'job'+str(kwargs['job'])
-                        ele_current.save_signal_TTree(path, tag)
-                    else:
-                        my_current.draw_currents(path) # Draw current
-                        ele_current.draw_waveform(my_current.sum_cu, path) # Draw waveform
-
-                        my_l.draw_nocarrier3D(path)
-                        my_l.draw_nocarrier2D(path)
-                    
-            print('successfully')
     else:
         # TCT must be with laser
         raise NameError
-    pos_scan = position_scan(kwargs,my_l,laser_dic,effective_pos_num)
+
+    # 场、插值器和缓存只与偏压有关, 每个偏压只建一次, 所有激光位置共享
+    my_f = devfield.DevsimField(my_d.device, my_d.dimension, voltage, my_d.read_out_contact, my_d.mesher, is_plugin=my_d.is_plugin(), irradiation_flux=my_d.irradiation_flux, bounds=my_d.bound, e_field_mode=my_d.e_field_mode, cache_max_mb=my_d.field_cache_max_mb,)
+    if "lgad" in my_d.det_model:
+        my_d.gain_rate_cal(my_f)
+    path = output(__file__, laser_dic["laser_model"]+'position')
+
+    pos_scan = []
+    for i, fx_rel in scan_positions(laser_dic):
+        print(fx_rel)
+        my_l = LaserInjection(my_d, dict(laser_dic, fx_rel=fx_rel))
+        my_current = ccrt.CalCurrentLaser(my_d, my_f, my_l)
+        ele_current = Amplifier(my_current.sum_cu, amplifier, CDet=my_d.capacitance)
+        pos_scan.append([round(420*fx_rel, 2)] + max_amplitudes(ele_current))
+        if kwargs['scan'] == None:
+            my_current.draw_currents(path) # Draw current
+            ele_current.draw_waveform(my_current.sum_cu, path) # Draw waveform
+
+            my_l.draw_nocarrier3D(path)
+            my_l.draw_nocarrier2D(path)
+    print('successfully')
+    pos_scan = position_scan(path, pos_scan)
 
     if (np.where(pos_scan[:, 0]>=120)[0].size > 0) and (np.where(pos_scan[:, 0]<=180)[0].size > 0):
         start_gap1 = np.where(pos_scan[:, 0]>120)[0][0]
@@ -299,8 +225,7 @@ def job_main(kwargs):
     error_data = np.concatenate((error_gap1, error_gap2))
 
 
-    output_file = str(project_path("tct", my_l.model+'position'))
-    draw_2D_position_error(error_data,output_file)
+    draw_2D_position_error(error_data,path)
 
 
 def main(kwargs):
@@ -0,0 +1,112 @@
+'''
+Description:  Connected-component clustering of pixel hits for all events of a run at once
+@Date       : 2026/10/18
+@version    : 1.0
+'''
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+EPSINON = 0.0000001
+
+
+def neighbour_offsets(pixelsize_x, pixelsize_y):
+    """
+    与 island 的判据一致: 两个像素中心距离的平方不超过 pixelsize_x**2+pixelsize_y**2 即相连
+    只返回正向一半的 (dcolumn, drow), 方形像素即 8 邻接
+    """
+    limit = pixelsize_x**2 + pixelsize_y**2 + EPSINON
+    reach_x = int(np.sqrt(limit) // pixelsize_x)
+    reach_y = int(np.sqrt(limit) // pixelsize_y)
+    offsets = []
+    for dx in range(0, reach_x + 1):
+        for dy in range(-reach_y, reach_y + 1):
+            if (dx, dy) <= (0, 0):
+                continue
+            if (dx*pixelsize_x)**2 + (dy*pixelsize_y)**2 <= limit:
+                offsets.append((dx, dy))
+    return offsets
+
+
+def label_hits(group, column, row, offsets):
+    """
+    每个击中的团编号, 形状 (n_hits,)
+    group 区分互不相连的击中集合 (如事件 x 层); 击中按 (group, column, row) 排序后,
+    团按其第一个击中的先后编号, 与 island 深度优先搜索的团顺序相同
+    """
+    group = np.asarray(group, dtype=np.int64)
+    column = np.asarray(column, dtype=np.int64)
+    row = np.asarray(row, dtype=np.int64)
+    n_hits = len(group)
+    if n_hits == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # 把 (group, column, row) 编成一个整数, 四周各留出最大偏移, 偏移不会跨到别的 group 或列
+    pad_x = max([abs(dx) for dx, _ in offsets] + [0])
+    pad_y = max([abs(dy) for _, dy in offsets] + [0])
+    column = column - column.min() + pad_x
+    row = row - row.min() + pad_y
+    height = int(row.max()) + pad_y + 1
+    width = int(column.max()) + pad_x + 1
+    keys = (group * width + column) * height + row
+
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    # 同一像素的重复击中先连到该像素的第一个击中
+    pixel_start = np.searchsorted(sorted_keys, sorted_keys, side="left")
+    sources = [np.arange(n_hits)]
+    targets = [pixel_start]
+    for dx, dy in offsets:
+        wanted = sorted_keys + dx*height + dy
+        position = np.minimum(np.searchsorted(sorted_keys, wanted), n_hits - 1)
+        found = sorted_keys[position] == wanted
+        sources.append(np.flatnonzero(found))
+        targets.append(position[found])
+    sources = np.concatenate(sources)
+    targets = np.concatenate(targets)
+    graph = coo_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(n_hits, n_hits))
+    n_clusters, sorted_labels = connected_components(graph, directed=False)
+
+    # 按团中第一个 (排序后) 击中重新编号
+    first = np.full(n_clusters, n_hits, dtype=np.int64)
+    np.minimum.at(first, sorted_labels, np.arange(n_hits))
+    rank = np.empty(n_clusters, dtype=np.int64)
+    rank[np.argsort(first, kind="stable")] = np.arange(n_clusters)
+    labels = np.empty(n_hits, dtype=np.int64)
+    labels[order] = rank[sorted_labels]
+    return labels
+
+
+def cluster_hits(group, column, row, charge=None, pixelsize_x=1.0, pixelsize_y=1.0):
+    """
+    所有事件所有层的击中一次成团, column/row 为像素号
+    返回每个团一项的数组: group, size, charge, center_x/center_y (击中位置平均),
+    charge_center_x/charge_center_y (电荷加权), 位置单位与 pixelsize 相同, 取像素中心;
+    以及每个击中所属团的 hit_label. 团按 group 再按第一个击中排列
+    """
+    column = np.asarray(column, dtype=np.int64)
+    row = np.asarray(row, dtype=np.int64)
+    group = np.asarray(group, dtype=np.int64)
+    charge = np.ones(len(column)) if charge is None else np.asarray(charge, dtype=np.float64)
+
+    labels = label_hits(group, column, row, neighbour_offsets(pixelsize_x, pixelsize_y))
+    n_clusters = int(labels.max()) + 1 if len(labels) else 0
+    x = (column + 0.5) * pixelsize_x
+    y = (row + 0.5) * pixelsize_y
+
+    size = np.bincount(labels, minlength=n_clusters)
+    total = np.bincount(labels, weights=charge, minlength=n_clusters)
+    cluster_group = np.zeros(n_clusters, dtype=np.int64)
+    cluster_group[labels] = group
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "hit_label": labels,
+            "group": cluster_group,
+            "size": size,
+            "charge": total,
+            "center_x": np.bincount(labels, weights=x, minlength=n_clusters) / size,
+            "center_y": np.bincount(labels, weights=y, minlength=n_clusters) / size,
+            "charge_center_x": np.bincount(labels, weights=charge*x, minlength=n_clusters) / total,
+            "charge_center_y": np.bincount(labels, weights=charge*y, minlength=n_clusters) / total,
+        }
@@ -18,6 +18,8 @@ import numpy as np
 from raser.core.interaction.g4_telescope import TelescopeG4Interaction
 from raser.core.device.build_device import Detector
 from raser.core.current.cal_current_diffuse import CalCurrentDiffuse
+from raser.apps.telescope.clustering import cluster_hits
+from raser.apps.telescope.tracking import leave_one_out_residuals, select_tracks
 from raser.supports.output import create_path
 from raser.supports.output import output
 
@@ -57,7 +59,9 @@ class Telescope:
         #IO and mid paras
         self.Clusters = []
         self.Clustersize = []
+        self.ChargeClusters = []
         self.HitsID = []    # [ {0:[[i,j],[i2,j2]], ...}, ...]
+        self.HitsCharge = []    # [ {0:[q,q2], ...}, ...]
         self.Hits = []      
         self.Chisquare = []
         self.Residual = {}
@@ -86,68 +90,48 @@ class Telescope:
     def readdata(self,my_c):
         for evt in my_c.event:
             hitID = {}
+            hitCharge = {}
             for layer in evt:
                 t_d = evt[layer]
                 if layer not in hitID:
                     hitID[layer] = []
+                    hitCharge[layer] = []
                 for i in range(len(t_d['index'])):
                     if t_d['charge'][i] >= self.seedcharge:
                         hitID[layer].append(t_d['index'][i])
+                        hitCharge[layer].append(t_d['charge'][i])
             self.HitsID.append(hitID)
+            self.HitsCharge.append(hitCharge)
         self._postransform(self.HitsID,self.Hits)
         #print(self.HitsID)
         #print(self.Hits)
         
-    #find the cluster from planes hit
+    #find the cluster from planes hit, all events and layers labelled at once
     def cluster(self,Hits,Clusters,Clustersize):
+        groups = []
+        t_group, t_column, t_row, t_charge = [], [], [], []
+        for evt_id,t_Hit in enumerate(Hits):
+            for layer in t_Hit:
+                t_group.append(np.full(len(t_Hit[layer]), len(groups)))
+                t_column.append(np.rint(np.array([point[0] for point in t_Hit[layer]])/self.pixelsize_x - 0.5))
+                t_row.append(np.rint(np.array([point[1] for point in t_Hit[layer]])/self.pixelsize_y - 0.5))
+                t_charge.append(np.asarray(self.HitsCharge[evt_id][layer], dtype=np.float64))
+                groups.append((evt_id, layer))
+        if groups:
+            clusters = cluster_hits(np.concatenate(t_group), np.concatenate(t_column), np.concatenate(t_row),
+                                    np.concatenate(t_charge), self.pixelsize_x, self.pixelsize_y)
+            bounds = np.searchsorted(clusters["group"], np.arange(len(groups) + 1))
+        
         for t_Hit in Hits:
-            t_Clusters = {}
-            t_Clustersize = {}
-            for layer in  t_Hit:
-                t_island = island(t_Hit[layer],self.pixelsize_x,self.pixelsize_y)
-                t_Clusters[layer] = t_island.getcluster()
-                t_Clustersize[layer] = t_island.getclustersize()
-            Clusters.append(t_Clusters)
-            Clustersize.append(t_Clustersize)        
+            Clusters.append({})
+            Clustersize.append({})
+            self.ChargeClusters.append({})
+        for i,(evt_id,layer) in enumerate(groups):
+            t_slice = slice(bounds[i], bounds[i+1])
+            Clusters[evt_id][layer] = np.stack([clusters["center_x"][t_slice], clusters["center_y"][t_slice]], axis=1).tolist()
+            Clustersize[evt_id][layer] = clusters["size"][t_slice].tolist()
+            self.ChargeClusters[evt_id][layer] = np.stack([clusters["charge_center_x"][t_slice], clusters["charge_center_y"][t_slice]], axis=1).tolist()
     
-    #fit the track , get the residual of DUTs
-    def fit(self,pos_x,pos_y,pos_z):
-        #fit with root
-        graphx = ROOT.TGraph()
-        graphy = ROOT.TGraph()
-        for i in range(len(pos_z)):
-            graphx.SetPoint(i,pos_z[i],pos_x[i])
-            graphy.SetPoint(i,pos_z[i],pos_y[i])
-        fitFunc = ROOT.TF1("fitFunc", "[0] + [1]*x", 0, 300000)  # y = a + bx
-        fitFunc.SetParameters(400*25, 0)
-        
-        graphx.Fit(fitFunc,"Q")
-        intercept_x = fitFunc.GetParameter(0)
-        slope_x = fitFunc.GetParameter(1)
-        
-        graphy.Fit(fitFunc,"Q")
-        intercept_y = fitFunc.GetParameter(0)
-        slope_y = fitFunc.GetParameter(1)
-        
-        '''
-        canvas = ROOT.TCanvas("canvas", "TGraph", 800, 600)
-        graphx.SetMarkerStyle(ROOT.kFullCircle)
-        graphx.Draw()
-        
-        
-        Name = "fit"+str(DUT)
-        now = time.strftime("%Y_%m%d_%H%M")
-        path = output(__file__, "taichu_v1", str(now))
-        #print(path)
-        
-        """ If the path does not exit, create the path"""
-        if not os.access(path, os.F_OK):
-            os.makedirs(path) 
-        
-        canvas.SaveAs(os.path.join(path, Name+".png"))
-        '''
-        return slope_x,intercept_x,slope_y,intercept_y
-        
     #find the least square track
     def tracking(self):
         pass
@@ -248,136 +232,38 @@ class Telescope:
         
         for layer in range(len(t_size)):
             AveClustersize[layer] = float(sum(t_size[layer]))/len(t_size[layer])
-    #reconstruction loop over each event
+    #reconstruction of all events at once, unbiased residual of each DUT from the other layers' fit
     def _res_loop(self,Clusters,Residual,Chisquare):
-        self.count = 0
-        self.multi_cluster = 0
-        for evt in Clusters:       
-            if self.count % 1000 == 0:
-                print("Excuate process:",self.count,"/",len(Clusters))
-            self.count+=1
-            #tracking
-            #simple choose of track, only 1 cluster all layer evt considered
-            if len(evt)!=len(self.layer_z):
-                self.multi_cluster+=1
-                continue
-            else:
-                flag = 0
-                for layer in evt:
-                    if len(evt[layer])!=1:
-                        flag = 1
-                        break
-                if flag == 1:
-                    continue
-            #fill the cluster_dict,after tracking, cluster_dict[layer]'s len must == 1
-            cluster_dict = evt
-            for layer in cluster_dict:
-                if len(cluster_dict[layer]) != 1 :
-                    print("Erro:layer's len isn't 1 after tracking")
-                    raise
-            #fit the evt
-            chisquare = 0 
-            for DUT in cluster_dict:
-                pos_x = []
-                pos_y = []
-                pos_z = []
-                for layer in cluster_dict:
-                    if layer == DUT:
-                        continue
-                    for point in cluster_dict[layer]:
-                        pos_x.append(point[0])
-                        pos_y.append(point[1])
-                    pos_z.append(self.layer_z[layer])
-                kx,bx,ky,by = self.fit(pos_x,pos_y,pos_z)
-                
-                residualx = ( kx*(self.layer_z[DUT]+self.pixelsize_z/2)+bx-cluster_dict[DUT][0][0]
-                )
-                residualy = ( ky*(self.layer_z[DUT]+self.pixelsize_z/2)+by-cluster_dict[DUT][0][1]
-                )
-                if DUT not in Residual:
-                    Residual[DUT] = []
-                    #self.kvalue[DUT] = []
-                Residual[DUT].append([residualx,residualy])
-                #self.kvalue[DUT].append([kx,ky])
-                
-                chisquare += (residualx**2/(self.pixelsize_x**2/12))+(residualy**2/(self.pixelsize_y**2/12))
-                
-            Chisquare.append(chisquare)
+        N = len(self.layer_z)
+        sigma = [self.pixelsize_x/np.sqrt(12), self.pixelsize_y/np.sqrt(12)]
+        #tracking, multi cluster layers take the combination with the best straight line
+        positions, mask, _ = select_tracks(Clusters, self.layer_z, sigma)
+        #only evts with a cluster on every layer considered
+        full = mask.all(axis=1)
+        self.count = len(Clusters)
+        self.multi_cluster = len(Clusters) - int(full.sum())
+        
+        residual, chisquare = leave_one_out_residuals(positions[full], self.layer_z, mask[full], sigma, self.pixelsize_z/2)
+        for DUT in range(N if full.any() else 0):
+            if DUT not in Residual:
+                Residual[DUT] = []
+            Residual[DUT].extend(residual[:, DUT].tolist())
+        Chisquare.extend(chisquare.tolist())
 
-#find the clusters from hit list, named by the classic dfs sample
+#find the clusters from one hit list, same clusters as Telescope.cluster
 class island:
     def __init__(self,hitlist,pixelsize_x,pixelsize_y):
-        self.EPSINON = 0.0000001
         self.pixelsize_x = pixelsize_x
         self.pixelsize_y = pixelsize_y
-        self.clusterlist = []
-        self.clustersize = []   
-        self.numOfislands =0
-           
         self.t_island = hitlist
-        island_tag = set()
-        t_island_id = []
-        
         self.t_island.sort(key=lambda point: (point[0], point[1]))
-
-        numid = 0
-        if self.t_island:
-            t_island_id.append([0])
-
-        for i in range(1, len(self.t_island)):
-            if self.t_island[i][0] != self.t_island[i - 1][0]:
-                t_island_id.append([i])
-                numid += 1
-            else:
-                t_island_id[numid].append(i)    
-
-        for i in range(len(t_island_id)):
-            for j in range(len(t_island_id[i])):
-                if t_island_id[i][j] not in island_tag:
-                    x, y, n = self.dfs(island_tag, t_island_id, i, j,0.0,0.0,0)
-                    self.numOfislands += 1
-                    self.clusterlist.append([x / n,y / n])
-                    self.clustersize.append(n)
-    
-    def dfs(self,t_set,id,i,j,xi,yi,ni):
-        x,y,n = xi,yi,ni
-        if not self.inArea(id, i, j):
-            return x,y,n
-        if id[i][j] in t_set:
-            return x,y,n
-        
-        t_set.add(id[i][j])
-        x += self.t_island[id[i][j]][0]
-        y += self.t_island[id[i][j]][1]
-        n += 1
-        
-        if self.inLink(id, i, j, i, j + 1):
-            x,y,n = self.dfs(t_set, id, i, j + 1, x, y, n)  # up
-        if self.inLink(id, i, j, i, j - 1):
-            x,y,n = self.dfs(t_set, id, i, j - 1, x, y, n)  # down
-        
-        if self.inArea(id, i - 1, 0):
-            for k in range(len(id[i - 1])):
-                if self.inLink(id, i, j, i - 1, k):
-                    x,y,n = self.dfs(t_set, id, i - 1, k, x, y, n)  # l
         
-        if self.inArea(id, i + 1, 0):
-            for k in range(len(id[i + 1])):
-                if self.inLink(id, i, j, i + 1, k):
-                    x,y,n = self.dfs(t_set, id, i + 1, k, x, y, n)  # r
-
-        return x,y,n
-    
-    def inArea(self,id,i,j):
-        return 0 <= i < len(id) and 0 <= j < len(id[i])
-    
-    def inLink(self,id,i,j,ii,jj):
-        if not self.inArea(id, i, j) or not self.inArea(id, ii, jj):
-            return False
-        x = self.t_island[id[i][j]][0] - self.t_island[id[ii][jj]][0]
-        y = self.t_island[id[i][j]][1] - self.t_island[id[ii][jj]][1]
-        # criterion
-        return x ** 2 + y ** 2 <= self.pixelsize_x ** 2 + self.pixelsize_y ** 2 + self.EPSINON
+        column = np.rint(np.array([point[0] for point in self.t_island])/pixelsize_x - 0.5)
+        row = np.rint(np.array([point[1] for point in self.t_island])/pixelsize_y - 0.5)
+        clusters = cluster_hits(np.zeros(len(self.t_island)), column, row, None, pixelsize_x, pixelsize_y)
+        self.clusterlist = np.stack([clusters["center_x"], clusters["center_y"]], axis=1).tolist()
+        self.clustersize = clusters["size"].tolist()
+        self.numOfislands = len(self.clustersize)
     
     def getcluster(self):
         return self.clusterlist
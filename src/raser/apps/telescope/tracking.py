@@ -0,0 +1,120 @@
+'''
+Description:  Closed-form straight-line track fits over (events, layers, 2) cluster positions
+@Date       : 2026/10/18
+@version    : 1.0
+'''
+
+import itertools
+
+import numpy as np
+
+# 单个事件最多枚举的团组合数, 超过的事件不参与重建
+MAX_COMBINATIONS = 4096
+
+
+def _line_sums(positions, z, weights):
+    """沿层求最小二乘所需的和, z 形状 (L,), weights 形状 (E, L)"""
+    s = weights.sum(axis=-1)
+    sz = (weights * z).sum(axis=-1)
+    szz = (weights * z**2).sum(axis=-1)
+    sp = (weights[..., None] * positions).sum(axis=-2)
+    szp = (weights[..., None] * z[:, None] * positions).sum(axis=-2)
+    return s, sz, szz, sp, szp
+
+
+def _solve(s, sz, szz, sp, szp):
+    """由和求斜率与截距, 有效层少于两层 (或 z 全相同) 时为 NaN"""
+    denom = s * szz - sz**2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (s[..., None] * szp - sz[..., None] * sp) / denom[..., None]
+        intercept = (sp - slope * sz[..., None]) / s[..., None]
+    bad = ~(np.abs(denom) > 0)
+    slope[bad] = np.nan
+    intercept[bad] = np.nan
+    return slope, intercept
+
+
+def track_chisquare(positions, layer_z, mask, sigma):
+    """
+    用 mask 中所有层拟合直线, 返回每个事件的 chi2, 形状 (E,)
+    positions 形状 (E, L, 2), sigma 为 x/y 方向的位置误差
+    """
+    positions = np.nan_to_num(np.asarray(positions, dtype=np.float64))
+    z = np.asarray(layer_z, dtype=np.float64)
+    z = z - z.mean()
+    weights = np.asarray(mask, dtype=np.float64)
+    slope, intercept = _solve(*_line_sums(positions, z, weights))
+    residual = slope[..., None, :] * z[:, None] + intercept[..., None, :] - positions
+    pull = (residual / np.asarray(sigma, dtype=np.float64))**2
+    return (weights[..., None] * pull).sum(axis=(-2, -1))
+
+
+def leave_one_out_residuals(positions, layer_z, mask, sigma, z_offset=0.0):
+    """
+    每个事件每一层作为 DUT 时, 用其余 mask 层拟合的直线在 layer_z+z_offset 处的预测减去 DUT 位置
+    一次求出所有事件所有 DUT 的无偏残差, 形状 (E, L, 2); 不在 mask 中的层为 NaN
+    chi2 为各 DUT 残差平方除以 sigma**2 之和, 形状 (E,)
+    """
+    positions = np.nan_to_num(np.asarray(positions, dtype=np.float64))
+    layer_z = np.asarray(layer_z, dtype=np.float64)
+    z0 = layer_z.mean()
+    z = layer_z - z0
+    weights = np.asarray(mask, dtype=np.float64)
+    s, sz, szz, sp, szp = _line_sums(positions, z, weights)
+
+    # 去掉 DUT 自身的贡献即得到留一拟合的和
+    slope, intercept = _solve(
+        s[..., None] - weights,
+        sz[..., None] - weights * z,
+        szz[..., None] - weights * z**2,
+        sp[..., None, :] - weights[..., None] * positions,
+        szp[..., None, :] - (weights * z)[..., None] * positions,
+    )
+    residual = slope * (z + z_offset)[:, None] + intercept - positions
+    residual[~np.asarray(mask, dtype=bool)] = np.nan
+    chisquare = np.nansum((residual / np.asarray(sigma, dtype=np.float64))**2, axis=(-2, -1))
+    return residual, chisquare
+
+
+def select_tracks(Clusters, layer_z, sigma, max_combinations=MAX_COMBINATIONS):
+    """
+    每个事件每层取一个团组成径迹, 返回 positions (E, L, 2), mask (E, L) 和事件号 (E,)
+    某层只有一个团时直接取用; 有多个团时枚举所有组合, 取全层直线拟合 chi2 最小的组合
+    组合数超过 max_combinations 的事件被丢弃
+    """
+    n_layers = len(layer_z)
+    n_events = len(Clusters)
+    positions = np.zeros((n_events, n_layers, 2))
+    mask = np.zeros((n_events, n_layers), dtype=bool)
+    kept = np.ones(n_events, dtype=bool)
+
+    candidates = []
+    candidate_events = []
+    for evt_id, evt in enumerate(Clusters):
+        layers = [layer for layer in range(n_layers) if evt.get(layer)]
+        mask[evt_id, layers] = True
+        counts = [len(evt[layer]) for layer in layers]
+        if all(n == 1 for n in counts):
+            for layer in layers:
+                positions[evt_id, layer] = evt[layer][0]
+            continue
+        if np.prod(counts) > max_combinations:
+            kept[evt_id] = False
+            continue
+        for combination in itertools.product(*[evt[layer] for layer in layers]):
+            track = np.zeros((n_layers, 2))
+            track[layers] = combination
+            candidates.append(track)
+            candidate_events.append(evt_id)
+
+    if candidates:
+        candidate_events = np.array(candidate_events)
+        chisquare = track_chisquare(np.array(candidates), layer_z, mask[candidate_events], sigma)
+        # 每个事件 chi2 最小的组合; 同值取先枚举的
+        order = np.lexsort((chisquare, candidate_events))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = candidate_events[order][1:] != candidate_events[order][:-1]
+        best = order[first]
+        positions[candidate_events[best]] = np.array(candidates)[best]
+
+    return positions[kept], mask[kept], np.flatnonzero(kept)
@@ -68,6 +68,7 @@ def _run_jobs(kwargs):
         use_cluster=kwargs["signal_batch"],
         mem=kwargs["mem"],
         destination="timeres",
+        worker=signal.job_worker(kwargs),
     )
     return not kwargs["signal_batch"]
 
@@ -121,6 +121,27 @@ def _add_detector_source(parser, default_source):
         dest="signal_batch",
     )
     parser.add_argument("--job", type=int, help="flag of run in job")
+    parser.add_argument(
+        "--persistent-workers",
+        action="store_true",
+        help="run local scan jobs in long-lived worker processes that load the detector and field once",
+    )
+    parser.add_argument(
+        "--waveform-format",
+        choices=("th1f", "columnar"),
+        help="batch waveform output: TH1F branches (default) or float32 arrays per event and electrode",
+    )
+    parser.add_argument(
+        "--spice-mode",
+        choices=("transient", "linear"),
+        help="ngspice amplifiers and cross talk: full transient per event (default) or convolution with the cached impulse responses "
+        "(same ngspice input currents; amplifier output binned like the induced currents, not on the 10 ps transient axis)",
+    )
+    parser.add_argument(
+        "--reuse-g4-deposits",
+        action="store_true",
+        help="store Geant4 deposits per geometry, source config and seed under g4_deposits/ and replay them in later runs",
+    )
     parser.add_argument("-mem", type=int, help="memory limit of the job in 8GB", default=1)
 
 
@@ -276,6 +297,10 @@ def _add_lumi(subparsers):
         task_parser = tasks.add_parser(task)
         _entry(task_parser, module, function, command="lumi", group="app", args=args)
 
+    pileup = tasks.add_parser("pileup", help="synthesise bunch-train pile-up waveforms")
+    pileup.add_argument("--mu", type=float, nargs="+", help="mean hits per bunch crossing, one train each (default 3.06)")
+    _entry(pileup, ".apps.lumi.pileup", "main", command="lumi", group="app", args=("mu",))
+
     current = tasks.add_parser("current")
     current.set_defaults(_lumi_output="test")
     _entry(current, ".apps.lumi.get_current_p1", "main", command="lumi", group="app", args=("_lumi_output_path",))
@@ -7,12 +7,33 @@ Description:
 @version    : 2.0
 """
 
+import hashlib
+import math
+import os
 import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 import ROOT
 
+from raser.supports.output import delete_file
 from raser.supports.output import output
 
+BATCH_SUBCKT = "raser_channel"
+# 冲激响应标定用的输入电流幅度 (A), 与电路里 I1 pulse 同量级
+IMPULSE_PROBE_CURRENT = -10e-6
+# 每隔多少个事件用完整瞬态仿真检查一次线性, 第一个事件总会检查
+LINEARITY_CHECK_INTERVAL = 100
+# 线性化输出与完整仿真的最大偏差 / 完整仿真信号峰值
+LINEARITY_TOLERANCE = 0.05
+# (netlist hash, t_bin, probe current) -> (baseline, kernel, spectra)
+_IMPULSE_CACHE = {}
+# (netlist hash, t_bin, probe current) -> 已线性化的事件数, 非线性电路为 None
+_LINEARITY_STATE = {}
+_GROUND_NODES = ("0", "gnd")
+_PROBE = re.compile(r"^v\(([^()]+)\)$", flags=re.IGNORECASE)
+
 def set_ngspice_input(currents: list[ROOT.TH1F]):
     # TODO: check the cuts and refine the code
     input_current_strs = []
@@ -105,4 +126,266 @@ def set_tmp_cir(read_ele_num, path, input_current_strs, ele_cir, label=None):
                 f_out.close()
         f_in.close()
 
-    return tmp_cirs, raws
\ No newline at end of file
+    return tmp_cirs, raws
+
+class BatchNetlist:
+    """
+    Description:
+        An amplifier netlist split for multi-channel runs: the top-level
+        elements (except the input source I1) become one subcircuit, the
+        subcircuit/model/include cards stay global, and the first v(...)
+        expression of the tran wrdata line is the probe of every channel
+    """
+    def __init__(self, ele_cir):
+        with open(ele_cir, 'r') as f:
+            lines = f.read().splitlines()
+        self.title = lines[0] if lines else ''
+        self.global_lines = []
+        self.channel_lines = []
+        self.control_lines = []
+        self.input_nodes = None
+        self.probe = None
+        target = None
+        in_subckt = False
+        in_control = False
+        for line in lines[1:]:
+            stripped = line.strip()
+            lower = stripped.lower()
+            if in_subckt:
+                self.global_lines.append(line)
+                in_subckt = not lower.startswith('.ends')
+                continue
+            if in_control:
+                if lower.startswith('.endc'):
+                    in_control = False
+                else:
+                    self.control_lines.append(stripped)
+                continue
+            if not stripped or stripped.startswith('*'):
+                continue
+            if stripped.startswith('+'):
+                if target is not None:
+                    target.append(line)
+                continue
+            if lower == '.end':
+                break
+            if lower.startswith('.subckt'):
+                self.global_lines.append(line)
+                in_subckt = True
+                target = None
+            elif lower.startswith('.control'):
+                in_control = True
+                target = None
+            elif stripped.startswith('.'):
+                self.global_lines.append(line)
+                target = self.global_lines
+            elif stripped.split()[0].lower() == 'i1':
+                self.input_nodes = stripped.split()[1:3]
+                target = None
+            else:
+                self.channel_lines.append(line)
+                target = self.channel_lines
+
+        if self.input_nodes is None or len(self.input_nodes) != 2:
+            raise ValueError("{}: no input current source I1".format(ele_cir))
+        self.ports = [node for node in self.input_nodes if node.lower() not in _GROUND_NODES]
+        if not self.ports:
+            raise ValueError("{}: input source I1 is grounded on both nodes".format(ele_cir))
+        for command in self.control_lines:
+            words = command.split()
+            if words and words[0].lower() == 'wrdata' and len(words) > 2 and _PROBE.match(words[2]):
+                self.probe = _PROBE.match(words[2]).group(1).split(',')
+        if self.probe is None:
+            raise ValueError("{}: no wrdata v(...) output to batch".format(ele_cir))
+
+    def _node(self, node, channel):
+        if node.lower() in _GROUND_NODES:
+            return node
+        if node in self.ports:
+            return "ch{}_{}".format(channel, node)
+        return "xch{}.{}".format(channel, node)
+
+    def probe_name(self, channel):
+        return "v({})".format(",".join(self._node(node.strip(), channel) for node in self.probe))
+
+    def write(self, tmp_cir, raw, input_current_strs):
+        """One netlist with one subcircuit copy and PWL source per input, binary raw output"""
+        channels = range(len(input_current_strs))
+        new_lines = [self.title]
+        new_lines += self.global_lines
+        new_lines.append(".subckt {} {}".format(BATCH_SUBCKT, " ".join(self.ports)))
+        new_lines += self.channel_lines
+        new_lines.append(".ends {}".format(BATCH_SUBCKT))
+        for j in channels:
+            nodes = [self._node(node, j) for node in self.input_nodes]
+            new_lines.append("Ich{} {} {} PWL({})".format(j, nodes[0], nodes[1], input_current_strs[j]))
+            new_lines.append("Xch{} {} {}".format(j, " ".join(self._node(node, j) for node in self.ports), BATCH_SUBCKT))
+        new_lines.append(".control")
+        for command in self.control_lines:
+            keyword = command.split()[0].lower() if command.split() else ''
+            if keyword in ('noise', 'setplot', 'write') or command.endswith('onoise_spectrum'):
+                # skip noise spectrum calculation
+                continue
+            if keyword == 'wrdata':
+                if _PROBE.match(command.split()[2]) is None:
+                    continue
+                new_lines.append("set filetype=binary")
+                command = "write {} {}".format(raw, " ".join(self.probe_name(j) for j in channels))
+            new_lines.append(command)
+        new_lines.append(".endc")
+        new_lines.append(".end")
+        with open(tmp_cir, 'w') as f_out:
+            f_out.write("\n".join(new_lines) + "\n")
+
+
+def read_spice_raw(raw):
+    """
+    ngspice rawfile (binary or ascii) of a real plot: (variable names, data of shape (points, variables))
+    """
+    with open(raw, 'rb') as f:
+        content = f.read()
+    header = {}
+    names = []
+    position = 0
+    while True:
+        end = content.index(b'\n', position)
+        line = content[position:end].decode('ascii', errors='replace').strip()
+        position = end + 1
+        if line.startswith('Binary:') or line.startswith('Values:'):
+            break
+        if ':' in line and not line[0].isdigit():
+            key, value = line.split(':', 1)
+            header[key.strip().lower()] = value.strip()
+            continue
+        if 'no. variables' in header and len(names) < int(header['no. variables']) and line:
+            names.append(line.split()[1])
+
+    n_variables = int(header['no. variables'])
+    n_points = int(header['no. points'])
+    if 'complex' in header.get('flags', '').lower():
+        raise ValueError("{}: complex plots are not supported".format(raw))
+    if line.startswith('Binary:'):
+        data = np.frombuffer(content, dtype='<f8', count=n_points * n_variables, offset=position)
+    else:
+        # ascii: 每个点 "序号 值" 后跟 n_variables - 1 行值
+        words = content[position:].split()
+        data = np.array(words, dtype=np.float64).reshape(n_points, n_variables + 1)[:, 1:]
+    return names, data.reshape(n_points, n_variables)
+
+
+def run_ngspice_batch(netlist, input_current_strs, path, label, channels_per_run=None, max_workers=None):
+    """
+    Simulate all inputs (electrodes, or electrodes of several events) with one
+    netlist per chunk of channels_per_run inputs; chunks run as concurrent
+    ngspice processes. Returns ([time], [output voltage in V]), one array per input
+    """
+    n_inputs = len(input_current_strs)
+    if max_workers is None:
+        max_workers = min(n_inputs, os.cpu_count() or 1)
+    if channels_per_run is None:
+        channels_per_run = math.ceil(n_inputs / max_workers)
+    chunks = [range(start, min(start + channels_per_run, n_inputs)) for start in range(0, n_inputs, channels_per_run)]
+
+    runs = []
+    for m, chunk in enumerate(chunks):
+        tmp_cir = "{}/{}_run{}_tmp.cir".format(path, label, m)
+        raw = "{}/{}_run{}.raw".format(path, label, m)
+        netlist.write(tmp_cir, raw, [input_current_strs[j] for j in chunk])
+        runs.append((tmp_cir, raw))
+
+    def run(files):
+        subprocess.run(['ngspice', '-b', files[0]], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(runs)))) as pool:
+            list(pool.map(run, runs))
+        times = []
+        volts = []
+        for (tmp_cir, raw), chunk in zip(runs, chunks):
+            if not os.path.exists(raw):
+                raise RuntimeError("ngspice produced no output for {}".format(tmp_cir))
+            _, data = read_spice_raw(raw)
+            for j in range(len(chunk)):
+                times.append(data[:, 0])
+                volts.append(data[:, 1 + j])
+    finally:
+        for tmp_cir, raw in runs:
+            delete_file(tmp_cir)
+            delete_file(raw)
+    return times, volts
+
+
+def netlist_hash(ele_cir):
+    with open(ele_cir, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def pwl_samples(input_current_str, t_bin, n_samples):
+    """
+    PWL 输入 (set_ngspice_input 的字符串) 在 k t_bin (k < n_samples) 处的值;
+    同一时刻的跳变取跳变后的值
+    """
+    points = np.array(input_current_str.split(','), dtype=np.float64).reshape(-1, 2)
+    times = points[:, 0].copy()
+    # 跳变前的点稍微提前, 跳变时刻取后一个点的值
+    step = np.append(times[:-1] == times[1:], False)
+    times[step] -= 1e-6*t_bin
+    return np.interp(np.arange(n_samples)*t_bin, times, points[:, 1], right=0.0)
+
+
+def impulse_response(netlist, ele_cir, t_bin, path, probe_current=IMPULSE_PROBE_CURRENT):
+    """
+    Linearised response of the netlist around its operating point, measured once
+    with a triangular probe pulse (0 -> probe_current -> 0 over 2 t_bin).
+    Returns (key, baseline in V, kernel in V/A, spectra): for input samples i[k]
+    at k t_bin the output at n t_bin is baseline + sum_k kernel[n-k] i[k].
+    Kept in memory and as path/impulse_<hash>_<t_bin>_<current>.npz
+    """
+    key = (netlist_hash(ele_cir), float(t_bin), float(probe_current))
+    if key in _IMPULSE_CACHE:
+        return (key,) + _IMPULSE_CACHE[key]
+    cache_file = os.path.join(path, "impulse_{}_{:g}_{:g}.npz".format(*key))
+    if os.path.exists(cache_file):
+        with np.load(cache_file) as stored:
+            baseline, kernel = float(stored["baseline"]), stored["kernel"]
+    else:
+        pulse = "0,0,{:.9g},{:.9g},{:.9g},0".format(t_bin, probe_current, 2*t_bin)
+        times, volts = run_ngspice_batch(netlist, [pulse], path, "impulse_{}_{}".format(key[0], os.getpid()))
+        grid = np.arange(int(times[0][-1]/t_bin) + 1)*t_bin
+        response = np.interp(grid, times[0], volts[0])
+        baseline = float(response[0])
+        # 三角脉冲峰在 t_bin, 冲激响应相对输入样本提前一个 bin
+        kernel = (response[1:] - baseline)/probe_current
+        # 先写临时文件再改名, 共享目录的其他作业不会读到写了一半的文件
+        tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+        try:
+            with open(tmp_file, "wb") as f:
+                np.savez(f, baseline=baseline, kernel=kernel)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            print("Warning: impulse response not saved: %s"%(e))
+    _IMPULSE_CACHE[key] = (baseline, kernel, {})
+    return (key,) + _IMPULSE_CACHE[key]
+
+
+def linearity_check_due(key):
+    """True if this event should be compared with a full transient run; counts the event"""
+    count = _LINEARITY_STATE.get(key, 0)
+    _LINEARITY_STATE[key] = count + 1
+    return count % LINEARITY_CHECK_INTERVAL == 0
+
+
+def is_linear(key):
+    return _LINEARITY_STATE.get(key, 0) is not None
+
+
+def check_linearity(key, linear, full, baseline, tolerance=LINEARITY_TOLERANCE):
+    """Compare linearised and full transient outputs (V); mark the netlist nonlinear on failure"""
+    scale = np.abs(full - baseline).max()
+    deviation = np.abs(linear - full).max()
+    if deviation > tolerance*scale:
+        print("Warning: linearised ngspice response deviates by %.3g V (signal %.3g V), "
+              "falling back to full transient simulation"%(deviation, scale))
+        _LINEARITY_STATE[key] = None
+        return False
+    return True
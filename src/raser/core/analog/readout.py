@@ -18,10 +18,19 @@ import time
 import numpy as np
 import ROOT
 
+from .ngspice import BatchNetlist
+from .ngspice import check_linearity
+from .ngspice import impulse_response
+from .ngspice import is_linear
+from .ngspice import linearity_check_due
+from .ngspice import run_ngspice_batch
+from .ngspice import pwl_samples
 from .ngspice import set_ngspice_input
 from .ngspice import set_tmp_cir
 from raser.supports.output import output
 from raser.supports.output import delete_file
+from raser.supports.math import cached_kernels, fft_convolve
+from raser.supports.waveform_columns import hist_bin_array
 from raser.supports.paths import optional_component_path
 
 ROOT.gROOT.SetBatch(True)
@@ -37,11 +46,7 @@ def _new_histogram(name, title, n_bins, t_start, t_end):
 
 
 def _hist_contents(hist: ROOT.TH1F) -> np.ndarray:
-    n_bins = hist.GetNbinsX()
-    return np.array(
-        [hist.GetBinContent(bin_idx) for bin_idx in range(1, n_bins + 1)],
-        dtype=np.float64,
-    )
+    return hist_bin_array(hist, dtype=np.float64)
 
 
 def _set_hist_contents(hist: ROOT.TH1F, values: np.ndarray):
@@ -50,8 +55,10 @@ def _set_hist_contents(hist: ROOT.TH1F, values: np.ndarray):
         raise ValueError(
             f"Histogram {hist.GetName()} has {n_bins} bins, got {len(values)} values"
         )
-    for bin_idx, value in enumerate(values, start=1):
-        hist.SetBinContent(bin_idx, float(value))
+    # SetContent 连同上下溢出 bin 一起写入
+    contents = np.zeros(n_bins + 2, dtype=np.float64)
+    contents[1:n_bins + 1] = values
+    hist.SetContent(contents)
 
 
 def _hist_bin_centers(hist: ROOT.TH1F) -> np.ndarray:
@@ -63,32 +70,56 @@ def _hist_bin_centers(hist: ROOT.TH1F) -> np.ndarray:
     )
 
 
+def _raw_bins(time, volt, n_bins, time_unit):
+    """
+    非均匀的 ngspice 时间点放进 [0, time[-1]] 上 n_bins 个 bin (与 TH1F.FindBin/SetBinContent 一致):
+    同一 bin 取最后一个点, 1 .. time[-1]/time_unit - 2 号 bin 中的空 bin 沿用前一个 bin
+    """
+    t_end = time[-1]
+    bins = np.where(time < 0, 0, np.where(time < t_end, 1 + (n_bins*time/t_end).astype(np.int64), n_bins + 1))
+    contents = np.zeros(n_bins + 2, dtype=np.float32)
+    last = len(bins) - 1 - np.unique(bins[::-1], return_index=True)[1]
+    contents[bins[last]] = volt[last]
+    filled = np.zeros(n_bins + 2, dtype=bool)
+    filled[bins] = True
+    index = np.arange(n_bins + 2)
+    empty = ~filled & (index >= 1) & (index < int(t_end/time_unit) - 1)
+    source = np.maximum.accumulate(np.where(empty, 0, index))
+    return contents[source][1:n_bins + 1].astype(np.float64)
+
+
 def _convolve_samples(
     values: np.ndarray,
     t_bin: float,
     pulse_responce_function_list: list,
+    cache_key=None,
 ) -> np.ndarray:
+    """
+    Causal convolution of the last axis with each response sampled at 0, t_bin, 2 t_bin, ...
+    values may hold several waveforms as rows; cache_key keeps the sampled kernels and their FFTs
+    """
     if t_bin <= 0:
         raise ValueError(f"Convolution bin width must be positive, got {t_bin}")
     result = np.asarray(values, dtype=np.float64)
-    n_bins = len(result)
+    n_bins = result.shape[-1]
     if n_bins == 0:
         return result
     times = np.arange(n_bins, dtype=np.float64) * t_bin
-    for response in pulse_responce_function_list:
-        kernel = np.array([response(time) for time in times], dtype=np.float64)
-        result = np.convolve(result, kernel, mode="full")[:n_bins] * t_bin
+    for kernel, spectra in cached_kernels(cache_key, times, pulse_responce_function_list):
+        result = fft_convolve(result, kernel, spectra)[..., :n_bins] * t_bin
     return result
 
 
 def _convolve_histogram_causal(
     hist: ROOT.TH1F,
     pulse_responce_function_list: list,
+    cache_key=None,
 ) -> np.ndarray:
     return _convolve_samples(
         _hist_contents(hist),
         hist.GetBinWidth(1),
         pulse_responce_function_list,
+        cache_key,
     )
 
 
@@ -158,10 +189,18 @@ class Amplifier:
     CDet : None | float
         The capacitance of the detector
 
+    spice_mode : str
+        For .cir amplifiers: "transient" runs ngspice for every event,
+        "linear" convolves with the impulse response measured once per netlist and time step;
+        the linear output is binned like the currents, not on the 10 ps transient axis
+
     Attributes
     ---------
+    amplified_waveforms: np.ndarray
+        Amplified waveforms, one row per reading electrode
+
     amplified_currents: list[ROOT.TH1F]
-        The list of induced current after amplifier
+        The same waveforms as TH1F, built on first access
 
     Methods
     ---------
@@ -174,6 +213,9 @@ class Amplifier:
     set_scope_output
         Get the scope output after amplifier
 
+    linear_spice_output
+        Get the .cir amplifier output from its linearised impulse response
+
     Last Modified
     ---------
         2024/09/14
@@ -185,8 +227,10 @@ class Amplifier:
         seed = 0,
         CDet = None,
         is_cut = False,
+        spice_mode = "transient",
     ):
-        self.amplified_currents = []
+        self.amplified_waveforms = None
+        self._amplified_currents = None
         self.read_ele_num = len(currents)
         self.time_unit = 10e-12
         # TODO: need to set the time unit corresponding to the oscilloscope or the TDC 
@@ -211,22 +255,38 @@ class Amplifier:
                 self.judge_threshold_CFD()
 
         elif ele_cir is not None and os.path.exists(ele_cir):
+            if spice_mode not in ("transient", "linear"):
+                raise ValueError("Unsupported spice_mode: {}".format(spice_mode))
             self.name = amplifier_name
-            input_current_strs = set_ngspice_input(currents)
             time_stamp = time.time_ns()
             pid = os.getpid()
             # stamp and thread name for avoiding file name conflict
             path = output(__file__, self.name)
-            tmp_cirs, raws = set_tmp_cir(self.read_ele_num, path, input_current_strs, ele_cir, str(time_stamp)+"_"+str(pid),)
-            for i in range(self.read_ele_num):
-                print("Running ngspice for amplifier simulation on electrode No.%d..."%(i+1))
-                subprocess.run(['ngspice -b '+tmp_cirs[i]], shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,)
-            self.read_raw_file(raws)
-            # TODO: delete the files properly
-            for tmp_cir in tmp_cirs:
-                delete_file(tmp_cir)
-            for raw in raws:
-                delete_file(raw)
+            label = str(time_stamp)+"_"+str(pid)
+            try:
+                netlist = BatchNetlist(ele_cir)
+            except ValueError as e:
+                print("ngspice batch netlist unavailable (%s), running electrodes one by one"%e)
+                netlist = None
+            if spice_mode == "linear" and netlist is not None:
+                self.linear_spice_output(currents, netlist, ele_cir, path, label)
+            elif netlist is not None:
+                input_current_strs = set_ngspice_input(currents)
+                print("Running ngspice for amplifier simulation on %d electrodes..."%self.read_ele_num)
+                times, volts = run_ngspice_batch(netlist, input_current_strs, path, label)
+                self.fill_raw_output(times, volts)
+            else:
+                input_current_strs = set_ngspice_input(currents)
+                tmp_cirs, raws = set_tmp_cir(self.read_ele_num, path, input_current_strs, ele_cir, label,)
+                for i in range(self.read_ele_num):
+                    print("Running ngspice for amplifier simulation on electrode No.%d..."%(i+1))
+                    subprocess.run(['ngspice -b '+tmp_cirs[i]], shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,)
+                self.read_raw_file(raws)
+                # TODO: delete the files properly
+                for tmp_cir in tmp_cirs:
+                    delete_file(tmp_cir)
+                for raw in raws:
+                    delete_file(raw)
 
         else:
             raise NameError("The amplifier file is not found!")
@@ -242,6 +302,8 @@ class Amplifier:
         """
         if CDet is None:
             raise ValueError("Detector capacitance must be provided by the detector")
+        # 响应只由放大器参数和探测器电容决定, 以此为键缓存响应核
+        self.kernel_key = (json.dumps(self.amplifier_parameters, sort_keys=True), float(CDet))
 
         if self.amplifier_parameters['ele_name'] == 'Charge_Sensitive':
             """ Current Sensitive Amplifier parameter initialization"""
@@ -249,9 +311,7 @@ class Amplifier:
             mode = 0
 
             def pulse_responce_Charge_Sensitive(t):
-                if t < 0: # step function
-                    return 0
-
+                t = np.asarray(t, dtype=np.float64)
                 t_rise   = self.amplifier_parameters['t_rise']
                 t_fall   = self.amplifier_parameters['t_fall']
 
@@ -260,7 +320,11 @@ class Amplifier:
                 if tau_rise == tau_fall:
                     tau_rise *= 0.9
 
-                return ( tau_fall/(tau_fall+tau_rise) * (math.exp(-t/tau_fall)-math.exp(-t/tau_rise))
+                t_pos = np.maximum(t, 0)
+                return np.where( # step function
+                    t < 0,
+                    0.0,
+                    tau_fall/(tau_fall+tau_rise) * (np.exp(-t_pos/tau_fall)-np.exp(-t_pos/tau_rise)),
                 )
 
             def scale_Charge_Sensitive(output_Q_max, input_Q_tot):
@@ -289,9 +353,7 @@ class Amplifier:
             mode = "RC"
 
             def pulse_responce_Broad_Band(t):
-                if t < 0: # step function
-                    return 0
-                
+                t = np.asarray(t, dtype=np.float64)
                 Broad_Band_Bandwidth = self.amplifier_parameters['Broad_Band_Bandwidth']
                 Broad_Band_Imp       = self.amplifier_parameters['Broad_Band_Imp']
                 OscBW        = self.amplifier_parameters['OscBW']   
@@ -299,20 +361,18 @@ class Amplifier:
                 if mode == "scope":
                     tau_C50 = 1.0e-12 * 50.0 * CDet          #Oscil. RC
                     tau_BW = 0.35 / (1.0e9*OscBW) / 2.2      #Oscil. RC
-                    tau_scope = math.sqrt(pow(tau_C50,2)+pow(tau_BW,2))
-
-                    return 1/tau_scope * math.exp(-t/tau_scope)
+                    tau = math.sqrt(pow(tau_C50,2)+pow(tau_BW,2))
 
                 elif mode == "RC":
                     tau_Broad_Band_RC = 1.0e-12 * Broad_Band_Imp * CDet     #Broad_Band RC
                     tau_Broad_Band_BW = ( 0.35 / (1.0e9*Broad_Band_Bandwidth) / 2.2
                     )    #Broad_Band Tau, Rf*Cf?
-                    tau_Broad_Band = math.sqrt(pow(tau_Broad_Band_RC,2)+pow(tau_Broad_Band_BW,2))
-
-                    return 1/tau_Broad_Band * math.exp(-t/tau_Broad_Band)
+                    tau = math.sqrt(pow(tau_Broad_Band_RC,2)+pow(tau_Broad_Band_BW,2))
                 
                 else:
                     raise NameError(mode,"mode is not defined")
+
+                return np.where(t < 0, 0.0, 1/tau * np.exp(-np.maximum(t, 0)/tau)) # step function
                 
             def scale_Broad_Band(output_Q_max, input_Q_tot):
                 """Broad Bandwidth Amplifier (Charge Sensitive Amplifier) scale function"""
@@ -330,76 +390,146 @@ class Amplifier:
             self.scale = scale_Broad_Band
             
 
-    def fill_amplifier_output(self, currents: list[ROOT.TH1F]):
-        for i in range(self.read_ele_num):
-            cu = currents[i]
-            self.amplified_currents.append(
-                _new_histogram(
+    @property
+    def amplified_currents(self):
+        """TH1F copies of amplified_waveforms for ROOT consumers, built once on request"""
+        if self._amplified_currents is None:
+            n_bins, t_start, t_end = self.waveform_axis
+            self._amplified_currents = []
+            for i in range(self.read_ele_num):
+                hist = _new_histogram(
                     "electronics %s%s"%(self.name, i + 1),
                     "electronics %s"%(self.name),
-                    cu.GetNbinsX(),
-                    cu.GetXaxis().GetXmin(),
-                    cu.GetXaxis().GetXmax(),
+                    n_bins,
+                    t_start,
+                    t_end,
                 )
-            )
-            self.amplified_currents[i].Reset()
-            values = _convolve_histogram_causal(cu, self.pulse_responce_list)
-            _set_hist_contents(self.amplified_currents[i], values)
+                _set_hist_contents(hist, self.amplified_waveforms[i])
+                self._amplified_currents.append(hist)
+        return self._amplified_currents
+
+    def fill_amplifier_output(self, currents: list[ROOT.TH1F]):
+        axes = {(cu.GetNbinsX(), cu.GetXaxis().GetXmin(), cu.GetXaxis().GetXmax()) for cu in currents}
+        if len(axes) != 1:
+            raise ValueError("All reading electrodes must share the same time binning")
+        self.waveform_axis = axes.pop()
+        self._amplified_currents = None
+        self.amplified_waveforms = _convolve_samples(
+            np.stack([_hist_contents(cu) for cu in currents]),
+            currents[0].GetBinWidth(1),
+            self.pulse_responce_list,
+            self.kernel_key,
+        )
     
     def set_scope_output(self, currents: list[ROOT.TH1F]):
         for i in range(self.read_ele_num):
             cu = currents[i]
             input_Q_tot = cu.Integral()*cu.GetBinWidth(0)
-            output_Q_max = self.amplified_currents[i].GetMaximum()
-            self.amplified_currents[i].Scale(self.scale(output_Q_max, input_Q_tot))
+            output_Q_max = float(self.amplified_waveforms[i].max())
+            self.amplified_waveforms[i] *= self.scale(output_Q_max, input_Q_tot)
+        self._amplified_currents = None
 
-    def add_noise(self, seed):
+    def noise(self, seed):
+        """
+        Noise for every electrode and bin from one generator call.
+        Optional amplifier settings:
+            noise_psd: [[frequency_Hz, psd], ...] colours the noise with this spectral shape
+                       (rescaled to noise_rms)
+            noise_correlation: common-mode fraction shared by all electrodes, 0..1
+        """
         noise_avg = self.amplifier_parameters["noise_avg"]
         noise_rms = self.amplifier_parameters["noise_rms"]
-        ROOT.gRandom.SetSeed(seed)
-        for i in range(self.read_ele_num):
-            cu = self.amplified_currents[i]
-            for j in range(cu.GetNbinsX()):
-                noise_height=ROOT.gRandom.Gaus(noise_avg,noise_rms)
-                cu.SetBinContent(j,cu.GetBinContent(j)+noise_height)
+        # 与 ROOT.gRandom.SetSeed 一致: seed 为 0 时不固定随机数
+        rng = np.random.default_rng(seed if seed else None)
+        n_bins = self.amplified_waveforms.shape[1]
+        correlation = float(self.amplifier_parameters.get("noise_correlation", 0.0))
+        white = rng.normal(0.0, 1.0, (self.read_ele_num + (correlation > 0), n_bins))
+        if correlation > 0:
+            white = np.sqrt(1 - correlation) * white[:-1] + np.sqrt(correlation) * white[-1]
+
+        psd = self.amplifier_parameters.get("noise_psd")
+        if psd is not None:
+            frequency, density = np.asarray(psd, dtype=np.float64).T
+            t_bin = (self.waveform_axis[2] - self.waveform_axis[1]) / self.waveform_axis[0]
+            shape = np.sqrt(np.interp(np.fft.rfftfreq(n_bins, t_bin), frequency, density))
+            white = np.fft.irfft(np.fft.rfft(white, axis=1) * shape, n_bins, axis=1)
+            rms = np.sqrt(np.mean(shape[1:] ** 2)) if n_bins > 1 else 0.0
+            white = white / rms if rms > 0 else np.zeros_like(white)
+        return noise_avg + noise_rms * white
+
+    def add_noise(self, seed):
+        self.amplified_waveforms += self.noise(seed)
+        self._amplified_currents = None
 
     def judge_threshold_CFD(self):
         threshold = self.amplifier_parameters["threshold"]
-        for i in range(self.read_ele_num):
-            cu = self.amplified_currents[i]
-            amplitude = max(cu.GetMaximum(), abs(cu.GetMinimum()))
-            if amplitude > threshold:
-                return
-            else:
-                self.amplified_currents[i].Reset()
+        amplitude = np.abs(self.amplified_waveforms).max(axis=1)
+        # 第一个过阈电极之前的电极清零, 之后的保留
+        passed = np.flatnonzero(amplitude > threshold)
+        first = passed[0] if len(passed) else self.read_ele_num
+        self.amplified_waveforms[:first] = 0.0
+        self._amplified_currents = None
+
+    def linear_spice_output(self, currents, netlist, ele_cir, path, label):
+        """
+        Convolve the ngspice input currents (the same set_ngspice_input PWL the transient
+        mode feeds ngspice, so one bin later than the histogram and cut at the 1% onset and
+        offset points) with the cached impulse response of the netlist instead of a
+        transient run. Every LINEARITY_CHECK_INTERVAL-th event is also simulated in full;
+        once the netlist is found nonlinear every event is simulated in full.
+        The output always stays on the time axis of the currents
+        """
+        axes = {(cu.GetNbinsX(), cu.GetXaxis().GetXmin(), cu.GetXaxis().GetXmax()) for cu in currents}
+        if len(axes) != 1:
+            raise ValueError("All reading electrodes must share the same time binning")
+        n_bins, t_start, t_end = axis = axes.pop()
+        t_bin = (t_end - t_start)/n_bins
+        grid = np.arange(n_bins)*t_bin
+        key, baseline, kernel, spectra = impulse_response(netlist, ele_cir, t_bin, path)
+        input_current_strs = set_ngspice_input(currents)
+
+        def transient(run_label):
+            times, full_volts = run_ngspice_batch(netlist, input_current_strs, path, run_label)
+            return np.stack([np.interp(grid, t, v) for t, v in zip(times, full_volts)]), min(t[-1] for t in times)
+
+        if not is_linear(key):
+            volts, _ = transient(label)
+        else:
+            samples = np.stack([pwl_samples(input_c, t_bin, n_bins) for input_c in input_current_strs])
+            volts = baseline + fft_convolve(samples, kernel, spectra)[:, :n_bins]
+            if linearity_check_due(key):
+                full, t_covered = transient(label+"_check")
+                # 只比较瞬态仿真覆盖的时间段
+                covered = grid <= t_covered
+                if not check_linearity(key, volts[:, covered], full[:, covered], baseline):
+                    volts = full
+        self.waveform_axis = axis
+        self._amplified_currents = None
+        self.amplified_waveforms = volts*1e3 # convert V to mV
 
     def read_raw_file(self, raws):
+        times, volts = [], []
+        for i in range(self.read_ele_num):
+            data = np.loadtxt(raws[i], ndmin=2)
+            times.append(data[:, 0])
+            volts.append(data[:, 1])
+        self.fill_raw_output(times, volts)
+
+    def fill_raw_output(self, times, volts):
+        """ngspice 输出 (时间, 电压 V) 按 time_unit 分 bin, 转成 mV"""
         time_limit = 100e-9
         # TODO: make this match the .tran in the .cir file
         # TODO: the time limit should be consistent with the time limit in gen_signal_scan.py
+        n_bins = int(time_limit/self.time_unit)
+        waveforms = []
         for i in range(self.read_ele_num):
-            raw = raws[i]
-            with open(raw, 'r') as f:
-                lines = f.readlines()
-                time,volt = [],[]
-
-                for line in lines:
-                    time.append(float(line.split()[0]))
-                    volt.append(float(line.split()[1])*1e3) # convert V to mV
-
-            self.amplified_currents.append(_new_histogram(
-                                "electronics %s"%(self.name)+str(i+1), "electronics %s"%(self.name),
-                                int(time_limit/self.time_unit),0,time[-1],))
-            # the .raw input is not uniform, so we need to slice the time range
-            filled = set()
-            for j in range(len(time)):
-                k = self.amplified_currents[i].FindBin(time[j])
-                self.amplified_currents[i].SetBinContent(k, volt[j])
-                filled.add(k)
-            # fill the empty bins
-            for k in range(1, int(time[-1]/self.time_unit)-1):
-                if k not in filled:
-                    self.amplified_currents[i].SetBinContent(k, self.amplified_currents[i][k-1])
+            sample_time = np.asarray(times[i], dtype=np.float64)
+            volt = np.asarray(volts[i], dtype=np.float64)*1e3 # convert V to mV
+            waveforms.append(_raw_bins(sample_time, volt, n_bins, self.time_unit))
+        t_end = float(np.asarray(times[0])[-1])
+        self.waveform_axis = (n_bins, 0.0, t_end)
+        self._amplified_currents = None
+        self.amplified_waveforms = np.stack(waveforms)
 
     def draw_waveform(self, currents, path):
         for i in range(self.read_ele_num):
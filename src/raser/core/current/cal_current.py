@@ -21,11 +21,14 @@ import ROOT
 ROOT.gROOT.SetBatch(True)
 
 from .model import Material
-from .carrier import VectorizedCarrierSystem
+from .carrier import VectorizedCarrierSystem, get_e_field_many
+from .path_store import segment_starts, stack_paths
+from .signal_stream import SignalStream, accumulate_current
+from .parallel_drift import drift_systems_parallel, fork_available
 
 from ..interaction.carrier_list import CarrierListFromG4P
 from ..interaction.toy_mip import ToyMIPLineSource
-from raser.supports.math import Vector, signal_convolution
+from raser.supports.math import signal_convolution
 from raser.supports.output import output
 
 t_bin = {
@@ -83,17 +86,25 @@ class CalCurrent:
             the generated carrier amount from ionizing radiation or laser
         track_position : float[]
             position of the generated carriers
+        keep_drift_paths : bool or None
+            store the full drift paths (for drawing); None stores them unless the signal is streamed
     Attributes:
         electrons, holes : VectorizedCarrierSystem[]
             the generated carriers, able to calculate their movement
     Modify:
         2024/11/09
     """
-    def __init__(self, my_d, my_f, ionized_pairs, track_position, keep_drift_paths=True):
+    def __init__(self, my_d, my_f, ionized_pairs, track_position, keep_drift_paths=None):
         self.timings = StageTimings()
+        self.signal_mode = self._resolve_signal_mode(my_d)
+        self.drift_workers = self._resolve_drift_workers(my_d)
+        # 默认: 流式 (含并行漂移) 信号不保存完整路径, stored 模式保存以便画图
+        if keep_drift_paths is None:
+            keep_drift_paths = self.signal_mode != "stream" and self.drift_workers == 1
         self.keep_drift_paths = bool(keep_drift_paths)
         if getattr(my_d, "has_avalanche", False) and getattr(my_d, "gain_algorithm", None) == "local_path":
             self.keep_drift_paths = True
+        self.drift_chunk_size = max(1, int(getattr(my_d, "vector_drift_chunk_size", 4096)))
         with self.timings.record("total"):
             self._run_current_calculation(my_d, my_f, ionized_pairs, track_position)
 
@@ -208,6 +219,44 @@ class CalCurrent:
                 self.sum_cu[i].Add(self.gain_current.negative_cu[i])
                 self.sum_cu[i].Add(self.gain_current.positive_cu[i])
 
+    @staticmethod
+    def _resolve_signal_mode(my_d):
+        """stored: 漂移后由完整简化路径计算信号; stream: 漂移时逐步累加感应电流"""
+        mode = str(getattr(my_d, "vector_signal_mode", "stored")).lower()
+        if mode not in ("stored", "stream"):
+            logger.warning(f"未知的信号模式 {mode}, 使用 stored")
+            return "stored"
+        if mode == "stream" and len(my_d.read_out_contact) != 1:
+            logger.warning("流式信号只支持单读出电极配置, 使用 stored")
+            return "stored"
+        return mode
+
+    @staticmethod
+    def _resolve_drift_workers(my_d):
+        """并行漂移进程数; 1 为串行. 并行时信号以流式累加, 只支持单读出电极配置"""
+        workers = max(1, int(getattr(my_d, "vector_drift_workers", 1)))
+        if workers == 1:
+            return 1
+        if len(my_d.read_out_contact) != 1:
+            logger.warning("并行漂移只支持单读出电极配置, 使用串行漂移")
+            return 1
+        if not fork_available():
+            logger.warning("当前平台不支持 fork, 使用串行漂移")
+            return 1
+        return workers
+
+    def _signal_stream_args(self):
+        return (self.read_ele_num, self.n_bin, self.t_start, self.t_end, self.t_bin, self.delta_t, t_tol)
+
+    def _attach_signal_streams(self, my_d, my_f):
+        """流式模式下为每个载流子系统创建信号累加器, 返回是否启用"""
+        if getattr(self, "signal_mode", "stored") != "stream":
+            return False
+        for system in (self.electron_system, self.hole_system):
+            if system:
+                system.signal_stream = SignalStream(my_d, my_f, *self._signal_stream_args())
+        return True
+
     def _is_in_sensor(self, x, y, z, my_d):
         """检查位置是否在探测器内"""
         return (0 <= x <= my_d.l_x and 
@@ -228,25 +277,38 @@ class CalCurrent:
         """漂移循环 - 使用向量化系统"""
         logger.info(f"向量化漂移: 电子系统={self.electron_system is not None}, 空穴系统={self.hole_system is not None}")
         delta_t_sim = getattr(my_d, "vector_delta_t", self.delta_t)
+        drift_workers = getattr(self, "drift_workers", 1)
+        streaming = drift_workers == 1 and self._attach_signal_streams(my_d, my_f)
         
         try:            
+            # 电子和空穴分块并行漂移, 合并电流累加器
+            if drift_workers > 1:
+                systems = [system for system in (self.electron_system, self.hole_system) if system]
+                with self.timings.record("parallel_drift"):
+                    drift_systems_parallel(
+                        systems, my_d, my_f, delta_t_sim, self._signal_stream_args(),
+                        drift_workers, self.drift_chunk_size,
+                    )
+
             # 批量处理电子
-            if self.electron_system:
+            elif self.electron_system:
                 logger.info(f"电子数量: {len(self.electron_system.positions)}")
                 with self.timings.record("electron_drift"):
                     self.electron_system.drift_batch(my_d, my_f, delta_t=delta_t_sim)
-                logger.info("电子漂移结束，开始信号计算...")
-                with self.timings.record("electron_signal"):
-                    self.electron_system.get_signal_batch(my_d, my_f)
+                if not streaming:
+                    logger.info("电子漂移结束，开始信号计算...")
+                    with self.timings.record("electron_signal"):
+                        self.electron_system.get_signal_batch(my_d, my_f)
             
             # 批量处理空穴
-            if self.hole_system:
+            if drift_workers == 1 and self.hole_system:
                 logger.info(f"空穴数量: {len(self.hole_system.positions)}")
                 with self.timings.record("hole_drift"):
                     self.hole_system.drift_batch(my_d, my_f, delta_t=delta_t_sim)
-                logger.info("空穴漂移结束，开始信号计算...")
-                with self.timings.record("hole_signal"):
-                    self.hole_system.get_signal_batch(my_d, my_f)
+                if not streaming:
+                    logger.info("空穴漂移结束，开始信号计算...")
+                    with self.timings.record("hole_signal"):
+                        self.hole_system.get_signal_batch(my_d, my_f)
                             
             cache_stats = my_f.get_cache_stats()
             logger.info(
@@ -329,65 +391,44 @@ class CalCurrent:
             logger.warning(f"未知的载流子类型: {carrier_type}")
             return signals_found
 
-        bin_accumulators = [
-            np.zeros(hist.GetNbinsX() + 2, dtype=np.float64)
-            for hist in histograms
-        ]
+        # 流式模式: 漂移时已经累加好
+        stream = getattr(carrier_system, "signal_stream", None)
+        if stream is not None:
+            self._flush_bin_accumulators(histograms, stream.accumulator)
+            return stream.signals_found
+
+        bin_accumulators = np.zeros((len(histograms), histograms[0].GetNbinsX() + 2), dtype=np.float64)
         axis = histograms[0].GetXaxis()
         x_min = axis.GetXmin()
         x_max = axis.GetXmax()
-        bin_width = (x_max - x_min) / histograms[0].GetNbinsX()
 
-        for carrier_idx in range(len(carrier_system.positions)):
-            # 检查这个载流子是否有信号
-            if (carrier_idx >= len(carrier_system.signals) or 
-                not carrier_system.signals[carrier_idx]):
-                continue
-            
-            carrier_signals = carrier_system.signals[carrier_idx]
-            path_reduced = carrier_system.paths_reduced[carrier_idx]
-            
-            # 处理每个电极
-            for electrode_idx in range(total_electrodes):
-                if electrode_idx >= len(carrier_signals):
-                    continue
-                
-                electrode_signals = carrier_signals[electrode_idx]
-                if not electrode_signals:
-                    continue
-                
-                # 计算电极的j,k坐标
-                j = electrode_idx // (2 * y_span + 1)
-                k = electrode_idx % (2 * y_span + 1)
-                
-                # 处理每个路径段的信号
-                for step_idx in range(len(path_reduced)-1):                    
-                    signal_value = electrode_signals[step_idx]
+        # 所有电极 × 路径段的信号和段起点 (时间, 电极编号), 一次累加
+        segments = getattr(carrier_system, "segment_signals", None)
+        if segments is not None and segments['signals'].size > 0:
+            electrodes = segments['electrodes'][segments['electrodes'] < total_electrodes]
+            signals = segments['signals'][:len(electrodes)]
+            seg_nodes = segments['nodes']
+            # 相邻电极偏移 (j, k)
+            j = electrodes // (2 * y_span + 1)
+            k = electrodes % (2 * y_span + 1)
+            x_num = seg_nodes[:, 4].astype(np.int64) + (j - x_span)[:, None]
+            y_num = seg_nodes[:, 5].astype(np.int64) + (k - y_span)[:, None]
+            time_point = np.broadcast_to(seg_nodes[:, 3], signals.shape)
+
+            # 调试前几个信号
+            for t_value, q_value in zip(seg_nodes[:3, 3], signals[0, :3]):
+                logger.debug("%s信号: t=%.2es, I=%.2eA", carrier_type, t_value * self.delta_t + t_tol, q_value / self.t_bin)
+            signals_found += accumulate_current(
+                bin_accumulators, time_point.ravel(), x_num.ravel(), y_num.ravel(), signals.ravel(),
+                n_x, n_y, self.read_ele_num, x_min, x_max, self.delta_t, t_tol, self.t_bin,
+            )
 
-                    # 获取路径点的电极编号
-                    x_num = path_reduced[step_idx][4] + (j - x_span)
-                    y_num = path_reduced[step_idx][5] + (k - y_span)
-                    
-                    # 检查电极编号是否有效
-                    if 0 <= x_num < n_x and 0 <= y_num < n_y:
-                        target_electrode = x_num * n_y + y_num
-                        if target_electrode < self.read_ele_num:
-                            time_point = path_reduced[step_idx][3]
-                            current_value = signal_value / self.t_bin
-                            time_value = time_point * self.delta_t + t_tol
-                            if time_value < x_min:
-                                bin_idx = 0
-                            elif time_value >= x_max:
-                                bin_idx = histograms[target_electrode].GetNbinsX() + 1
-                            else:
-                                bin_idx = int((time_value - x_min) / bin_width) + 1
-                            bin_accumulators[target_electrode][bin_idx] += current_value
-                            signals_found += 1
-                            
-                            # 调试前几个信号
-                            if signals_found <= 3:
-                                logger.info(f"{carrier_type}信号: t={time_point*self.delta_t+t_tol:.2e}s, I={current_value:.2e}A, 电极={target_electrode}")
+        self._flush_bin_accumulators(histograms, bin_accumulators)
+        return signals_found
 
+    @staticmethod
+    def _flush_bin_accumulators(histograms, bin_accumulators):
+        """把电极 × bin 的累加结果写入直方图 (含上下溢 bin)"""
         for electrode_idx, accumulator in enumerate(bin_accumulators):
             nonzero_bins = np.nonzero(accumulator)[0]
             hist = histograms[electrode_idx]
@@ -397,8 +438,6 @@ class CalCurrent:
                     hist.GetBinContent(int(bin_idx)) + float(accumulator[bin_idx])
                 )
             hist.SetEntries(hist.GetEntries() + float(np.sum(accumulator != 0.0)))
-
-        return signals_found
     
     def _apply_smoothing(self):
         """对电流直方图进行多阶段平滑，减少高频噪声"""
@@ -609,6 +648,10 @@ class CalCurrent:
 class CalCurrentGain(CalCurrent):
     '''Calculation of gain carriers and gain current, simplified version'''
     def __init__(self, my_d, my_f, my_current):
+        self.timings = StageTimings()
+        self.signal_mode = getattr(my_current, "signal_mode", "stored")
+        self.drift_workers = getattr(my_current, "drift_workers", 1)
+        self.drift_chunk_size = getattr(my_current, "drift_chunk_size", 4096)
         self.t_bin = t_bin[my_d.dimension]
         self.t_end = t_end[my_d.dimension]
         self.t_start = t_start[my_d.dimension]
@@ -706,7 +749,7 @@ class CalCurrentGain(CalCurrent):
     def _build_local_gain_carriers(self, my_d, my_f, my_current, gain_positions,
                                    gain_electron_charges, gain_hole_charges,
                                    gain_times, gain_signals):
-        cal_coefficient = Material(my_d.material, avalanche_model=my_d.avalanche_model).cal_coefficient
+        cal_coefficient_many = Material(my_d.material, avalanche_model=my_d.avalanche_model).cal_coefficient_many
         min_pairs = max(float(getattr(my_d, "gain_pair_threshold", 0.05)), 0.0)
         max_carriers = int(getattr(my_d, "gain_max_carriers", 50000))
         emit_slices = max(1, int(getattr(my_d, "local_gain_emit_slices", 1)))
@@ -717,50 +760,51 @@ class CalCurrentGain(CalCurrent):
         for carrier_system in (my_current.electron_system, my_current.hole_system):
             if carrier_system is None:
                 continue
-            for carrier_idx, path in enumerate(carrier_system.paths):
-                if len(path) < 2:
+            # 整个系统所有路径段的积分采样点一次取场
+            nodes, counts = stack_paths(carrier_system.paths)
+            seg_start = segment_starts(counts)
+            if len(seg_start) == 0:
+                continue
+            seg_offsets = np.concatenate(([0], np.cumsum(np.maximum(counts - 1, 0))))
+            points = nodes[:, :3]
+            fractions = (np.arange(samples) + 0.5) / samples
+            seg_delta = points[seg_start + 1] - points[seg_start]
+            sample_xyz = points[seg_start, None, :] + fractions[None, :, None] * seg_delta[:, None, :]
+            field_vectors, field_valid = get_e_field_many(my_f, sample_xyz.reshape(-1, 3))
+            field_vectors = field_vectors.reshape(len(seg_start), samples, 3)
+            field_valid = field_valid.reshape(len(seg_start), samples)
+            field_lengths = np.linalg.norm(field_vectors, axis=2)
+
+            # 每个路径段的电离积分: 沿电场方向的漂移长度 × 碰撞电离系数, 所有采样点一次计算
+            seg_sign = np.repeat(np.where(carrier_system.charges[:len(counts)] < 0, -1.0, 1.0), np.maximum(counts - 1, 0))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                drift_lengths = seg_sign[:, None] * np.einsum('ij,ikj->ik', seg_delta, field_vectors) / field_lengths
+            usable = field_valid & (field_lengths > 0) & (drift_lengths > 0)
+            alpha = cal_coefficient_many(field_lengths, seg_sign[:, None], my_d.temperature)
+            alpha = np.maximum(np.where(np.isfinite(alpha), alpha, 0.0), 0.0)
+            seg_exponents = np.where(usable, alpha * (drift_lengths / samples) * 1e-4, 0.0).sum(axis=1)
+            seg_field_failures = np.count_nonzero(~field_valid, axis=1)
+
+            for carrier_idx in range(len(counts)):
+                if counts[carrier_idx] < 2:
                     continue
 
                 active_pairs = abs(carrier_system.charges[carrier_idx])
                 pending_pairs = 0.0
                 if active_pairs <= 0:
                     continue
-                charge_sign = -1 if carrier_system.charges[carrier_idx] < 0 else 1
-                for point0, point1 in zip(path[:-1], path[1:]):
-                    x0, y0, z0, t0 = point0
-                    x1, y1, z1, t1 = point1
+
+                for segment_idx in range(seg_offsets[carrier_idx], seg_offsets[carrier_idx + 1]):
+                    x0, y0, z0, t0 = nodes[seg_start[segment_idx]].tolist()
+                    x1, y1, z1, t1 = nodes[seg_start[segment_idx] + 1].tolist()
                     dx = x1 - x0
                     dy = y1 - y0
                     dz = z1 - z0
                     if dx == 0 and dy == 0 and dz == 0:
                         continue
 
-                    exponent = 0.0
-                    for sample_idx in range(samples):
-                        fraction = (sample_idx + 0.5) / samples
-                        x = x0 + fraction * (x1 - x0)
-                        y = y0 + fraction * (y1 - y0)
-                        z = z0 + fraction * (z1 - z0)
-                        try:
-                            field_vector = my_f.get_e_field_cached(x, y, z)
-                            field = Vector(*field_vector).get_length()
-                        except Exception:
-                            field_failures += 1
-                            continue
-                        if field <= 0:
-                            continue
-                        direction = 1.0 if charge_sign > 0 else -1.0
-                        drift_length_um = direction * (
-                            dx * field_vector[0] + dy * field_vector[1] + dz * field_vector[2]
-                        ) / field
-                        if drift_length_um <= 0:
-                            continue
-                        alpha = cal_coefficient(field, charge_sign, my_d.temperature)
-                        if not math.isfinite(alpha):
-                            alpha = 0.0
-                        alpha = max(alpha, 0.0)
-                        exponent += alpha * (drift_length_um / samples) * 1e-4
-
+                    field_failures += int(seg_field_failures[segment_idx])
+                    exponent = float(seg_exponents[segment_idx])
                     if not math.isfinite(exponent):
                         continue
                     exponent = min(exponent, 50.0)
@@ -819,7 +863,7 @@ class CalCurrentGain(CalCurrent):
                                         self.n_bin, self.t_start, self.t_end))
 
 class CalCurrentG4P(CalCurrent):
-    def __init__(self, my_d, my_f, my_g4, batch, keep_drift_paths=True):
+    def __init__(self, my_d, my_f, my_g4, batch, keep_drift_paths=None):
         G4P_carrier_list = CarrierListFromG4P(my_d.material, my_g4, batch)
         self.generated_pairs = sum(G4P_carrier_list.ionized_pairs)
         super().__init__(
@@ -835,7 +879,7 @@ class CalCurrentG4P(CalCurrent):
 
 
 class CalCurrentToyMIP(CalCurrent):
-    def __init__(self, my_d, my_f, source: ToyMIPLineSource, keep_drift_paths=True):
+    def __init__(self, my_d, my_f, source: ToyMIPLineSource, keep_drift_paths=None):
         super().__init__(
             my_d,
             my_f,
@@ -846,7 +890,7 @@ class CalCurrentToyMIP(CalCurrent):
 
 
 class CalCurrentLaser(CalCurrent):
-    def __init__(self, my_d, my_f, my_l, keep_drift_paths=True):
+    def __init__(self, my_d, my_f, my_l, keep_drift_paths=None):
         super().__init__(
             my_d,
             my_f,
@@ -869,9 +913,9 @@ class CalCurrentLaser(CalCurrent):
             convolved_negative_cu.Reset()
             convolved_sum_cu.Reset()
 
-            signal_convolution(self.positive_cu[i],convolved_positive_cu,[my_l.timePulse])
-            signal_convolution(self.negative_cu[i],convolved_negative_cu,[my_l.timePulse])
-            signal_convolution(self.sum_cu[i],convolved_sum_cu,[my_l.timePulse])
+            signal_convolution(self.positive_cu[i],convolved_positive_cu,[my_l.timePulse],("laser", my_l.temporal_FWHM))
+            signal_convolution(self.negative_cu[i],convolved_negative_cu,[my_l.timePulse],("laser", my_l.temporal_FWHM))
+            signal_convolution(self.sum_cu[i],convolved_sum_cu,[my_l.timePulse],("laser", my_l.temporal_FWHM))
 
             self.positive_cu[i] = convolved_positive_cu
             self.negative_cu[i] = convolved_negative_cu
@@ -884,7 +928,7 @@ class CalCurrentLaser(CalCurrent):
                                         self.n_bin, self.t_start, self.t_end)
                 convolved_gain_positive_cu.Reset()
                 convolved_gain_negative_cu.Reset()
-                signal_convolution(self.gain_current.positive_cu[i],convolved_gain_positive_cu,[my_l.timePulse])
-                signal_convolution(self.gain_current.negative_cu[i],convolved_gain_negative_cu,[my_l.timePulse])
+                signal_convolution(self.gain_current.positive_cu[i],convolved_gain_positive_cu,[my_l.timePulse],("laser", my_l.temporal_FWHM))
+                signal_convolution(self.gain_current.negative_cu[i],convolved_gain_negative_cu,[my_l.timePulse],("laser", my_l.temporal_FWHM))
                 self.gain_current.positive_cu[i] = convolved_gain_positive_cu
                 self.gain_current.negative_cu[i] = convolved_gain_negative_cu
@@ -141,92 +141,120 @@ class CarrierCluster:
 
 
 
+# diffuse_many 的结束状态
+DIFFUSING = 0
+COLLECTED = 1
+OUT_OF_BOUND = 2
+
+
+def diffuse_many(x, y, z, charge, my_d, rng):
+    """
+    Array version of CarrierCluster diffusion: all carriers of a layer take their
+    t_bin random-walk steps together until each is collected or leaves the sensor,
+    with the same clamping and end conditions as diffuse_single_step,
+    diffuse_end and diffuse_not_in_sensor. Carriers that already satisfy an end
+    condition at their start point are dropped, as CalCurrentDiffuse always did;
+    carriers still diffusing after t_end can only end out of bound and stop there.
+    Returns (row, column, |charge|) of the collected carriers, in input order
+    """
+    x = np.array(x, dtype=np.float64)
+    y = np.array(y, dtype=np.float64)
+    z = np.array(z, dtype=np.float64)
+    charge = np.asarray(charge, dtype=np.float64)
+    t = np.zeros(len(x))
+    l_x, l_y, l_z = my_d.l_x, my_d.l_y, my_d.l_z
+
+    # 迁移率只与载流子种类有关 (扩散时电场取 0), 每层算一次
+    kboltz = 8.617385e-5 #eV/K
+    Neff = float(my_d.doping['Donors']) - float(my_d.doping['Acceptors']) # assuming able to convert
+    mu = Material(my_d.material).cal_mobility_many(my_d.temperature, Neff, charge, 0.0)
+    diffusion = np.sqrt(2.0*kboltz*mu*my_d.temperature*t_bin)*1e4
+
+    def end_condition(index, condition):
+        out = (x[index] <= 0) | (x[index] >= l_x) | (y[index] <= 0) | (y[index] >= l_y) | (z[index] >= l_z)
+        condition = np.where(out, OUT_OF_BOUND, condition)
+        mod_x = x[index] % pixel
+        mod_y = y[index] % pixel
+        collect = (mod_x > 7.5) & (mod_x < 17.5) & (mod_y > 7.5) & (mod_y < 17.5) & (t[index] <= t_end)
+        return np.where(collect, COLLECTED, condition)
+
+    condition = np.full(len(x), DIFFUSING, dtype=np.int8)
+    active = np.flatnonzero(end_condition(np.arange(len(x)), condition) == DIFFUSING)
+    while active.size:
+        step_x = x[active] + rng.normal(0.0, 1.0, active.size)*diffusion[active]
+        step_y = y[active] + rng.normal(0.0, 1.0, active.size)*diffusion[active]
+        x[active] = np.where(step_x >= l_x, l_x, np.where(step_x < 0, 0, step_x))
+        y[active] = np.where(step_y >= l_y, l_y, np.where(step_y < 0, 0, step_y))
+        t[active] += t_bin
+        ended = end_condition(active, np.where(z[active] <= 0, COLLECTED, DIFFUSING))
+        # t_end 之后不会再被收集, 原来的逐步循环只会一直走到出界, 直接结束
+        ended[(ended == DIFFUSING) & (t[active] > t_end)] = OUT_OF_BOUND
+        condition[active] = ended
+        active = active[ended == DIFFUSING]
+
+    collected = condition == COLLECTED
+    return x[collected] // pixel, y[collected] // pixel, np.abs(charge[collected])
+
+
+def pixel_charge_matrix(row, column, charge, Xbins, Ybins):
+    """
+    Collected charge in the bins of the TH2F(Xbins, 0, Xbins, Ybins, 0, Ybins) that
+    CalCurrentDiffuse filled with (row, column, charge), under/overflow included,
+    accumulated in float32 and in fill order like TH2F.Fill
+    """
+    matrix = np.zeros((Xbins + 2, Ybins + 2), dtype=np.float32)
+    bin_x = np.where(row < Xbins, 1 + row.astype(np.int64), Xbins + 1)
+    bin_y = np.where(column < Ybins, 1 + column.astype(np.int64), Ybins + 1)
+    np.add.at(matrix, (bin_x, bin_y), charge.astype(np.float32))
+    return matrix
+
+
 class CalCurrentDiffuse:
     """Calculation of diffusion electrons in pixel detector"""
-    def __init__(self, my_d, my_g4):
+    def __init__(self, my_d, my_g4, seed=None):
+        """seed: seed of the NumPy random walk; by default drawn from the random module"""
         batch = len(my_g4.localpositions)
         layer = len(my_g4.ltz)
         G4P_carrier_list = PixelCarrierListFromG4P(my_d, my_g4)                 
+        self.rng = np.random.default_rng(random.getrandbits(64) if seed is None else seed)
         self.collected_charge=[] #temp paras don't save as self.
         self.sum_signal = []
         self.event = []        
+        Xbins=int(my_d.l_x // pixel)
+        Ybins=int(my_d.l_y // pixel)
+        matrix = np.zeros((Xbins + 2, Ybins + 2), dtype=np.float32)
         for k in range(batch):
             l_dict = {}
             signal_charge = []
             for j in range(layer):
-                self.electrons = []
-                self.charge,self.collected_charge = [],[]#same like before
-                self.row,self.column=[],[]
                 Hit = {'index':[],'charge':[]} 
-                #print(len(G4P_carrier_list.ionized_pairs[k][j]))
                 print("%f pairs of carriers are generated from G4 in event_ %d layer %d" %(sum(G4P_carrier_list.ionized_pairs[k][j]),k,j))
-                #print(G4P_carrier_list.track_position[k][j])
-                for i in range(len(G4P_carrier_list.track_position[k][j])):
-                    electron = CarrierCluster(G4P_carrier_list.track_position[k][j][i][0],\
-                                       G4P_carrier_list.track_position[k][j][i][1],\
-                                       G4P_carrier_list.track_position[k][j][i][2],\
-                                       0,\
-                                       -1*G4P_carrier_list.ionized_pairs[k][j][i],\
-                                       1)
-                    if not electron.diffuse_not_in_sensor(my_d):
-                        self.electrons.append(electron)
-                self.diffuse_loop(my_d)
-
-                Xbins=int(my_d.l_x // electron.pixel)
-                Ybins=int(my_d.l_y // electron.pixel)
-                Xup=my_d.l_x // electron.pixel
-                Yup=my_d.l_y // electron.pixel
-                test_charge = ROOT.TH2F("charge", "charge",Xbins, 0, Xup, Ybins, 0, Yup)
-                for i in range(len(self.row)):
-                    #test_charge.SetBinContent(int(self.row[i]),int(self.column[i]),self.charge[i])
-                    test_charge.Fill(self.row[i],self.column[i],self.charge[i])
-                    
-                sum_fired = ROOT.TH2F("charge", "Pixel Detector charge",Xbins, 0, Xup, Ybins, 0, Yup)
-                sum_fired.Add(test_charge)
-                
-                self.sum_charge = ROOT.TH2F("charge", "Pixel Detector charge",Xbins, 0, Xup, Ybins, 0, Yup)
-                self.sum_charge.Add(test_charge)
-                
-                test_charge.Reset
-                collected_charge=self.pixel_charge(my_d,Xbins,Ybins)
-                signal_charge.append(collected_charge)
-                
-                Hit["index"],Hit["charge"] = self.pixel_fired(sum_fired,Xbins,Ybins)
+                track = np.array(G4P_carrier_list.track_position[k][j], dtype=np.float64).reshape(-1, 3)
+                self.row, self.column, self.charge = diffuse_many(
+                    track[:, 0], track[:, 1], track[:, 2],
+                    -1*np.array(G4P_carrier_list.ionized_pairs[k][j], dtype=np.float64),
+                    my_d, self.rng,
+                )
+                matrix = pixel_charge_matrix(self.row, self.column, self.charge, Xbins, Ybins)
+                Hit["index"],Hit["charge"] = self.pixel_fired(matrix,Xbins,Ybins)
+                self.collected_charge = [[x, y, charge] for (x, y), charge in zip(Hit["index"], Hit["charge"])]
+                signal_charge.append(self.collected_charge)
                 l_dict[j] = Hit
                 print("%f electrons are collected in event_ %d,layer %d" %(sum(self.charge),k,j))
             self.sum_signal.append(signal_charge)
             self.event.append(l_dict)
-            #print(signal_charge)
             del signal_charge
-        #print(self.sum_signal)
-        #print(self.event)
-
-    def diffuse_loop(self, my_d):
-        for electron in self.electrons:
-            while not electron.diffuse_not_in_sensor(my_d):
-                electron.diffuse_single_step(my_d)
-                electron.diffuse_end()
-            x,y,charge_quantity = electron.pixel_position(my_d)
-            if (x != -1)&(y != -1): 
-                self.row.append(x)
-                self.column.append(y)
-                self.charge.append(charge_quantity)
-
-    def pixel_charge(self,my_d,Xbins,Ybins):
-        for x in range(Xbins):
-            for y in range(Ybins):
-                charge =self.sum_charge.GetBinContent(x,y)
-                if (charge>0.2):
-                    self.collected_charge.append([x,y,charge])        
-        return self.collected_charge
-    
-    def pixel_fired(self,tot,Xbins,Ybins):
-        Hit = {'index':[],'charge':[]} 
-        for x in range(Xbins):
-            for y in range(Ybins):
-                charge =tot.GetBinContent(x,y)
-                if (charge>0.2):
-                    Hit["index"].append([x,y])
-                    Hit["charge"].append(charge)       
-        return Hit["index"],Hit["charge"]
 
+        # 最后一层的电荷分布, 供 draw_charge 使用
+        self.sum_charge = ROOT.TH2F("charge", "Pixel Detector charge",Xbins, 0, Xbins, Ybins, 0, Ybins)
+        self.sum_charge.SetContent(np.ascontiguousarray(matrix.T, dtype=np.float64).ravel())
+
+    def pixel_fired(self,matrix,Xbins,Ybins):
+        """Bins (x, y) for x < Xbins, y < Ybins of the charge matrix holding more than 0.2 electrons"""
+        # 按 TH2F.GetBinContent 的 double 比较阈值
+        contents = matrix[:Xbins, :Ybins].astype(np.float64)
+        index_x, index_y = np.nonzero(contents > 0.2)
+        return (
+            [[int(x), int(y)] for x, y in zip(index_x, index_y)],
+            contents[index_x, index_y].tolist(),
+        )
@@ -10,10 +10,12 @@ import math
 import logging
 import time
 import random
+import zlib
 
 import numpy as np
 
-from .model import Material
+from .model import Material, MobilityTable
+from .path_store import PATH_DTYPES, REDUCED_PATH_DTYPES, PathStore, segment_starts, stack_paths
 from raser.supports.math import Vector
 
 tolerance_default = 1e-6
@@ -25,11 +27,50 @@ if not logging.getLogger().handlers:
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger.setLevel(logging.INFO)
 
+def get_e_field_many(my_f, xyz):
+    """
+    批量电场获取: 优先使用场对象的 get_e_field_many, 否则逐点调用 get_e_field_cached.
+    返回 (N, 3) 电场数组和有效掩码; 获取失败的点掩码为 False.
+    """
+    xyz = np.asarray(xyz, dtype=np.float64).reshape(-1, 3)
+    if hasattr(my_f, "get_e_field_many"):
+        try:
+            e_field = np.asarray(my_f.get_e_field_many(xyz), dtype=np.float64).reshape(-1, 3)
+            return e_field, np.all(np.isfinite(e_field), axis=1)
+        except Exception as e:
+            logger.warning(f"批量电场获取失败，逐点计算: {e}")
+
+    e_field = np.zeros((len(xyz), 3), dtype=np.float64)
+    valid = np.ones(len(xyz), dtype=bool)
+    for row, (x, y, z) in enumerate(xyz):
+        try:
+            value = my_f.get_e_field_cached(x, y, z)
+            if value is None or len(value) != 3:
+                raise ValueError("无效的电场值")
+            e_field[row] = value
+        except Exception as e:
+            logger.warning(f"位置 ({x:.3f}, {y:.3f}, {z:.3f}) 电场获取失败: {e}")
+            valid[row] = False
+    return e_field, valid
+
+
+def get_doping_many(my_f, xyz):
+    """批量掺杂浓度获取: 优先使用场对象的 get_doping_many, 否则逐点调用 get_doping_cached"""
+    xyz = np.asarray(xyz, dtype=np.float64).reshape(-1, 3)
+    if hasattr(my_f, "get_doping_many"):
+        return np.asarray(my_f.get_doping_many(xyz), dtype=np.float64).reshape(-1)
+    return np.array([
+        VectorizedCarrierSystem._scalar_float(my_f.get_doping_cached(x, y, z), "doping")
+        for x, y, z in xyz
+    ], dtype=np.float64)
+
+
 class VectorizedCarrierSystem:
     """完全自包含的向量化载流子系统 - 替代CarrierCluster"""
     
     def __init__(self, all_positions, all_charges, all_times, all_signals, material, carrier_type="electron", 
-                read_out_contact=None, my_d=None, keep_drift_paths=True):
+                read_out_contact=None, my_d=None, keep_drift_paths=True, drift_mode=None, rng=None,
+                signal_stream=None):
         # 输入数据验证
         self._validate_inputs(all_positions, all_charges, all_times)
             
@@ -44,6 +85,10 @@ class VectorizedCarrierSystem:
         self.read_out_contact = read_out_contact
         self.my_d = my_d
         self.keep_drift_paths = bool(keep_drift_paths)
+        # 流式信号: 漂移时直接累加感应电流, 不再保存每步的简化路径
+        self.signal_stream = signal_stream
+        self.drift_mode = self._resolve_drift_mode(my_d, drift_mode)
+        self.rng = self._create_rng(my_d, rng)
         
         # Material 对象
         self.material = self._create_material(material)
@@ -56,8 +101,12 @@ class VectorizedCarrierSystem:
         # 物理常数
         self.kboltz = 8.617385e-5
         self.e0 = 1.60217733e-19
-        self.mobility = Material(my_d.material).cal_mobility
-        self._mobility_cache = {}
+        mobility_material = Material(my_d.material)
+        self.mobility = mobility_material.cal_mobility
+        self.mobility_many = mobility_material.cal_mobility_many
+        if getattr(my_d, "vector_mobility_table", False):
+            # 整体数组漂移按 (log10|掺杂|, 电场) 网格查表
+            self.mobility_many = MobilityTable(mobility_material, self._params['temperature'])
 
         # 性能统计
         self.performance_stats = {
@@ -71,6 +120,8 @@ class VectorizedCarrierSystem:
         
         # 信号存储
         self.signals = self._initialize_signal_storage_per_carrier(len(all_charges), read_out_contact)
+        # 与 signals 相同的段信号, 按 (电极, 路径段) 拼接: 见 _store_carrier_signals
+        self.segment_signals = None
         self._signal_warning_logged = False
         
         logger.info(f"向量化系统初始化: {len(all_charges)}个{carrier_type}")
@@ -116,26 +167,27 @@ class VectorizedCarrierSystem:
         # 初始化 reduced_positions
         self.reduced_positions = np.zeros((len(all_positions), 2), dtype=np.float64)
         
-        # 初始化路径存储
-        self.paths = [[] for _ in range(len(all_positions))] if self.keep_drift_paths else []
-        self.paths_reduced = [[] for _ in range(len(all_positions))]
+        # 初始化路径存储: 紧凑的分块数组, 按载流子读取
+        n_carriers = len(all_positions)
+        self.paths = PathStore(n_carriers, PATH_DTYPES) if self.keep_drift_paths else []
+        self.paths_reduced = PathStore(n_carriers, REDUCED_PATH_DTYPES)
         
         # 初始化每个载流子的路径
-        for i, pos in enumerate(all_positions):
-            x, y, z = pos
-            t = self.times[i]
-            
-            # 完整路径
-            if self.keep_drift_paths:
-                self.paths[i].append([x, y, z, t])
-            
-            # 简化坐标路径
-            x_reduced, y_reduced = self._calculate_reduced_coords(x, y, self.my_d)
-            x_num, y_num = self._calculate_electrode_numbers(x, y, self.my_d)
-            self.paths_reduced[i].append([x_reduced, y_reduced, z, t, x_num, y_num])
-            
-            # 存储简化坐标
-            self.reduced_positions[i] = [x_reduced, y_reduced]
+        positions = np.asarray(all_positions, dtype=np.float64).reshape(-1, 3)
+        carriers = np.arange(n_carriers)
+        x_reduced, y_reduced = self._calculate_reduced_coords(positions[:, 0], positions[:, 1], self.my_d)
+        x_num, y_num = self._calculate_electrode_numbers_many(positions[:, 0], positions[:, 1], self.my_d)
+        
+        # 完整路径
+        if self.keep_drift_paths:
+            self.paths.append(carriers, positions[:, 0], positions[:, 1], positions[:, 2], self.times)
+        
+        # 简化坐标路径
+        self.paths_reduced.append(carriers, x_reduced, y_reduced, positions[:, 2], self.times, x_num, y_num)
+        
+        # 存储简化坐标
+        self.reduced_positions[:, 0] = x_reduced
+        self.reduced_positions[:, 1] = y_reduced
     
     def _initialize_signal_storage_per_carrier(self, n_carriers, read_out_contact):
         """为每个载流子初始化信号存储结构"""
@@ -247,7 +299,29 @@ class VectorizedCarrierSystem:
             logger.info("使用用户配置的最小电场强度: %.2f V/cm", custom_min_field)
             return custom_min_field
         return 1.0
-    
+
+    def _resolve_drift_mode(self, my_d, drift_mode):
+        """选择漂移单步实现: scalar 逐个载流子, array 整体数组"""
+        if drift_mode is None:
+            drift_mode = getattr(my_d, "vector_drift_mode", "scalar")
+        if drift_mode not in ("scalar", "array"):
+            raise ValueError(f"Unsupported vector_drift_mode: {drift_mode}")
+        return drift_mode
+
+    def _create_rng(self, my_d, rng):
+        """数组漂移使用的随机数发生器; 电子和空穴使用不同的子序列"""
+        if rng is not None:
+            return rng
+        seed = getattr(my_d, "vector_random_seed", None)
+        if seed is None:
+            return np.random.default_rng()
+        try:
+            seed = int(seed)
+        except (TypeError, ValueError):
+            logger.warning("参数 vector_random_seed 转换失败，使用随机种子: %s", seed)
+            return np.random.default_rng()
+        return np.random.default_rng([seed, zlib.crc32(self.carrier_type.encode())])
+
     def _calculate_reduced_coords(self, x, y, my_d):
         """计算简化坐标"""
         #use_reduced = (self.read_out_contact and 
@@ -283,6 +357,12 @@ class VectorizedCarrierSystem:
             # 返回中心电极
             return my_d.x_ele_num//2, my_d.y_ele_num//2
 
+    def _calculate_electrode_numbers_many(self, x, y, my_d):
+        """批量计算电极编号, 取整方式与 _calculate_electrode_numbers 一致"""
+        x_num = np.trunc((x - my_d.l_x/2 + (my_d.x_ele_num%2)*my_d.p_x/2.0) // my_d.p_x + my_d.x_ele_num/2)
+        y_num = np.trunc((y - my_d.l_y/2 + (my_d.y_ele_num%2)*my_d.p_y/2.0) // my_d.p_y + my_d.y_ele_num/2)
+        return x_num.astype(np.int64), y_num.astype(np.int64)
+
     def _check_boundary_conditions(self, x, y, z, my_d):
         """边界条件检查 - 大型器件优化"""
         l_x, l_y, l_z = my_d.l_x, my_d.l_y, my_d.l_z
@@ -303,6 +383,22 @@ class VectorizedCarrierSystem:
         
         return out_of_bound
 
+    def _check_boundary_conditions_many(self, positions, my_d):
+        """批量边界条件检查, 返回越界掩码"""
+        tolerance = self._params['boundary_tolerance']
+        upper = np.array([my_d.l_x, my_d.l_y, my_d.l_z], dtype=np.float64) + tolerance
+        out_of_bound = np.any((positions <= -tolerance) | (positions >= upper), axis=1)
+
+        for x, y, z in positions[out_of_bound][:max(0, 10 - self._boundary_log_count)]:
+            self._boundary_log_count += 1
+            logger.info(
+                "%s 越界终止 #%d: (x=%.3f, y=%.3f, z=%.3f) um, 容差=%.2f, 盒界=(%.2f, %.2f, %.2f)",
+                self.carrier_type, self._boundary_log_count, x, y, z,
+                tolerance, my_d.l_x, my_d.l_y, my_d.l_z
+            )
+
+        return out_of_bound
+
     def drift_batch(self, my_d, my_f, delta_t=1e-12, max_steps=None):
         """批量漂移主函数 - 大型器件优化"""
         params = self._params
@@ -343,12 +439,20 @@ class VectorizedCarrierSystem:
         logger.info(f"初始状态: {initial_active}/{total_carriers} 个活跃载流子")
         
         active_indices = np.arange(total_carriers)
+        drift_step = self.drift_step_array if self.drift_mode == "array" else self.drift_step_batch
+        stream = self.signal_stream
+        if stream is not None:
+            stream.start(self)
 
         for step in range(planned_steps):
             if step % 100 == 0:
                 self._log_progress_drift(step, total_carriers)
-            
-            n_terminated = self.drift_step_batch(my_d, my_f, delta_t, step, active_indices)
+
+            if stream is not None:
+                steps_before = self.steps_drifted[active_indices]
+            n_terminated = drift_step(my_d, my_f, delta_t, step, active_indices)
+            if stream is not None:
+                stream.add_step(active_indices[self.steps_drifted[active_indices] > steps_before])
             self.performance_stats['total_steps'] += 1
             active_indices = active_indices[self.active[active_indices]]
             
@@ -422,12 +526,7 @@ class VectorizedCarrierSystem:
                     "doping",
                 )
                 intensity = self._scalar_float(intensity, "electric field intensity")
-                mobility_key = (params['temperature'], doping, bool(charge > 0), intensity)
-                if mobility_key in self._mobility_cache:
-                    mu = self._mobility_cache[mobility_key]
-                else:
-                    mu = self.mobility(params['temperature'], doping, charge, intensity)
-                    self._mobility_cache[mobility_key] = mu
+                mu = self.mobility(params['temperature'], doping, charge, intensity)
                 diffusion_constant = math.sqrt(2.0 * self.kboltz * params['temperature'] * mu * delta_t) * 1e4
             except Exception as e:
                 raise RuntimeError(f"迁移率计算失败: {e}")
@@ -444,6 +543,109 @@ class VectorizedCarrierSystem:
         self.performance_stats['carriers_terminated'] += n_terminated
         return n_terminated
 
+    def drift_step_array(self, my_d, my_f, delta_t, step=0, active_indices=None):
+        """整体数组单步漂移 - 对全部活跃载流子一次完成检查、取场、迁移率、扩散和位置更新"""
+        if active_indices is None:
+            active_indices = np.flatnonzero(self.active)
+        if len(active_indices) == 0:
+            return 0
+
+        params = self._params
+        n_terminated = 0
+
+        # 边界检查
+        self.performance_stats['boundary_checks'] += len(active_indices)
+        out_of_bound = self._check_boundary_conditions_many(self.positions[active_indices], my_d)
+        self._terminate_carriers(active_indices[out_of_bound], 1)
+        n_out = int(np.count_nonzero(out_of_bound))
+        self.performance_stats['boundary_terminations'] += n_out
+        n_terminated += n_out
+        indices = active_indices[~out_of_bound]
+
+        # 时间检查
+        timeout = self.times[indices] > params['max_vector_steps']
+        self._terminate_carriers(indices[timeout], 4)
+        n_terminated += int(np.count_nonzero(timeout))
+        indices = indices[~timeout]
+
+        # 电场获取和处理
+        e_field, valid = self._get_e_field_many(my_f, indices)
+        self._terminate_carriers(indices[~valid], 2)
+        indices, e_field = indices[valid], e_field[valid]
+        intensity = np.sqrt(np.einsum('ij,ij->i', e_field, e_field))
+
+        low_field = intensity <= params['min_field_strength']
+        self._terminate_carriers(indices[low_field], 3)
+        n_low = int(np.count_nonzero(low_field))
+        self.performance_stats['low_field_terminations'] += n_low
+        n_terminated += n_low
+        indices, e_field, intensity = indices[~low_field], e_field[~low_field], intensity[~low_field]
+
+        if len(indices) > 0:
+            # 迁移率计算
+            charges = self.charges[indices]
+            doping = self._get_doping_many(my_f, indices)
+            mu = self.mobility_many(params['temperature'], doping, charges, intensity)
+            if not np.all(np.isfinite(mu)):
+                raise RuntimeError(f"迁移率计算失败: {np.count_nonzero(~np.isfinite(mu))}个载流子迁移率无效")
+            diffusion_constant = np.sqrt(2.0 * self.kboltz * params['temperature'] * mu * delta_t) * 1e4
+
+            # 漂移和扩散位移
+            direction = np.where(charges > 0, 1.0, -1.0)
+            displacement = e_field * (direction * mu * delta_t * 1e4)[:, None]
+            displacement += self.rng.normal(0.0, 1.0, size=(len(indices), 3)) * diffusion_constant[:, None]
+
+            self._update_carrier_positions_many(indices, displacement)
+
+        self.performance_stats['carriers_terminated'] += n_terminated
+        return n_terminated
+
+    def _terminate_carriers(self, indices, end_condition):
+        self.active[indices] = False
+        self.end_conditions[indices] = end_condition
+
+    def _field_query_positions(self, indices):
+        return np.column_stack([self.reduced_positions[indices], self.positions[indices, 2]])
+
+    def _get_e_field_many(self, my_f, indices):
+        """批量电场获取, 返回电场数组和有效掩码"""
+        self.performance_stats['field_calculations'] += len(indices)
+        return get_e_field_many(my_f, self._field_query_positions(indices))
+
+    def _get_doping_many(self, my_f, indices):
+        """批量掺杂浓度获取"""
+        return get_doping_many(my_f, self._field_query_positions(indices))
+
+    def _update_carrier_positions_many(self, indices, displacement):
+        """批量更新载流子位置和路径"""
+        new_positions = self.positions[indices] + displacement
+        self.positions[indices] = new_positions
+        x_reduced, y_reduced = self._calculate_reduced_coords(new_positions[:, 0], new_positions[:, 1], self.my_d)
+        self.reduced_positions[indices, 0] = x_reduced
+        self.reduced_positions[indices, 1] = y_reduced
+        self.times[indices] += 1
+        self.steps_drifted[indices] += 1
+
+        # 更新路径
+        times = self.times[indices]
+        if self.keep_drift_paths:
+            self.paths.append(indices, new_positions[:, 0], new_positions[:, 1], new_positions[:, 2], times)
+        if self.signal_stream is not None:
+            return
+        x_num, y_num = self._calculate_electrode_numbers_many(new_positions[:, 0], new_positions[:, 1], self.my_d)
+        self.paths_reduced.append(
+            indices, self.reduced_positions[indices, 0], self.reduced_positions[indices, 1],
+            new_positions[:, 2], times, x_num, y_num,
+        )
+
+    def _reduced_nodes(self, indices):
+        """当前简化路径点 [x_red, y_red, z, t, x_num, y_num], 与 paths_reduced 的行一致"""
+        positions = self.positions[indices]
+        x_num, y_num = self._calculate_electrode_numbers_many(positions[:, 0], positions[:, 1], self.my_d)
+        return np.column_stack([
+            self.reduced_positions[indices], positions[:, 2], self.times[indices], x_num, y_num,
+        ]).astype(np.float64)
+
     def _get_e_field_reduced(self, my_f, x, y, z, idx, field_x=None, field_y=None):
         """安全的电场获取"""
         fx = x if field_x is None else field_x
@@ -499,12 +701,14 @@ class VectorizedCarrierSystem:
         
         # 更新路径
         if self.keep_drift_paths:
-            self.paths[idx].append([new_x, new_y, new_z, self.times[idx]])
+            self.paths.append_row(idx, (new_x, new_y, new_z, self.times[idx]))
+        if self.signal_stream is not None:
+            return
         x_num, y_num = self._calculate_electrode_numbers(new_x, new_y, self.my_d)
-        self.paths_reduced[idx].append([
+        self.paths_reduced.append_row(idx, (
             self.reduced_positions[idx][0], self.reduced_positions[idx][1], 
             new_z, self.times[idx], x_num, y_num
-        ])
+        ))
 
     def _log_progress_drift(self, step, total_carriers):
         """记录进度"""
@@ -589,10 +793,8 @@ class VectorizedCarrierSystem:
         logger.info(f"是否有辐射损伤: {has_irradiation}")
         
         # 检查路径数据
-        valid_paths = 0
-        for i, path in enumerate(self.paths_reduced):
-            if len(path) > 1:
-                valid_paths += 1
+        _, path_counts = stack_paths(self.paths_reduced)
+        valid_paths = int(np.count_nonzero(path_counts > 1))
         
         logger.info(f"有效路径数: {valid_paths}/{len(self.paths_reduced)}")
         
@@ -620,8 +822,79 @@ class VectorizedCarrierSystem:
         end_time = time.time()
         logger.info(f"批量信号计算完成: 耗时{end_time - start_time:.2f}秒")
 
+    def _stack_signal_paths(self, all_indices):
+        """
+        把所有有效路径 (至少两个点) 拼接成一个节点数组
+        返回 None 或包含以下数组的字典:
+            carriers: 有效载流子编号; nodes: (N, 6) 路径点 [x_red, y_red, z, t, x_num, y_num]
+            seg_start/seg_end: 每个路径段起点/终点在 nodes 中的下标; seg_carrier: 每段所属载流子
+            seg_counts: 每个载流子的路径段数
+        """
+        nodes, counts = stack_paths(self.paths_reduced)
+        keep = np.zeros(len(counts), dtype=bool)
+        keep[np.asarray(all_indices, dtype=np.int64)] = True
+        keep &= counts > 1
+        if not np.any(keep):
+            return None
+        nodes = nodes[np.repeat(keep, counts)]
+        seg_counts = counts[keep] - 1
+        seg_start = segment_starts(counts[keep])
+        carriers = np.flatnonzero(keep)
+        return {
+            'carriers': carriers,
+            'nodes': nodes,
+            'seg_start': seg_start,
+            'seg_end': seg_start + 1,
+            'seg_carrier': np.repeat(carriers, seg_counts),
+            'seg_counts': seg_counts,
+        }
+
+    def _calculate_segment_charges(self, stacked, my_f, delta_t, has_irradiation):
+        """每个路径段的有效电荷; 有辐照时乘以沿路径累积的陷阱衰减因子"""
+        charges = self.charges[stacked['seg_carrier']]
+        if not has_irradiation:
+            return charges
+
+        start_nodes = stacked['nodes'][stacked['seg_start']]
+        d_times = stacked['nodes'][stacked['seg_end'], 3] - start_nodes[:, 3]
+        trapping_rates = np.zeros(len(charges))
+        hole = charges >= 0
+        for mask, positive in ((hole, True), (~hole, False)):
+            if np.any(mask):
+                trapping_rates[mask] = self._get_trapping_rates_many(my_f, start_nodes[mask, :3], positive)
+
+        # 分段累积: 全局累积和减去每个载流子第一段之前的累积值
+        exponent = np.cumsum(trapping_rates * d_times * delta_t)
+        first_segment = np.cumsum(stacked['seg_counts']) - stacked['seg_counts']
+        offsets = exponent[first_segment] - trapping_rates[first_segment] * d_times[first_segment] * delta_t
+        exponent -= np.repeat(offsets, stacked['seg_counts'])
+        return charges * np.exp(-exponent)
+
+    def _store_carrier_signals(self, stacked, electrode_signals):
+        """
+        把每个电极的段信号数组按载流子拆分, 存成 signals[载流子][电极] 列表;
+        同时保留拼接的数组 segment_signals: electrodes 为计算成功的电极编号,
+        signals (len(electrodes), 段数) 与 nodes (段数, 6, 每段起点) 按段对齐
+        """
+        electrodes = [idx for idx, signals in enumerate(electrode_signals) if signals is not None]
+        self.segment_signals = {
+            'electrodes': np.array(electrodes, dtype=np.int64),
+            'signals': np.stack([electrode_signals[idx] for idx in electrodes]),
+            'nodes': stacked['nodes'][stacked['seg_start']],
+        }
+        bounds = np.cumsum(stacked['seg_counts'])[:-1]
+        split_signals = [
+            np.split(signals, bounds) if signals is not None else None
+            for signals in electrode_signals
+        ]
+        for row, carrier_idx in enumerate(stacked['carriers']):
+            self.signals[carrier_idx] = [
+                signals[row].tolist() if signals is not None else []
+                for signals in split_signals
+            ]
+
     def _calculate_signal_single_contact(self, all_indices, my_f, e0, delta_t, has_irradiation, my_d):
-        """单电极情况下的信号计算"""
+        """单电极情况下的信号计算: 每个相邻电极偏移只做一次权重电势查询"""
         x_span = self.read_out_contact[0]['x_span']
         y_span = self.read_out_contact[0]['y_span']
         p_x = my_d.p_x
@@ -629,231 +902,88 @@ class VectorizedCarrierSystem:
         
         total_electrodes = (2 * x_span + 1) * (2 * y_span + 1)
         logger.info(f"单电极配置: x_span={x_span}, y_span={y_span}, 总电极数={total_electrodes}")
-        
-        # 处理所有载流子
-        processed_count = 0
-        for carrier_idx in all_indices:
-            if self._process_carrier_signal_single(carrier_idx, my_f, e0, delta_t, has_irradiation, 
-                                                x_span, y_span, p_x, p_y, total_electrodes):
-                processed_count += 1
 
-            if carrier_idx % 10 == 0:
-                self._log_progress_signal(carrier_idx, len(all_indices))
-        
-        # 统计信号数据
-        total_carriers_with_signals = sum(1 for carrier_signals in self.signals if carrier_signals)
-        logger.info(f"单电极信号计算完成: 处理了{processed_count}个载流子, {total_carriers_with_signals}个载流子有信号")
+        stacked = self._stack_signal_paths(all_indices)
+        if stacked is None:
+            return
+        nodes = stacked['nodes']
+        seg_start = stacked['seg_start']
+        seg_end = stacked['seg_end']
+        charges = self._calculate_segment_charges(stacked, my_f, delta_t, has_irradiation)
 
-    def _process_carrier_signal_single(self, carrier_idx, my_f, e0, delta_t, has_irradiation, 
-                                    x_span, y_span, p_x, p_y, total_electrodes):
-        """处理单个载流子在单电极配置下的信号 - 修复存储结构"""
-        charge = self.charges[carrier_idx]
-        path_reduced = self.paths_reduced[carrier_idx]
-        
-        # 检查是否有有效的路径数据
-        if len(path_reduced) <= 1:
-            return False
-        
-        try:
-            n_points = len(path_reduced) - 1
-            
-            # 为这个载流子初始化电极信号存储
-            carrier_electrode_signals = [[] for _ in range(total_electrodes)]
-            
-            # 提取坐标和时间
-            x_coords = [point[0] for point in path_reduced[:-1]]
-            y_coords = [point[1] for point in path_reduced[:-1]]  
-            z_coords = [point[2] for point in path_reduced[:-1]]
+        # 跨越像素的路径段: 起点和终点都按终点所在像素平移 (delta_n * pitch)
+        delta_n = nodes[seg_end, 4:6] - nodes[seg_start, 4:6]
+        crossing = np.flatnonzero(np.any(delta_n != 0, axis=1))
+        crossing_shift = delta_n[crossing] * np.array([p_x, p_y])
+
+        electrode_signals = [None] * total_electrodes
+        for j in range(2 * x_span + 1):
+            x_shift = (j - x_span) * p_x
+            for k in range(2 * y_span + 1):
+                y_shift = (k - y_span) * p_y
+                electrode_idx = j * (2 * y_span + 1) + k
+                try:
+                    # 所有路径点和跨像素段端点一次查询
+                    shifted_nodes = nodes[:, :3] - np.array([x_shift, y_shift, 0.0])
+                    crossing_start = shifted_nodes[seg_start[crossing]]
+                    crossing_end = shifted_nodes[seg_end[crossing]]
+                    crossing_start[:, :2] += crossing_shift
+                    crossing_end[:, :2] += crossing_shift
+                    U_w = self._get_weighting_potentials_batch(
+                        my_f, *np.concatenate((shifted_nodes, crossing_start, crossing_end)).T, 0
+                    )
+                    n_nodes = len(nodes)
+                    n_crossing = len(crossing)
+                    dU_w = np.diff(U_w[:n_nodes])[seg_start]
+                    dU_w[crossing] = U_w[n_nodes + n_crossing:] - U_w[n_nodes:n_nodes + n_crossing]
+                    electrode_signals[electrode_idx] = charges * e0 * dU_w
+                except Exception as e:
+                    if not self._signal_warning_logged:
+                        logger.warning("%s 电极%d信号计算失败: %s", self.carrier_type, electrode_idx, e)
+                        self._signal_warning_logged = True
+
+        if all(signals is None for signals in electrode_signals):
+            return
+        self._store_carrier_signals(stacked, electrode_signals)
+        logger.info(f"单电极信号计算完成: {len(stacked['carriers'])}个载流子有信号, {len(seg_start)}个路径段")
 
-            delta_n_x = [path_reduced[i+1][4] - path_reduced[i][4] for i in range(len(path_reduced)-1)]
-            delta_n_y = [path_reduced[i+1][5] - path_reduced[i][5] for i in range(len(path_reduced)-1)]
-            
-            # 计算时间差
-            d_times = [path_reduced[i+1][3] - path_reduced[i][3] for i in range(len(path_reduced)-1)]
-            
-            # 处理所有电极偏移
-            success_count = 0
-            
-            for j in range(2 * x_span + 1):
-                x_shift = (j - x_span) * p_x
-                for k in range(2 * y_span + 1):
-                    y_shift = (k - y_span) * p_y
-                    electrode_idx = j * (2 * y_span + 1) + k
-                    
-                    try:
-                        # 批量计算起点和终点的权重电势
-                        U_w_1 = self._get_weighting_potentials_batch(
-                            my_f, 
-                            [x - x_shift + delta_n_x * p_x for (x,delta_n_x) in zip(x_coords, delta_n_x)], 
-                            [y - y_shift + delta_n_y * p_y for (y,delta_n_y) in zip(y_coords, delta_n_y)], 
-                            z_coords, 0
-                        )
-                        
-                        # 获取终点的权重电势
-                        x_coords_end = [point[0] for point in path_reduced[1:]]
-                        y_coords_end = [point[1] for point in path_reduced[1:]]
-                        z_coords_end = [point[2] for point in path_reduced[1:]]
-                        
-                        U_w_2 = self._get_weighting_potentials_batch(
-                            my_f, 
-                            [x - x_shift + delta_n_x * p_x for (x,delta_n_x) in zip(x_coords_end, delta_n_x)],
-                            [y - y_shift + delta_n_y * p_y for (y,delta_n_y) in zip(y_coords_end, delta_n_y)],
-                            z_coords_end, 0
-                        )
-                        
-                        # 计算电势差
-                        dU_w = [u2 - u1 for u1, u2 in zip(U_w_1, U_w_2)]
-                        
-                        # 处理陷阱效应
-                        if has_irradiation:
-                            charges = self._calculate_trapped_charges(
-                                charge, x_coords, y_coords, z_coords, d_times, delta_t, my_f
-                            )
-                        else:
-                            charges = [charge] * n_points
-                        
-                        # 计算信号
-                        signals = [q * e0 * du for q, du in zip(charges, dU_w)]
-                        
-                        # 存储到这个载流子的对应电极
-                        carrier_electrode_signals[electrode_idx] = signals
-                        success_count += 1
-                        
-                    except Exception as e:
-                        if not self._signal_warning_logged:
-                            carrier_type = "hole" if charge > 0 else "electron"
-                            logger.warning("%s 载流子%d电极%d信号计算失败: %s", carrier_type, carrier_idx, electrode_idx, e)
-                            self._signal_warning_logged = True
-                        continue
-            
-            # 存储这个载流子的所有电极信号
-            if success_count > 0:
-                self.signals[carrier_idx] = carrier_electrode_signals
-            
-            return success_count > 0
-            
-        except Exception as e:
-            logger.warning(f"处理载流子{carrier_idx}信号时出错: {e}")
-            return False
-     
     def _calculate_signal_multi_contact(self, all_indices, my_f, e0, delta_t, has_irradiation, my_d):
-        """多电极情况下的向量化信号计算 - 处理所有载流子"""
+        """多电极情况下的信号计算: 每个电极只做一次权重电势查询"""
         n_electrodes = len(self.read_out_contact)
         
         logger.info(f"多电极信号计算: {n_electrodes}个电极")
-        
-        # 批量处理所有载流子
-        processed_count = 0
-        for carrier_idx in all_indices:
-            if self._process_carrier_signal_multi(carrier_idx, my_f, e0, delta_t, has_irradiation, n_electrodes):
-                processed_count += 1
 
-            if carrier_idx % 10 == 0:
-                self._log_progress_signal(carrier_idx, len(all_indices))
-        
-        # 统计信号数据
-        total_signal_points = sum(len(sig_list) for sig_list in self.signals[:n_electrodes])
-        non_empty_electrodes = sum(1 for sig_list in self.signals[:n_electrodes] if len(sig_list) > 0)
-        
-        logger.info(f"多电极信号计算完成: 处理了{processed_count}个载流子, {n_electrodes}个电极")
-        logger.info(f"有信号的电极: {non_empty_electrodes}/{n_electrodes}, 总信号点数={total_signal_points}")
+        stacked = self._stack_signal_paths(all_indices)
+        if stacked is None:
+            return
+        nodes = stacked['nodes']
+        charges = self._calculate_segment_charges(stacked, my_f, delta_t, has_irradiation)
 
-    def _process_carrier_signal_multi(self, carrier_idx, my_f, e0, delta_t, has_irradiation, n_electrodes):
-        """处理单个载流子在多电极配置下的信号 - 返回是否成功处理"""
-        charge = self.charges[carrier_idx]
-        path_reduced = self.paths_reduced[carrier_idx]
-        
-        if len(path_reduced) <= 1:
-            return False
-        
-        try:
-            n_points = len(path_reduced) - 1
-            
-            # 调试信息
-            if carrier_idx < 5:  # 只打印前几个载流子的调试信息
-                logger.debug(f"多电极-载流子{carrier_idx}: 电荷={charge}, 路径点数={len(path_reduced)}")
-            
-            # 提取坐标和时间
-            x_coords = [point[0] for point in path_reduced[:-1]]
-            y_coords = [point[1] for point in path_reduced[:-1]]
-            z_coords = [point[2] for point in path_reduced[:-1]]
-            times = [point[3] for point in path_reduced[:-1]]
-            d_times = [path_reduced[i+1][3] - path_reduced[i][3] for i in range(len(path_reduced)-1)]
-            
-            # 为每个电极计算信号
-            success_count = 0
-            electrode_signals = []  # 按电极存储信号
-            
-            for j in range(n_electrodes):
-                try:
-                    # 批量计算起点和终点的权重电势
-                    U_w_1 = self._get_weighting_potentials_batch(
-                        my_f, x_coords, y_coords, z_coords, j
-                    )
-                    
-                    # 获取终点的权重电势
-                    x_coords_end = [point[0] for point in path_reduced[1:]]
-                    y_coords_end = [point[1] for point in path_reduced[1:]]
-                    z_coords_end = [point[2] for point in path_reduced[1:]]
-                    
-                    U_w_2 = self._get_weighting_potentials_batch(
-                        my_f, x_coords_end, y_coords_end, z_coords_end, j
-                    )
-                    
-                    # 计算电势差
-                    dU_w = [u2 - u1 for u1, u2 in zip(U_w_1, U_w_2)]
-                    
-                    # 检查权重电势值
-                    if carrier_idx < 3 and j < 3:  # 前几个载流子和电极
-                        logger.debug(f"电极{j}权重电势: U_w_1={U_w_1[:3]}, U_w_2={U_w_2[:3]}, dU_w={dU_w[:3]}")
-                    
-                    # 处理陷阱效应
-                    if has_irradiation:
-                        charges = self._calculate_trapped_charges(
-                            charge, x_coords, y_coords, z_coords, d_times, delta_t, my_f
-                        )
-                    else:
-                        charges = [charge] * n_points
-                    
-                    # 计算信号
-                    signals = [q * e0 * du for q, du in zip(charges, dU_w)]
-                    
-                    # 检查信号值
-                    if carrier_idx < 3 and j < 3 and any(s != 0 for s in signals[:3]):
-                        logger.debug(f"电极{j}信号: {signals[:3]}")
-                    
-                    # 存储信号
-                    electrode_signals.append(signals)
-                    
-                    # 确保信号列表足够长
-                    while len(self.signals) <= j:
-                        self.signals.append([])
-                    
-                    # 存储信号到对应的电极列表
-                    self.signals[j].extend(signals)
-                    success_count += 1
-                    
-                except Exception as e:
-                    if not getattr(self, '_signal_warning_logged', False):
-                        carrier_type = "hole" if charge > 0 else "electron"
-                        logger.warning("%s 载流子%d电极%d信号计算失败: %s", carrier_type, carrier_idx, j, e)
-                        self._signal_warning_logged = True
-                    continue
-            
-            # 记录这个载流子的信号统计
-            if electrode_signals and carrier_idx < 3:
-                total_signals = sum(len(sigs) for sigs in electrode_signals)
-                non_zero_total = sum(1 for sigs in electrode_signals for s in sigs )
-                logger.debug(f"多电极-载流子{carrier_idx}: 总信号数={total_signals}, 非零信号数={non_zero_total}")
-            
-            return success_count > 0
-            
-        except Exception as e:
-            logger.warning(f"处理载流子{carrier_idx}多电极信号时出错: {e}")
-            return False
+        electrode_signals = [None] * n_electrodes
+        for j in range(n_electrodes):
+            try:
+                U_w = self._get_weighting_potentials_batch(my_f, *nodes[:, :3].T, j)
+                dU_w = np.diff(U_w)[stacked['seg_start']]
+                electrode_signals[j] = charges * e0 * dU_w
+            except Exception as e:
+                if not self._signal_warning_logged:
+                    logger.warning("%s 电极%d信号计算失败: %s", self.carrier_type, j, e)
+                    self._signal_warning_logged = True
+
+        if all(signals is None for signals in electrode_signals):
+            return
+        self._store_carrier_signals(stacked, electrode_signals)
+        non_empty_electrodes = sum(1 for signals in electrode_signals if signals is not None)
+        logger.info(f"多电极信号计算完成: {len(stacked['carriers'])}个载流子, 有信号的电极: {non_empty_electrodes}/{n_electrodes}")
     
     def _get_weighting_potentials_batch(self, my_f, x_coords, y_coords, z_coords, electrode_idx):
         """获取路径点的权重电势；缺失值用 NaN 显式传播。"""
+        if hasattr(my_f, "get_w_p_many"):
+            return np.asarray(
+                my_f.get_w_p_many(np.column_stack([x_coords, y_coords, z_coords]), electrode_idx),
+                dtype=np.float64,
+            )
+
         potentials = []
         
         for i in range(len(x_coords)):
@@ -867,37 +997,24 @@ class VectorizedCarrierSystem:
                 potentials.append(np.nan)
                 continue
 
-            potentials.append(potential)
-            
-            if i < 3 and len(potentials) < 10:
-                logger.debug(f"权重电势[{i}]: ({x_coords[i]:.1f}, {y_coords[i]:.1f}, {z_coords[i]:.1f}) -> {potential:.6f}")
-        return potentials
+            potentials.append(self._scalar_float(potential, "weighting potential"))
+        return np.array(potentials, dtype=np.float64)
 
-    def _calculate_trapped_charges(self, initial_charge, x_coords, y_coords, z_coords, d_times, delta_t, my_f):
-        """计算考虑陷阱效应的电荷 - 使用列表推导式版本"""
-        n_points = len(x_coords)
-        
-        # 批量获取陷阱率
+    def _get_trapping_rates_many(self, my_f, xyz, positive):
+        """批量获取陷阱率, positive 为 True 时取空穴陷阱率; 单点查询失败时按 0 处理"""
+        get_trap_many = getattr(my_f, "get_trap_h_many" if positive else "get_trap_e_many", None)
+        if get_trap_many is not None:
+            return np.asarray(get_trap_many(np.asarray(xyz, dtype=np.float64)), dtype=np.float64)
+
+        get_trap_cached = my_f.get_trap_h_cached if positive else my_f.get_trap_e_cached
         trapping_rates = []
-        for i in range(n_points):
+        for x, y, z in xyz:
             try:
-                if initial_charge >= 0:  # 空穴
-                    trapping_rate = my_f.get_trap_h_cached(x_coords[i], y_coords[i], z_coords[i])
-                else:  # 电子
-                    trapping_rate = my_f.get_trap_e_cached(x_coords[i], y_coords[i], z_coords[i])
-                trapping_rates.append(trapping_rate)
-            except Exception as e:
+                trapping_rates.append(self._scalar_float(get_trap_cached(x, y, z), "trapping rate"))
+            except Exception:
                 trapping_rates.append(0.0)
-        
-        # 计算累积衰减因子
-        decay_factors = []
-        cumulative_factor = 0.0
-        for i in range(n_points):
-            cumulative_factor += trapping_rates[i] * d_times[i] * delta_t
-            decay_factors.append(math.exp(-cumulative_factor))
-        
-        return [initial_charge * factor for factor in decay_factors]
-    
+        return np.array(trapping_rates, dtype=np.float64)
+
     def verify_signal_transfer(self, original_carriers):
         """验证信号是否正确传递到原始载流子"""
         logger.info("=== 信号传递验证 ===")
@@ -931,8 +1048,3 @@ class VectorizedCarrierSystem:
             return False
         else:
             return True
-
-    def _log_progress_signal(self, carrier_idx, len_all_indices):
-        """记录进度"""
-        progress = carrier_idx / len_all_indices * 100
-        logger.info(f"第{carrier_idx}个载流子收集到信号 ({progress:.1f}%完成)")
@@ -10,16 +10,28 @@ import os
 import subprocess
 from time import time_ns
 
+import numpy as np
 import ROOT
 ROOT.gROOT.SetBatch(True)
 
+from ..analog.ngspice import IMPULSE_PROBE_CURRENT
+from ..analog.ngspice import netlist_hash
+from ..analog.ngspice import pwl_samples
 from ..analog.ngspice import set_ngspice_input
 from ..analog.ngspice import set_tmp_cir
 from raser.supports.output import output, delete_file
 
 tol = 1e-20
+# (netlist hash, t_bin, 电极数, 探测电流) -> (baseline, kernels, {nfft: kernel spectra})
+_COUPLING_CACHE = {}
 
-def cross_talk(name, cross_talk_cir, cu):
+def cross_talk(name, cross_talk_cir, cu, mode="transient"):
+    """
+    mode "transient": one ngspice run per electrode;
+    "linear": batched FFT multiply with the cached coupling matrix (see coupling_matrix)
+    """
+    if mode == "linear":
+        return cross_talk_linear(name, cross_talk_cir, cu)
     read_ele_num = len(cu)
     cross_talk_cu = []
     for i in range(read_ele_num):
@@ -83,3 +95,103 @@ def cross_talk(name, cross_talk_cir, cu):
         delete_file(raw)
 
     return cross_talk_cu
+
+
+def coupling_matrix(cross_talk_cir, read_ele_num, t_bin, path, probe_current=IMPULSE_PROBE_CURRENT):
+    """
+    Characterise the coupling network once with a triangular probe pulse (0 -> probe_current
+    -> 0 over 2 t_bin) on the input electrode. The wrdata outputs of the .cir are the responses
+    of the electrode itself and of its neighbours at distance 1, 2, ..., so electrode j sees
+    the current of electrode i through kernel[|i-j|]. Returns (baseline, kernels, spectra):
+    baseline (E, E) and kernels (E, E, n) in A/A, such that with input samples i[k] at k t_bin
+    electrode j carries sum_i baseline[j, i] + sum_k kernels[j, i, n-k] i[k] at n t_bin.
+    Kept in memory and next to the .cir as <name>_coupling_<hash>_<t_bin>_<E>_<current>.npz
+    """
+    key = (netlist_hash(cross_talk_cir), float(t_bin), int(read_ele_num), float(probe_current))
+    if key in _COUPLING_CACHE:
+        return _COUPLING_CACHE[key]
+    cache_file = "{}_coupling_{}_{:g}_{}_{:g}.npz".format(os.path.splitext(cross_talk_cir)[0], *key)
+    if os.path.exists(cache_file):
+        with np.load(cache_file) as stored:
+            baseline, kernels = stored["baseline"], stored["kernels"]
+    else:
+        pulse = "0,0,{:.9g},{:.9g},{:.9g},0".format(t_bin, probe_current, 2*t_bin)
+        label = "coupling_{}_{}".format(key[0], os.getpid())
+        tmp_cirs, raws = set_tmp_cir(1, path, [pulse], cross_talk_cir, label)
+        print("Running ngspice for cross talk coupling matrix...")
+        try:
+            subprocess.run(['ngspice', '-b', tmp_cirs[0]], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            if not os.path.exists(raws[0]):
+                raise RuntimeError("ngspice produced no output for {}".format(tmp_cirs[0]))
+            # wrdata: 每个输出一对 (时间, 值) 列, 从输入电极到最远的邻居
+            data = np.loadtxt(raws[0], ndmin=2)
+        finally:
+            delete_file(tmp_cirs[0])
+            delete_file(raws[0])
+        neighbor_num = data.shape[1] // 2
+        grid = np.arange(int(data[-1, 0]/t_bin + tol) + 1)*t_bin
+        baseline = np.zeros((read_ele_num, read_ele_num))
+        kernels = np.zeros((read_ele_num, read_ele_num, len(grid) - 1))
+        distance = np.abs(np.subtract.outer(np.arange(read_ele_num), np.arange(read_ele_num)))
+        for i_prime in range(min(neighbor_num, read_ele_num)):
+            response = np.interp(grid, data[:, 2*i_prime], data[:, 2*i_prime+1])
+            baseline[distance == i_prime] = response[0]
+            # 三角脉冲峰在 t_bin, 冲激响应相对输入样本提前一个 bin
+            kernels[distance == i_prime] = (response[1:] - response[0])/probe_current
+        tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+        try:
+            with open(tmp_file, "wb") as f:
+                np.savez(f, baseline=baseline, kernels=kernels)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            print("Warning: cross talk coupling matrix not saved: %s"%(e))
+    _COUPLING_CACHE[key] = (baseline, kernels, {})
+    return _COUPLING_CACHE[key]
+
+
+def cross_talk_many(samples, baseline, kernels, spectra=None):
+    """
+    Cross-talked currents of (..., E, n_bins) electrode samples: one real FFT per electrode,
+    the electrode x electrode multiply in frequency space, truncated to n_bins.
+    spectra stores the kernel FFTs by length
+    """
+    from scipy import fft
+
+    samples = np.asarray(samples, dtype=np.float64)
+    n_bins = samples.shape[-1]
+    nfft = fft.next_fast_len(n_bins + kernels.shape[-1] - 1, real=True)
+    if spectra is None:
+        spectra = {}
+    kernel_spectra = spectra.get(nfft)
+    if kernel_spectra is None:
+        kernel_spectra = fft.rfft(kernels, nfft, axis=-1)
+        spectra[nfft] = kernel_spectra
+    coupled = np.einsum("jif,...if->...jf", kernel_spectra, fft.rfft(samples, nfft, axis=-1))
+    return fft.irfft(coupled, nfft, axis=-1)[..., :n_bins] + baseline.sum(axis=-1)[:, None]
+
+
+def cross_talk_linear(name, cross_talk_cir, cu):
+    """
+    cross_talk with the coupling matrix instead of per-electrode ngspice runs.
+    The input samples are the set_ngspice_input PWL of the transient mode (bin j at j t_bin,
+    1% onset/offset cuts), so both modes see the same currents on the same time axis
+    """
+    read_ele_num = len(cu)
+    axes = {(hist.GetNbinsX(), hist.GetXaxis().GetXmin(), hist.GetXaxis().GetXmax()) for hist in cu}
+    if len(axes) != 1:
+        raise ValueError("All reading electrodes must share the same time binning")
+    n_bins, t_start, t_end = axes.pop()
+    path = output(__file__, name)
+    t_bin = (t_end - t_start)/n_bins
+    baseline, kernels, spectra = coupling_matrix(cross_talk_cir, read_ele_num, t_bin, path)
+    samples = np.stack([pwl_samples(input_current_str, t_bin, n_bins) for input_current_str in set_ngspice_input(cu)])
+    currents = cross_talk_many(samples, baseline, kernels, spectra)
+
+    cross_talk_cu = []
+    contents = np.zeros(n_bins + 2)
+    for i in range(read_ele_num):
+        cross_talk_cu.append(ROOT.TH1F("cross_talk"+str(i+1),"Cross Talked Current"+" No."+str(i+1)+"electrode",
+                                n_bins, t_start, t_end))
+        contents[1:n_bins + 1] = currents[i]
+        cross_talk_cu[i].SetContent(contents)
+    return cross_talk_cu
@@ -12,6 +12,8 @@ Description:  Define physical models for different materials
 import math
 import os
 
+import numpy as np
+
 try:
     import matplotlib.pyplot as plt
 except ImportError:
@@ -184,7 +186,74 @@ class Material:
 
                     mu = mu_LIF_n
         return mu
-    
+
+    def cal_mobility_many(self, temperature, input_doping, charge, electric_field):
+        """ Array version of cal_mobility, evaluated element-wise over doping, charge and field """
+        Neff, charge, E = np.broadcast_arrays(
+            np.asarray(input_doping, dtype=np.float64),
+            np.asarray(charge, dtype=np.float64),
+            np.asarray(electric_field, dtype=np.float64),
+        )
+        T = float(temperature) # K
+        t = T/300
+        hole = charge > 0
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.mat_name == 'SiC' and self.mobility_model == "Das":
+                Neff = np.abs(Neff)
+                mu_LI_p = 15.9 + 124 * t**-2 / (1.0 + (Neff / 1.76e19)**0.34)
+                beta_p = 1.213 * t**0.17
+                v_sat_p = 2e7 * t**0.52
+                mu_p = mu_LI_p / (1.0 + (mu_LI_p * E / v_sat_p)**beta_p)**(1.0 / beta_p)
+
+                mu_LI_n = 947 * t**-2 / (1 + (Neff / 1.94e19)**0.61)
+                beta_n = 1 * t**0.66
+                v_sat_n = 2e7 * t**0.87
+                mu_n = mu_LI_n / (1.0 + (mu_LI_n * E / v_sat_n)**beta_n)**(1.0 / beta_n)
+
+            elif self.mat_name == 'Si' and self.mobility_model == "Selberherr":
+                Neff = np.abs(Neff)
+                mu_L_p = 460.0 * t**-2.18
+                mu_min_p = 45.0 * t**-0.45
+                mu_LI_p = mu_min_p + (mu_L_p - mu_min_p) / (1.0 + (Neff / (2.23e17 * t**3.2))**(0.72 * t**0.065))
+                v_sat_p = 9.05e6 * math.sqrt(math.tanh(312.0/T))
+                mu_p = mu_LI_p / (1.0 + mu_LI_p * E / v_sat_p)
+
+                mu_L_n = 1430.0 * t**-2.0
+                mu_min_n = 80.0 * t**-0.45
+                mu_LI_n = mu_min_n + (mu_L_n - mu_min_n) / (1.0 + (Neff / (1.12e17 * t**3.2))**(0.72 * t**0.065))
+                vsatn = 1.45e7 * math.sqrt(math.tanh(155.0/T))
+                mu_n = 2*mu_LI_n / (1.0 + np.sqrt(1.0 + (2*mu_LI_n * E / vsatn)**2))
+
+            elif self.mat_name == 'Si' and self.mobility_model == "Reggiani":
+                N_D = np.where(Neff >= 0, Neff, 0.0)
+                N_A = np.where(Neff < 0, -Neff, 0.0)
+                N_sum = N_D + N_A
+
+                mu_0_p = (90.0 * t**-1.3 * N_D + 44.0 * t**-0.8 * N_A) / N_sum
+                mu_1_p = (28.2 * t**-2.0 * N_D + 28.2 * t**-0.2 * N_A) / N_sum
+                mu_LI_p = mu_0_p \
+                        + (470.50 * t**-2.16 - mu_0_p) / (1.0 + (N_D / (1.30e18 * t**2.2))**0.77 + (N_A / (2.45e17 * t**3.1))**0.719) \
+                        - mu_1_p / (1.0 + (N_D / (1.10e18 * t**6.2) + N_A / 6.10e20)**2)
+                beta_p_1 = 2*t**-0.2 + 0.6*N_A**2/(N_A**2 + 8e17**2) + 0.6*N_D**2/(N_D**2 + 1e19**2)
+                beta_p_2 = 0.15*t + 0.8*N_A**2/(N_A**2 + 8e17**2) + 0.8*N_D**2/(N_D**2 + 1e19**2)
+                v_sat_p = 9.1e6 * t**-0.4
+                mu_p = mu_LI_p / (1.0 + (mu_LI_p * E / v_sat_p)**(beta_p_1 + beta_p_2))**(1.0 / beta_p_1)
+
+                mu_0_n = (62.2 * t**-1.3 * N_D + 132.0 * t**-1.3 * N_A) / N_sum
+                mu_1_n = (48.6 * t**-0.7 * N_D + 73.5 * t**-1.25 * N_A) / N_sum
+                mu_LI_n = mu_0_n \
+                        + (1441.0 * t**(-2.45 + 0.07*t) - mu_0_n) / (1.0 + (N_D / (8.30e16 * t**3.65))**0.68 + (N_A / (1.22e17 * t**2.65))**0.72) \
+                        - mu_1_n / (1.0 + (N_D / 4e20 + N_A / 7e20)**2)
+                beta_n = 2.1*t**-0.2 + 2*N_A**2/(N_A**2 + 1e19**2) + 3*N_D**2/(N_D**2 + 1e19**2)
+                v_sat_n = 2.4e7 / (1 + 0.8*math.exp(t/2))
+                mu_n = mu_LI_n / (1.0 + (mu_LI_n * E / v_sat_n)**beta_n)**(1.0 / beta_n)
+
+            else:
+                raise ValueError("Unsupported mobility model: {} for {}".format(self.mobility_model, self.mat_name))
+
+        return np.where(hole, mu_p, mu_n)
+
     def draw_velocity(self, temperature, Neff):
         if plt is None:
             raise RuntimeError("matplotlib is required for draw_velocity")
@@ -344,6 +413,112 @@ class Material:
                 
         return coefficient
 
+    def cal_coefficient_many(self, electric_field, charges, temperature):
+        """ Array version of cal_coefficient, evaluated element-wise over field and charge sign """
+        if self.avalanche_model not in ('vanOverstraeten', 'Okuto', 'Hatakeyama'):
+            raise ValueError("Unsupported avalanche model: {}".format(self.avalanche_model))
+
+        E, charges = np.broadcast_arrays(
+            np.asarray(electric_field, dtype=np.float64),
+            np.asarray(charges, dtype=np.float64),
+        )
+        T = float(temperature) # K
+        hole = charges > 0
+
+        with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+            if self.avalanche_model == 'vanOverstraeten':
+                hbarOmega = 0.063 # eV
+                E0 = 4.0e5 # V/cm
+                T0 = 293.0 # K
+                k_T0 = 0.0257 # eV
+                Ggamma = math.tanh(hbarOmega/(2*k_T0))/math.tanh(hbarOmega/(2*k_T0*T/T0))
+
+                high = E > E0
+                a = np.where(hole, np.where(high, 6.71e5, 1.582e6), 7.03e5)
+                b = np.where(hole, np.where(high, 1.693e6, 2.036e6), 1.232e6)
+                coefficient = np.where(E > 1.75e05, Ggamma*a*np.exp(-(Ggamma*b)/E), 0.)
+
+            elif self.avalanche_model == 'Okuto':
+                T0 = 300.0 # K
+                _gamma = 1.0 # 1
+                a = np.where(hole, 0.243, 0.426)
+                b = np.where(hole, 6.53e5, 4.81e5)
+                c = np.where(hole, 5.35e-4, 3.05e-4)
+                d = np.where(hole, 5.67e-4, 6.86e-4)
+                coefficient = np.where(
+                    E > 1.0e05, a*(1+c*(T-T0))*np.power(E, _gamma)*np.exp(-(b*(1+d*(T-T0)))/E), 0.
+                )
+
+            else:
+                # Hatakeyama, only the <0001> direction
+                hbarOmega = 0.19 # eV
+                T0 = 300.0 # K
+                k_T0 = 0.0257 # eV
+                _gamma = math.tanh(hbarOmega/(2*k_T0))/math.tanh(hbarOmega/(2*k_T0*T/T0))
+                a = np.where(hole, 3.41e8, 1.76e8)
+                b = np.where(hole, 2.50e7, 3.30e7)
+                coefficient = np.where(E > 1.0e04, _gamma*a*np.exp(-(_gamma*b/E)), 0.)
+
+        return coefficient
+
+
+class MobilityTable:
+    """
+    Mobility tabulated on a (log10|doping|, field) grid for one temperature
+
+    Called like Material.cal_mobility_many. Points inside the grid are
+    interpolated bilinearly; points outside it (or at another temperature)
+    fall back to the analytic model.
+    """
+
+    def __init__(self, material, temperature, log_doping=(8.0, 21.0, 131), field=(0.0, 1.0e6, 2001)):
+        self.material = material
+        self.temperature = float(temperature)
+        self.log_doping = np.linspace(*log_doping)
+        self.field = np.linspace(*field)
+        N, E = np.meshgrid(10**self.log_doping, self.field, indexing='ij')
+        # (doping sign, charge sign) -> mobility grid
+        self.values = {
+            (doping_sign, charge): material.cal_mobility_many(self.temperature, doping_sign * N, charge, E)
+            for doping_sign in (1, -1)
+            for charge in (1, -1)
+        }
+
+    def __call__(self, temperature, input_doping, charge, electric_field):
+        Neff, charge, E = np.broadcast_arrays(
+            np.asarray(input_doping, dtype=np.float64),
+            np.asarray(charge, dtype=np.float64),
+            np.asarray(electric_field, dtype=np.float64),
+        )
+        if float(temperature) != self.temperature:
+            return self.material.cal_mobility_many(temperature, Neff, charge, E)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_n = np.log10(np.abs(Neff))
+        u = (log_n - self.log_doping[0]) / (self.log_doping[1] - self.log_doping[0])
+        v = (E - self.field[0]) / (self.field[1] - self.field[0])
+        inside = (u >= 0) & (u <= len(self.log_doping) - 1) & (v >= 0) & (v <= len(self.field) - 1)
+
+        mu = np.empty(Neff.shape, dtype=np.float64)
+        i = np.clip(np.floor(u[inside]).astype(np.int64), 0, len(self.log_doping) - 2)
+        j = np.clip(np.floor(v[inside]).astype(np.int64), 0, len(self.field) - 2)
+        fu = u[inside] - i
+        fv = v[inside] - j
+        doping_sign = np.where(Neff[inside] >= 0, 1, -1)
+        charge_sign = np.where(charge[inside] > 0, 1, -1)
+        values = np.empty(len(i))
+        for (n_sign, q_sign), table in self.values.items():
+            rows = (doping_sign == n_sign) & (charge_sign == q_sign)
+            ii, jj, uu, vv = i[rows], j[rows], fu[rows], fv[rows]
+            values[rows] = (
+                (1 - uu) * (1 - vv) * table[ii, jj] + uu * (1 - vv) * table[ii + 1, jj]
+                + (1 - uu) * vv * table[ii, jj + 1] + uu * vv * table[ii + 1, jj + 1]
+            )
+        mu[inside] = values
+        if not np.all(inside):
+            mu[~inside] = self.material.cal_mobility_many(temperature, Neff[~inside], charge[~inside], E[~inside])
+        return mu
+
 
 def main():
     mob = Material("Si")
@@ -0,0 +1,131 @@
+'''
+Description:
+   Process-pool drift of carrier chunks with merged current accumulators
+@Date       : 2026/10/18
+@version    : 1.0
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import multiprocessing
+import os
+import random
+import zlib
+
+import numpy as np
+
+from .carrier import VectorizedCarrierSystem
+from .path_store import PATH_DTYPES, PathStore, stack_paths
+from .signal_stream import SignalStream
+
+logger = logging.getLogger(__name__)
+
+# fork 前写入, 子进程继承 (探测器、场和流式信号参数), 场网格为内存映射, 各进程共享只读页
+_worker_state = {}
+
+
+def fork_available():
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def chunk_seed(base_seed, carrier_type, chunk_idx):
+    """每个分块的随机数种子只由基础种子、载流子类型和分块编号决定, 与进程数和调度顺序无关"""
+    return [int(base_seed), zlib.crc32(carrier_type.encode()), int(chunk_idx)]
+
+
+def _drift_chunk(task):
+    """子进程: 漂移一个分块并返回流式电流累加器和载流子末态"""
+    carrier_type, chunk_idx, positions, charges, times, seed = task
+    my_d = _worker_state['my_d']
+    my_f = _worker_state['my_f']
+    rng = np.random.default_rng(seed)
+    random.seed(int(np.random.SeedSequence(seed).generate_state(1)[0]))  # scalar 漂移使用 random.gauss
+
+    stream = SignalStream(my_d, my_f, *_worker_state['stream_args'])
+    system = VectorizedCarrierSystem(
+        positions, charges, times, [[]] * len(charges),
+        my_d.material, carrier_type, my_d.read_out_contact, my_d,
+        keep_drift_paths=_worker_state['keep_drift_paths'], rng=rng, signal_stream=stream,
+    )
+    system.drift_batch(my_d, my_f, delta_t=_worker_state['delta_t'])
+
+    result = {
+        'chunk_idx': chunk_idx,
+        'accumulator': stream.accumulator,
+        'signals_found': stream.signals_found,
+        'positions': system.positions,
+        'reduced_positions': system.reduced_positions,
+        'times': system.times,
+        'active': system.active,
+        'end_conditions': system.end_conditions,
+        'steps_drifted': system.steps_drifted,
+        'performance_stats': system.performance_stats,
+    }
+    if system.keep_drift_paths:
+        result['paths'] = stack_paths(system.paths)
+    return result
+
+
+def drift_systems_parallel(systems, my_d, my_f, delta_t, stream_args, workers, chunk_size):
+    """
+    把各载流子系统按 chunk_size 分块, 在 workers 个 fork 子进程中漂移并流式计算感应电流,
+    最后把各分块的电流累加器求和并把载流子末态写回 systems
+
+    每个系统得到一个 signal_stream (只含合并后的累加器), 供 CalCurrent.get_current 使用
+    """
+    try:
+        seed = int(getattr(my_d, "vector_random_seed"))
+    except (AttributeError, TypeError, ValueError):
+        seed = int(np.random.SeedSequence().generate_state(1)[0])
+
+    tasks = []
+    for system in systems:
+        n_carriers = len(system.charges)
+        for chunk_idx, start in enumerate(range(0, n_carriers, chunk_size)):
+            rows = slice(start, min(start + chunk_size, n_carriers))
+            tasks.append((
+                system.carrier_type, chunk_idx, system.positions[rows], system.charges[rows],
+                system.times[rows], chunk_seed(seed, system.carrier_type, chunk_idx),
+            ))
+    if not tasks:
+        return
+
+    _worker_state.update(
+        my_d=my_d, my_f=my_f, delta_t=delta_t, stream_args=stream_args,
+        keep_drift_paths=all(system.keep_drift_paths for system in systems),
+    )
+    workers = max(1, min(int(workers), len(tasks), os.cpu_count() or 1))
+    logger.info(f"并行漂移: {len(tasks)}个分块, {workers}个进程, 分块大小{chunk_size}")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as executor:
+            results = list(executor.map(_drift_chunk, tasks))
+    finally:
+        _worker_state.clear()
+
+    offset = 0
+    for system in systems:
+        n_chunks = -(-len(system.charges) // chunk_size)
+        _merge_chunks(system, my_d, my_f, stream_args, results[offset:offset + n_chunks], chunk_size)
+        offset += n_chunks
+
+
+def _merge_chunks(system, my_d, my_f, stream_args, results, chunk_size):
+    """合并一个载流子系统的分块结果"""
+    stream = SignalStream(my_d, my_f, *stream_args)
+    paths = PathStore(len(system.charges), PATH_DTYPES) if system.keep_drift_paths else None
+    for result in results:
+        stream.accumulator += result['accumulator']
+        stream.signals_found += result['signals_found']
+        start = result['chunk_idx'] * chunk_size
+        rows = slice(start, start + len(result['times']))
+        for name in ('positions', 'reduced_positions', 'times', 'active', 'end_conditions', 'steps_drifted'):
+            getattr(system, name)[rows] = result[name]
+        for name, value in result['performance_stats'].items():
+            system.performance_stats[name] += value
+        if paths is not None:
+            nodes, counts = result['paths']
+            carriers = start + np.repeat(np.arange(len(counts)), counts)
+            paths.append(carriers, *nodes.T)
+    if paths is not None:
+        system.paths = paths
+    system.signal_stream = stream
@@ -0,0 +1,131 @@
+'''
+Description:  
+   Compact per-carrier trajectory storage
+@Date       : 2026/10/18
+@version    : 1.0
+'''
+
+import numpy as np
+
+# 完整路径 [x, y, z, t] 和简化路径 [x_red, y_red, z, t, x_num, y_num] 的列类型
+PATH_DTYPES = (np.float64, np.float64, np.float64, np.int32)
+REDUCED_PATH_DTYPES = (np.float64, np.float64, np.float64, np.int32, np.int16, np.int16)
+
+
+class PathStore:
+    """
+    按载流子读取的轨迹存储
+
+    漂移时每步把 (载流子编号, 行) 批量写入分块预分配的列数组, 每列使用紧凑的 dtype;
+    读取时按载流子编号稳定排序一次, 得到连续的节点数组和每个载流子的偏移, 直到下次追加
+    """
+    def __init__(self, n_carriers, dtypes, chunk_rows=65536):
+        self.n_carriers = int(n_carriers)
+        self.dtypes = tuple(np.dtype(dtype) for dtype in dtypes)
+        self.chunk_rows = int(chunk_rows)
+        self._chunks = []
+        self._filled = 0
+        self._stacked = None
+
+    def _new_chunk(self):
+        chunk = [np.empty(self.chunk_rows, dtype=np.int32)]
+        chunk.extend(np.empty(self.chunk_rows, dtype=dtype) for dtype in self.dtypes)
+        self._chunks.append(chunk)
+        self._filled = 0
+
+    def append(self, carriers, *columns):
+        """追加多行: carriers 为载流子编号数组, columns 与 dtypes 一一对应"""
+        carriers = np.asarray(carriers, dtype=np.int32).reshape(-1)
+        columns = [np.broadcast_to(np.asarray(column), carriers.shape) for column in columns]
+        start = 0
+        while start < len(carriers):
+            if not self._chunks or self._filled == self.chunk_rows:
+                self._new_chunk()
+            chunk = self._chunks[-1]
+            n = min(len(carriers) - start, self.chunk_rows - self._filled)
+            rows = slice(self._filled, self._filled + n)
+            chunk[0][rows] = carriers[start:start + n]
+            for target, column in zip(chunk[1:], columns):
+                target[rows] = column[start:start + n]
+            self._filled += n
+            start += n
+        self._stacked = None
+
+    def append_row(self, carrier, row):
+        """追加单个载流子的一行"""
+        if not self._chunks or self._filled == self.chunk_rows:
+            self._new_chunk()
+        chunk = self._chunks[-1]
+        chunk[0][self._filled] = carrier
+        for target, value in zip(chunk[1:], row):
+            target[self._filled] = value
+        self._filled += 1
+        self._stacked = None
+
+    def stacked(self):
+        """
+        返回 (nodes, counts): nodes 为按载流子连续排列的 float64 数组 (N, 列数),
+        counts[i] 为第 i 个载流子的路径点数, 同一载流子内保持追加顺序
+        """
+        if self._stacked is None:
+            used = [
+                [column[:self.chunk_rows if i < len(self._chunks) - 1 else self._filled] for column in chunk]
+                for i, chunk in enumerate(self._chunks)
+            ]
+            if used:
+                carriers = np.concatenate([chunk[0] for chunk in used])
+                order = np.argsort(carriers, kind="stable")
+                nodes = np.column_stack([
+                    np.concatenate([chunk[c] for chunk in used]).astype(np.float64)
+                    for c in range(1, len(self.dtypes) + 1)
+                ])[order]
+                counts = np.bincount(carriers, minlength=self.n_carriers)
+            else:
+                nodes = np.empty((0, len(self.dtypes)), dtype=np.float64)
+                counts = np.zeros(self.n_carriers, dtype=np.int64)
+            offsets = np.concatenate(([0], np.cumsum(counts)))
+            self._stacked = (nodes, counts, offsets)
+        return self._stacked[0], self._stacked[1]
+
+    def __len__(self):
+        return self.n_carriers
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self.n_carriers
+        if not 0 <= idx < self.n_carriers:
+            raise IndexError("carrier index out of range")
+        nodes, _ = self.stacked()
+        offsets = self._stacked[2]
+        return nodes[offsets[idx]:offsets[idx + 1]]
+
+    def __iter__(self):
+        nodes, _ = self.stacked()
+        offsets = self._stacked[2]
+        for idx in range(self.n_carriers):
+            yield nodes[offsets[idx]:offsets[idx + 1]]
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for chunk in self._chunks for column in chunk)
+
+
+def stack_paths(paths):
+    """把 PathStore 或路径列表统一成 (nodes, counts)"""
+    if isinstance(paths, PathStore):
+        return paths.stacked()
+    arrays = [np.asarray(path, dtype=np.float64) for path in paths]
+    counts = np.array([len(path) for path in arrays], dtype=np.int64)
+    non_empty = [path for path in arrays if len(path) > 0]
+    if not non_empty:
+        width = max((path.shape[1] for path in arrays if path.ndim == 2), default=0)
+        return np.empty((0, width), dtype=np.float64), counts
+    return np.concatenate(non_empty), counts
+
+
+def segment_starts(counts):
+    """每条路径段起点在 nodes 中的下标 (每个载流子的最后一个点不是起点)"""
+    counts = np.asarray(counts, dtype=np.int64)
+    is_start = np.ones(int(counts.sum()), dtype=bool)
+    is_start[(np.cumsum(counts) - 1)[counts > 0]] = False
+    return np.flatnonzero(is_start)
@@ -107,6 +107,35 @@ class Detector:
                 self.vector_min_field_strength = float(self.device_dict["vector_min_field_strength"])
             except (TypeError, ValueError):
                 pass
+        if "vector_drift_mode" in self.device_dict:
+            self.vector_drift_mode = self.device_dict["vector_drift_mode"]
+        if "vector_mobility_table" in self.device_dict:
+            self.vector_mobility_table = bool(self.device_dict["vector_mobility_table"])
+        if "vector_signal_mode" in self.device_dict:
+            self.vector_signal_mode = self.device_dict["vector_signal_mode"]
+        if "vector_drift_workers" in self.device_dict:
+            try:
+                self.vector_drift_workers = int(self.device_dict["vector_drift_workers"])
+            except (TypeError, ValueError):
+                pass
+        if "vector_drift_chunk_size" in self.device_dict:
+            try:
+                self.vector_drift_chunk_size = int(self.device_dict["vector_drift_chunk_size"])
+            except (TypeError, ValueError):
+                pass
+        if "vector_random_seed" in self.device_dict:
+            try:
+                self.vector_random_seed = int(self.device_dict["vector_random_seed"])
+            except (TypeError, ValueError):
+                pass
+        self.e_field_mode = self.device_dict.get("e_field_mode", "difference")
+        # 场量缓存内存上限 (MB), None 时用 devsim_field 的默认值
+        self.field_cache_max_mb = None
+        if "field_cache_max_mb" in self.device_dict:
+            try:
+                self.field_cache_max_mb = float(self.device_dict["field_cache_max_mb"])
+            except (TypeError, ValueError):
+                pass
         if "current_smoothing_window" in self.device_dict:
             try:
                 self.current_smoothing_window = int(self.device_dict["current_smoothing_window"])
@@ -234,22 +263,19 @@ class Detector:
         if self.avalanche_bond is None:
             raise ValueError("planar_integral gain algorithm requires `avalanche_bond` in detector settings")
         
-        cal_coefficient = Material(self.material, avalanche_model=self.avalanche_model).cal_coefficient
+        cal_coefficient_many = Material(self.material, avalanche_model=self.avalanche_model).cal_coefficient_many
 
         n = 1001
         if "ilgad" in self.det_model:
             z_list = np.linspace(self.avalanche_bond * 1e-4, self.l_z, n) # in cm
         else:
             z_list = np.linspace(0, self.avalanche_bond * 1e-4, n) # in cm
-        alpha_n_list = np.zeros(n)
-        alpha_p_list = np.zeros(n)
+        E_list = np.zeros(n)
         for i in range(n):
             Ex,Ey,Ez = my_f._get_e_field(0.5*self.l_x,0.5*self.l_y,z_list[i] * 1e4) # in V/cm, get original field to improve accuracy
-            E_field = Vector(Ex,Ey,Ez).get_length()
-            alpha_n = cal_coefficient(E_field, -1, self.temperature)
-            alpha_p = cal_coefficient(E_field, +1, self.temperature)
-            alpha_n_list[i] = alpha_n
-            alpha_p_list[i] = alpha_p
+            E_list[i] = Vector(Ex,Ey,Ez).get_length()
+        alpha_n_list = cal_coefficient_many(E_list, -1, self.temperature)
+        alpha_p_list = cal_coefficient_many(E_list, +1, self.temperature)
 
         if my_f._get_e_field(0, 0, self.avalanche_bond)[2] > 0:
             alpha_major_list = alpha_n_list # multiplication contributed mainly by electrons in conventional Si LGAD
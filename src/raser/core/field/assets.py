@@ -2,10 +2,14 @@
 
 from __future__ import annotations
 
+import json
 import math
+import os
 import re
 from pathlib import Path
 
+import numpy as np
+
 
 def voltage_label(voltage):
     value = float(voltage)
@@ -44,3 +48,64 @@ def resolve_field_pickle(directory, prefix, voltage):
         ):
             return candidate
     return exact_path
+
+
+def field_grid_paths(pickle_path):
+    """Return the (axes/metadata .npz, values .npy) pair stored next to a field pickle."""
+    path = Path(pickle_path)
+    return path.with_suffix(".npz"), path.with_suffix(".npy")
+
+
+def _json_default(value):
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def save_field_grid(pickle_path, axes, values, metadata, key=None):
+    """
+    Store a resampled regular grid next to its pickle; values go to a .npy so they can be memory-mapped.
+    key records the resampling settings the grid was built with (see load_field_grid).
+    """
+    index_path, values_path = field_grid_paths(pickle_path)
+    suffix = ".{}.tmp".format(os.getpid())
+    index_tmp = index_path.with_name(index_path.name + suffix)
+    values_tmp = values_path.with_name(values_path.name + suffix)
+    arrays = {"axis_{}".format(i): np.asarray(axis, dtype=np.float64) for i, axis in enumerate(axes)}
+    arrays["metadata"] = np.array(json.dumps(metadata, default=_json_default))
+    arrays["key"] = np.array(json.dumps(key, default=_json_default))
+    with open(values_tmp, "wb") as file:
+        np.save(file, np.ascontiguousarray(values, dtype=np.float64))
+    with open(index_tmp, "wb") as file:
+        np.savez(file, **arrays)
+    # values first: a reader only trusts the pair once the index exists
+    os.replace(values_tmp, values_path)
+    os.replace(index_tmp, index_path)
+    return index_path, values_path
+
+
+def load_field_grid(pickle_path, key=None):
+    """
+    Return (axes, values, metadata) for a compiled field grid, or None when it is missing,
+    older than its pickle, or was built with a different key. Values are opened read-only
+    with mmap_mode='r'.
+    """
+    path = Path(pickle_path)
+    index_path, values_path = field_grid_paths(path)
+    if not index_path.exists() or not values_path.exists():
+        return None
+    if path.exists():
+        grid_mtime = min(index_path.stat().st_mtime, values_path.stat().st_mtime)
+        if path.stat().st_mtime > grid_mtime:
+            return None
+    with np.load(index_path) as index:
+        dimension = sum(1 for key in index.files if key.startswith("axis_"))
+        axes = tuple(np.array(index["axis_{}".format(i)]) for i in range(dimension))
+        metadata = json.loads(str(index["metadata"]))
+        stored_key = json.loads(str(index["key"])) if "key" in index.files else None
+    if stored_key != json.loads(json.dumps(key, default=_json_default)):
+        return None
+    values = np.load(values_path, mmap_mode="r")
+    if values.shape != tuple(len(axis) for axis in axes):
+        return None
+    return axes, values, metadata
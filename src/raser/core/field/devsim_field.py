@@ -13,12 +13,20 @@ import logging
 import math
 import re
 
+import numpy as np
 import ROOT
+from .assets import load_field_grid
 from .assets import resolve_field_pickle
+from .assets import save_field_grid
+from .voxel_cache import VoxelCache
 from raser.supports.math import calculate_gradient
+from raser.supports.math import calculate_gradient_many
+from raser.supports.math import get_common_gradient
 from raser.supports.math import get_common_interpolate_1d
 from raser.supports.math import get_common_interpolate_2d
 from raser.supports.math import get_common_interpolate_3d
+from raser.supports.math import get_common_interpolate_key
+from raser.supports.math import get_grid_interpolate
 from raser.supports.paths import project_path
 ROOT.gROOT.SetBatch(True)
 
@@ -31,16 +39,22 @@ resolution_default_1d = {'z': 0.05, 'x': 10000.0, 'y': 10000.0}
 resolution_default_2d = {'z': 0.1, 'x': 0.5, 'y': 10000.0}
 resolution_default_plugin_2d = {'x': 0.1, 'y': 0.1, 'z': 10000.0}
 resolution_default_3d = {'z': 0.5, 'x': 1, 'y': 1}
+cache_max_mb_default = 256  # 所有场量缓存合计的内存上限
 
 class DevsimField:
     def __init__(self, device_name, dimension, voltage, read_out_contact, mesher, is_plugin=False, irradiation_flux=0, 
-                 bounds=None, resolution=None, field_set="default",):
+                 bounds=None, resolution=None, field_set="default", e_field_mode="difference", cache_max_mb=None,):
         self.name = device_name
         self.voltage = voltage
         self.dimension = dimension
         self.read_out_contact = read_out_contact
         self.is_plugin = is_plugin  # 保存插件标志
         self.mesher = mesher  # 保存mesher标志
+        # difference: 每次查询对电势做有限差分; grid: 加载时在规则网格上用 np.gradient 预先求出电场分量
+        if e_field_mode not in ("difference", "grid"):
+            raise ValueError("Unsupported e_field_mode: {}".format(e_field_mode))
+        self.e_field_mode = e_field_mode
+        self.e_field_grid = None
 
         # 初始化缓存相关属性
         if self.dimension == 1:
@@ -72,19 +86,12 @@ class DevsimField:
         
         self.bounds = bounds or {}
         
-        # 初始化缓存字典
-        self.e_field_cache = {}
-        self.doping_cache = {}
-        self.w_p_cache = {}
-        self.trap_h_cache = {}  # 空穴陷阱率缓存
-        self.trap_e_cache = {}  # 电子陷阱率缓存
+        # 初始化缓存: 有界网格用预分配数组, 否则用有上限的 LRU
+        self.cache_max_mb = float(cache_max_mb if cache_max_mb is not None else cache_max_mb_default)
+        self._init_caches()
         
         # 缓存统计
-        self._cache_stats = {
-            'hits': 0, 'misses': 0, 'errors': 0, 'fallbacks': 0,
-            'trap_h_hits': 0, 'trap_h_misses': 0,
-            'trap_e_hits': 0, 'trap_e_misses': 0,
-        }
+        self._cache_stats = {'errors': 0, 'fallbacks': 0}
 
         path = str(project_path("field", field_set)) + os.sep
 
@@ -117,49 +124,78 @@ class DevsimField:
         
         logger.info(f"DevsimField initialization complete, resolution: {self.resolution} um")
 
+    def _load_field(self, FieldFile):
+        """
+        读取场文件, 返回 (metadata, 规则网格插值函数)
+        优先打开 pickle 旁已重采样的 .npz/.npy 网格 (只读内存映射, 同一节点的多个作业共享页面);
+        否则读取 pickle 并用 griddata 重采样, 再写出网格文件供后续作业使用
+        网格文件比 pickle 旧或重采样点数 (get_common_interpolate_key) 改变时重新生成
+        维度低于探测器维度时不做插值, 返回的函数为 None
+        """
+        key = get_common_interpolate_key()
+        grid = load_field_grid(FieldFile, key)
+        if grid is not None:
+            axes, values, metadata = grid
+            if metadata['dimension'] < self.dimension:
+                return metadata, None
+            return metadata, get_grid_interpolate(axes, values)
+
+        with open(FieldFile,'rb') as file:
+            FieldNotUniform = pickle.load(file)
+        metadata = FieldNotUniform['metadata']
+        if metadata['dimension'] < self.dimension:
+            return metadata, None
+
+        if metadata['dimension'] == 1:
+            FieldUniform = get_common_interpolate_1d(FieldNotUniform)
+        elif metadata['dimension'] == 2:
+            FieldUniform = get_common_interpolate_2d(FieldNotUniform)
+        elif metadata['dimension'] == 3:
+            FieldUniform = get_common_interpolate_3d(FieldNotUniform)
+
+        try:
+            save_field_grid(FieldFile, *FieldUniform.grid, metadata, key)
+        except OSError as e:
+            logger.warning(f"failed when writing field grid next to {FieldFile}: {e}")
+        return metadata, FieldUniform
+
     def set_doping(self, DopingFile):
         try:
-            with open(DopingFile,'rb') as file:
-                DopingNotUniform=pickle.load(file)
-                print("Doping file loaded for {}".format(self.name))
-                if DopingNotUniform['metadata']['dimension'] < self.dimension:
-                    print("Doping dimension not match")
-                    return
+            DopingMetadata, DopingUniform = self._load_field(DopingFile)
+            print("Doping file loaded for {}".format(self.name))
+            if DopingMetadata['dimension'] < self.dimension:
+                print("Doping dimension not match")
+                return
         except (FileNotFoundError, TypeError):
             print("Doping file not found at {}, please run field simulation first".format(DopingFile))
             print("or manually set the doping file")
             return
-        
-        if DopingNotUniform['metadata']['dimension'] == 1:
-            DopingUniform = get_common_interpolate_1d(DopingNotUniform)
-        elif DopingNotUniform['metadata']['dimension'] == 2:
-            DopingUniform = get_common_interpolate_2d(DopingNotUniform)
-        elif DopingNotUniform['metadata']['dimension'] == 3:
-            DopingUniform = get_common_interpolate_3d(DopingNotUniform)
 
         self.Doping = DopingUniform
 
     def set_potential(self, PotentialFile):
         try:
-            with open(PotentialFile,'rb') as file:
-                PotentialNotUniform=pickle.load(file)
-                print("Potential file loaded for {}".format(self.name))
-                if PotentialNotUniform['metadata']['dimension'] < self.dimension:
-                    print("Potential dimension not match")
-                    return
+            PotentialMetadata, PotentialUniform = self._load_field(PotentialFile)
+            print("Potential file loaded for {}".format(self.name))
+            if PotentialMetadata['dimension'] < self.dimension:
+                print("Potential dimension not match")
+                return
         except FileNotFoundError:
             print("Potential file not found at {}, please run field simulation first".format(PotentialFile))
             print("or manually set the potential file")
             return
-        
-        if PotentialNotUniform['metadata']['dimension'] == 1:
-            PotentialUniform = get_common_interpolate_1d(PotentialNotUniform)
-        elif PotentialNotUniform['metadata']['dimension'] == 2:
-            PotentialUniform = get_common_interpolate_2d(PotentialNotUniform)
-        elif PotentialNotUniform['metadata']['dimension'] == 3:
-            PotentialUniform = get_common_interpolate_3d(PotentialNotUniform)
 
         self.Potential = PotentialUniform
+        if self.e_field_mode == "grid":
+            self.set_e_field_grid()
+
+    def set_e_field_grid(self):
+        axes = self._axis_names()
+        if not hasattr(self.Potential, "grid") or len(self.Potential.grid[0]) != len(axes):
+            print("Potential grid dimension not match, keep finite difference electric field")
+            return
+        # 电场分量按插值器的坐标轴顺序存放, 单位 V/cm
+        self.e_field_grid = dict(zip(axes, get_common_gradient(self.Potential)))
 
     def set_w_p(self, WeightingPotentialFiles):
         self.WeightingPotential = []
@@ -168,68 +204,43 @@ class DevsimField:
                 os.path.dirname(WeightingPotentialFiles[i]), "Potential", 1
             )
             try:
-                with open(WeightingPotentialFile,'rb') as file:
-                    WeightingPotentialNotUniform=pickle.load(file)
-                    print("Weighting Potential file loaded for {} at electrode {}".format(self.name, i+1))
-                    if ( WeightingPotentialNotUniform['metadata']['dimension'] < self.dimension
-                    ):
-                        print("Weighting Potential dimension not match")
-                        return
+                WeightingPotentialMetadata, WeightingPotentialUniform = self._load_field(WeightingPotentialFile)
+                print("Weighting Potential file loaded for {} at electrode {}".format(self.name, i+1))
+                if WeightingPotentialMetadata['dimension'] < self.dimension:
+                    print("Weighting Potential dimension not match")
+                    return
             except FileNotFoundError:
                 print("Weighting Potential file not found at {}, please run field simulation first".format(WeightingPotentialFile))
                 print("or manually set the Weighting Potential file")
                 return
-            
-            if WeightingPotentialNotUniform['metadata']['dimension'] == 1:
-                WeightingPotentialUniform = get_common_interpolate_1d(WeightingPotentialNotUniform)
-            elif WeightingPotentialNotUniform['metadata']['dimension'] == 2:
-                WeightingPotentialUniform = get_common_interpolate_2d(WeightingPotentialNotUniform)
-            elif WeightingPotentialNotUniform['metadata']['dimension'] == 3:
-                WeightingPotentialUniform = get_common_interpolate_3d(WeightingPotentialNotUniform)
 
             self.WeightingPotential.append(WeightingPotentialUniform)
     
     def set_trap_p(self, TrappingRate_pFile):
         try:
-            with open(TrappingRate_pFile,'rb') as file:
-                TrappingRate_pNotUniform=pickle.load(file)
-                print("TrappingRate_p file loaded for {}".format(self.name))
-                if TrappingRate_pNotUniform['metadata']['dimension'] < self.dimension:
-                    print("TrappingRate_p dimension not match")
-                    return
+            TrappingRate_pMetadata, TrappingRate_pUniform = self._load_field(TrappingRate_pFile)
+            print("TrappingRate_p file loaded for {}".format(self.name))
+            if TrappingRate_pMetadata['dimension'] < self.dimension:
+                print("TrappingRate_p dimension not match")
+                return
         except FileNotFoundError:
             print("TrappingRate_p file not found at {}, please run field simulation first".format(TrappingRate_pFile))
             print("or manually set the hole trapping rate file")
             return
-        
-        if TrappingRate_pNotUniform['metadata']['dimension'] == 1:
-            TrappingRate_pUniform = get_common_interpolate_1d(TrappingRate_pNotUniform)
-        elif TrappingRate_pNotUniform['metadata']['dimension'] == 2:
-            TrappingRate_pUniform = get_common_interpolate_2d(TrappingRate_pNotUniform)
-        elif TrappingRate_pNotUniform['metadata']['dimension'] == 3:
-            TrappingRate_pUniform = get_common_interpolate_3d(TrappingRate_pNotUniform)
 
         self.TrappingRate_p = TrappingRate_pUniform
     
     def set_trap_n(self, TrappingRate_nFile):
         try:
-            with open(TrappingRate_nFile,'rb') as file:
-                TrappingRate_nNotUniform=pickle.load(file)
-                print("TrappingRate_n file loaded for {}".format(self.name))
-                if TrappingRate_nNotUniform['metadata']['dimension'] != self.dimension:
-                    print("TrappingRate_n dimension not match")
-                    return
+            TrappingRate_nMetadata, TrappingRate_nUniform = self._load_field(TrappingRate_nFile)
+            print("TrappingRate_n file loaded for {}".format(self.name))
+            if TrappingRate_nMetadata['dimension'] != self.dimension:
+                print("TrappingRate_n dimension not match")
+                return
         except FileNotFoundError:
             print("TrappingRate_n file not found at {}, please run field simulation first".format(TrappingRate_nFile))
             print("or manually set the electron trapping rate file")
             return
-        
-        if TrappingRate_nNotUniform['metadata']['dimension'] == 1:
-            TrappingRate_nUniform = get_common_interpolate_1d(TrappingRate_nNotUniform)
-        elif TrappingRate_nNotUniform['metadata']['dimension'] == 2:
-            TrappingRate_nUniform = get_common_interpolate_2d(TrappingRate_nNotUniform)
-        elif TrappingRate_nNotUniform['metadata']['dimension'] == 3:
-            TrappingRate_nUniform = get_common_interpolate_3d(TrappingRate_nNotUniform)
 
         self.TrappingRate_n = TrappingRate_nUniform
         
@@ -279,6 +290,9 @@ class DevsimField:
         input: position in um
         output: intensity in V/cm
         """ 
+        if self.e_field_grid is not None:
+            return tuple(self.get_e_field_many([[x, y, z]])[0])
+
         x, y, z = x / 1e4, y / 1e4, z / 1e4  # um to cm
 
         if self.dimension == 1:
@@ -385,24 +399,102 @@ class DevsimField:
             else:
                 return self.TrappingRate_p(z, x, y)
 
+    # 批量查询方法: 输入 (N, 3) 位置数组 (um)，每个物理量只调用一次插值器
+    def _axis_names(self):
+        if self.dimension == 1:
+            return ('z',)
+        elif self.dimension == 2:
+            if self.is_plugin:
+                return ('x', 'y')  # 2D插件使用x,y
+            else:
+                return ('z', 'x')
+        elif self.dimension == 3:
+            if self.mesher == "sde": # SDE使用x,y,z坐标
+                return ('x', 'y', 'z')
+            else:
+                return ('z', 'x', 'y')
+
+    def _axis_args(self, xyz):
+        x, y, z = (np.asarray(xyz, dtype=np.float64).reshape(-1, 3) / 1e4).T # um to cm
+        coords = {'x': x, 'y': y, 'z': z}
+        return tuple(coords[axis] for axis in self._axis_names())
+
+    def _interpolate_many(self, function, xyz):
+        args = self._axis_args(xyz)
+        many = getattr(function, 'many', None)
+        if many is None:
+            # 手动设置的插值函数没有批量接口时逐点计算
+            return np.array([np.asarray(function(*point)).item() for point in zip(*args)], dtype=np.float64)
+        return np.asarray(many(*args), dtype=np.float64).reshape(-1)
+
+    def get_e_field_many(self, xyz):
+        """
+        input: positions in um, shape (N, 3)
+        output: intensity in V/cm, shape (N, 3)
+        """
+        xyz = np.asarray(xyz, dtype=np.float64).reshape(-1, 3)
+        e_field = np.zeros_like(xyz)
+        if len(xyz) == 0:
+            return e_field
+        if self.e_field_grid is not None:
+            args = self._axis_args(xyz)
+            for axis, gradient in self.e_field_grid.items():
+                e_field[:, 'xyz'.index(axis)] = -1 * gradient.many(*args)
+            return e_field
+        many = getattr(self.Potential, 'many', None)
+        if many is None:
+            # 手动设置的电势插值函数没有批量接口时逐点计算
+            self._cache_stats['fallbacks'] += 1
+            return np.array([self._get_e_field(x, y, z) for x, y, z in xyz], dtype=np.float64)
+        # 越界点为 NaN, 由调用方判定为无效
+        nabla_U = calculate_gradient_many(many, self._axis_args(xyz))
+        for axis, component in zip(self._axis_names(), nabla_U):
+            e_field[:, 'xyz'.index(axis)] = -1 * component
+        return e_field
+
+    def get_doping_many(self, xyz):
+        """
+        input: positions in um, shape (N, 3)
+        output: doping in cm^-3, shape (N,)
+        """
+        return self._interpolate_many(self.Doping, xyz)
+
+    def get_w_p_many(self, xyz, n):
+        """
+        input: positions in um, shape (N, 3), electrode index n
+        output: weighting potential clipped to [0, 1], shape (N,)
+        """
+        U_w = self._interpolate_many(self.WeightingPotential[n], xyz)
+        # exclude non-physical values, same as _get_w_p
+        return np.clip(np.nan_to_num(U_w, nan=0.0), 0.0, 1.0)
+
+    def get_trap_h_many(self, xyz):
+        """
+        input: positions in um, shape (N, 3)
+        output: hole trapping rate in s^-1, shape (N,)
+        """
+        return self._interpolate_many(self.TrappingRate_p, xyz)
+
+    def get_trap_e_many(self, xyz):
+        """
+        input: positions in um, shape (N, 3)
+        output: electron trapping rate in s^-1, shape (N,)
+        """
+        return self._interpolate_many(self.TrappingRate_n, xyz)
+
     # 缓存方法
     def get_e_field_cached(self, x, y, z):
         try:
             if not self._is_position_valid(x, y, z):
                 return self._get_e_field(x, y, z) # 不缓存异常位置的电场值，继承报错
                 
-            key_x, key_y, key_z = self._get_index_coords(x, y, z)
-            key = (key_x, key_y, key_z)
-            
-            if key in self.e_field_cache:
-                self._cache_stats['hits'] += 1
-                return self.e_field_cache[key]
-            else:
-                self._cache_stats['misses'] += 1
+            key = self._get_index_coords(x, y, z)
+            e_field = self.e_field_cache.get(key)
+            if e_field is None:
                 e_field = self._get_e_field(x, y, z)
                 if e_field is not None:
-                    self.e_field_cache[key] = e_field
-                return e_field
+                    self.e_field_cache.put(key, e_field)
+            return e_field
                 
         except Exception as e:
             self._cache_stats['errors'] += 1
@@ -414,16 +506,13 @@ class DevsimField:
             if not self._is_position_valid(x, y, z):
                 return self._get_doping(x, y, z)
                 
-            key_x, key_y, key_z = self._get_index_coords(x, y, z)
-            key = (key_x, key_y, key_z)
-            
-            if key in self.doping_cache:
-                return self.doping_cache[key]
-            else:
+            key = self._get_index_coords(x, y, z)
+            doping = self.doping_cache.get(key)
+            if doping is None:
                 doping = self._get_doping(x, y, z)
                 if doping is not None:
-                    self.doping_cache[key] = doping
-                return doping
+                    self.doping_cache.put(key, doping)
+            return doping
         except Exception as e:
             logger.warning(f"failed when getting doping cache ({x:.1f}, {y:.1f}, {z:.1f}): {e}")
             return 0.0  # 默认掺杂浓度
@@ -432,15 +521,13 @@ class DevsimField:
         try:
             if not self._is_position_valid(x, y, z):
                 return self._get_w_p(x, y, z, n)
-            key_x, key_y, key_z = self._get_index_coords(x, y, z)
-            key = (key_x, key_y, key_z, n)
-            if key in self.w_p_cache:
-                return self.w_p_cache[key]
-            else:
+            key = self._get_index_coords(x, y, z)
+            w_p = self.w_p_cache[n].get(key)
+            if w_p is None:
                 w_p = self._get_w_p(x, y, z, n)
                 if w_p is not None:
-                    self.w_p_cache[key] = w_p
-                return w_p
+                    self.w_p_cache[n].put(key, w_p)
+            return w_p
         except Exception as e:
             logger.warning(f"failed when getting w_p cache ({x:.1f}, {y:.1f}, {z:.1f}, {n}): {e}")
             return None
@@ -451,18 +538,13 @@ class DevsimField:
             if not self._is_position_valid(x, y, z):
                 return self._get_trap_h(x, y, z)
                 
-            key_x, key_y, key_z = self._get_index_coords(x, y, z)
-            key = (key_x, key_y, key_z)
-            
-            if key in self.trap_h_cache:
-                self._cache_stats['trap_h_hits'] += 1
-                return self.trap_h_cache[key]
-            else:
-                self._cache_stats['trap_h_misses'] += 1
+            key = self._get_index_coords(x, y, z)
+            trap_rate = self.trap_h_cache.get(key)
+            if trap_rate is None:
                 trap_rate = self._get_trap_h(x, y, z)
                 if trap_rate is not None:
-                    self.trap_h_cache[key] = trap_rate
-                return trap_rate
+                    self.trap_h_cache.put(key, trap_rate)
+            return trap_rate
                 
         except Exception as e:
             logger.warning(f"failed when getting hole trap rate cache ({x:.1f}, {y:.1f}, {z:.1f}): {e}")
@@ -474,18 +556,13 @@ class DevsimField:
             if not self._is_position_valid(x, y, z):
                 return self._get_trap_e(x, y, z)
                 
-            key_x, key_y, key_z = self._get_index_coords(x, y, z)
-            key = (key_x, key_y, key_z)
-            
-            if key in self.trap_e_cache:
-                self._cache_stats['trap_e_hits'] += 1
-                return self.trap_e_cache[key]
-            else:
-                self._cache_stats['trap_e_misses'] += 1
+            key = self._get_index_coords(x, y, z)
+            trap_rate = self.trap_e_cache.get(key)
+            if trap_rate is None:
                 trap_rate = self._get_trap_e(x, y, z)
                 if trap_rate is not None:
-                    self.trap_e_cache[key] = trap_rate
-                return trap_rate
+                    self.trap_e_cache.put(key, trap_rate)
+            return trap_rate
                 
         except Exception as e:
             logger.warning(f"failed when getting electron trap rate cache ({x:.1f}, {y:.1f}, {z:.1f}): {e}")
@@ -522,44 +599,64 @@ class DevsimField:
                 idx = min(idx, upper_idx)
         return idx
 
+    def _init_caches(self):
+        """按 bounds 和 resolution 建立各场量的体素缓存, cache_max_mb 在各缓存间平均分配"""
+        lower, shape = [], []
+        for axis in ('x', 'y', 'z'):
+            bounds = self.bounds.get(axis)
+            if not bounds or bounds[0] is None or bounds[1] is None:
+                lower, shape = None, None
+                break
+            lower_idx = self._get_index_axis(bounds[0], axis)
+            upper_idx = self._get_index_axis(bounds[1], axis)
+            lower.append(lower_idx)
+            shape.append(upper_idx - lower_idx + 1)
+
+        n_caches = 4 + len(self.read_out_contact)
+        max_bytes = self.cache_max_mb * 1024**2 / n_caches
+        self.e_field_cache = VoxelCache(lower, shape, width=3, max_bytes=max_bytes)
+        self.doping_cache = VoxelCache(lower, shape, max_bytes=max_bytes)
+        self.w_p_cache = [VoxelCache(lower, shape, max_bytes=max_bytes) for _ in self.read_out_contact]
+        self.trap_h_cache = VoxelCache(lower, shape, max_bytes=max_bytes)  # 空穴陷阱率缓存
+        self.trap_e_cache = VoxelCache(lower, shape, max_bytes=max_bytes)  # 电子陷阱率缓存
+
     def get_cache_stats(self):
-        total = ( self._cache_stats['hits'] + self._cache_stats['misses'] + self._cache_stats['errors']
-        )
-        hit_rate = self._cache_stats['hits'] / total if total > 0 else 0
-        
-        # 陷阱率缓存统计
-        trap_h_total = ( self._cache_stats['trap_h_hits'] + self._cache_stats['trap_h_misses']
-        )
-        trap_h_hit_rate = ( self._cache_stats['trap_h_hits'] / trap_h_total if trap_h_total > 0 else 0
-        )
-        
-        trap_e_total = ( self._cache_stats['trap_e_hits'] + self._cache_stats['trap_e_misses']
-        )
-        trap_e_hit_rate = ( self._cache_stats['trap_e_hits'] / trap_e_total if trap_e_total > 0 else 0
-        )
+        e_field = self.e_field_cache.get_stats()
+        trap_h = self.trap_h_cache.get_stats()
+        trap_e = self.trap_e_cache.get_stats()
+        # 命中率计入出错的查询, 与之前的统计口径一致
+        total = e_field['hits'] + e_field['misses'] + self._cache_stats['errors']
+        hit_rate = e_field['hits'] / total if total > 0 else 0
         
         return {
-            'hits': self._cache_stats['hits'],
-            'misses': self._cache_stats['misses'],
+            'hits': e_field['hits'],
+            'misses': e_field['misses'],
             'errors': self._cache_stats['errors'],
             'fallbacks': self._cache_stats['fallbacks'],
             'hit_rate': hit_rate,
-            'total_entries': len(self.e_field_cache),
-            'trap_h_hits': self._cache_stats['trap_h_hits'],
-            'trap_h_misses': self._cache_stats['trap_h_misses'],
-            'trap_h_hit_rate': trap_h_hit_rate,
-            'trap_h_entries': len(self.trap_h_cache),
-            'trap_e_hits': self._cache_stats['trap_e_hits'],
-            'trap_e_misses': self._cache_stats['trap_e_misses'],
-            'trap_e_hit_rate': trap_e_hit_rate,
-            'trap_e_entries': len(self.trap_e_cache),
+            'total_entries': e_field['entries'],
+            'trap_h_hits': trap_h['hits'],
+            'trap_h_misses': trap_h['misses'],
+            'trap_h_hit_rate': trap_h['hit_rate'],
+            'trap_h_entries': trap_h['entries'],
+            'trap_e_hits': trap_e['hits'],
+            'trap_e_misses': trap_e['misses'],
+            'trap_e_hit_rate': trap_e['hit_rate'],
+            'trap_e_entries': trap_e['entries'],
+            # 各场量的详细统计: mode, hits, misses, evictions, hit_rate, entries, nbytes
+            'e_field': e_field,
+            'doping': self.doping_cache.get_stats(),
+            'w_p': [cache.get_stats() for cache in self.w_p_cache],
+            'trap_h': trap_h,
+            'trap_e': trap_e,
         }
     
     def clear_cache(self):
         """清空所有缓存"""
         self.e_field_cache.clear()
         self.doping_cache.clear()
-        self.w_p_cache.clear()
+        for cache in self.w_p_cache:
+            cache.clear()
         self.trap_h_cache.clear()
         self.trap_e_cache.clear()
         logger.info("所有缓存已清空")
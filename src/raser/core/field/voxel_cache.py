@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@File    :   voxel_cache.py
+@Time    :   2026/10/18
+@Version :   1.0
+'''
+
+from collections import OrderedDict
+import math
+
+import numpy as np
+
+# LRU 模式下每个条目 (键元组 + 值 + 字典开销) 的估计字节数
+lru_entry_bytes = 256
+
+
+class VoxelCache:
+    """
+    按分辨率网格索引缓存场量
+
+    网格有界且总大小不超过 max_bytes 时, 使用预分配的 NumPy 数组 + 有效位图 (dense);
+    否则退化为条目数受 max_bytes 限制的 LRU 字典 (lru), 超出时淘汰最久未使用的体素
+    """
+    def __init__(self, lower=None, shape=None, width=1, max_bytes=64 * 1024**2):
+        self.width = int(width)
+        self.max_bytes = int(max_bytes)
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+        dense_bytes = math.inf
+        if shape is not None:
+            dense_bytes = math.prod(shape) * (self.width * 8 + 1)  # float64 值 + bool 位图
+        if dense_bytes <= self.max_bytes:
+            self.mode = "dense"
+            self.lower = tuple(int(i) for i in lower)
+            self.shape = tuple(int(n) for n in shape)
+            self.values = np.zeros(self.shape + (self.width,), dtype=np.float64)
+            self.valid = np.zeros(self.shape, dtype=bool)
+        else:
+            self.mode = "lru"
+            self.max_entries = max(1, self.max_bytes // lru_entry_bytes)
+            self.entries = OrderedDict()
+
+    def _dense_index(self, key):
+        index = tuple(k - l for k, l in zip(key, self.lower))
+        for i, n in zip(index, self.shape):
+            if i < 0 or i >= n:
+                return None
+        return index
+
+    def get(self, key):
+        """返回缓存值, 未命中时返回 None; 标量返回 float, 向量返回 tuple"""
+        if self.mode == "dense":
+            index = self._dense_index(key)
+            if index is not None and self.valid[index]:
+                self.stats['hits'] += 1
+                return self._unpack(self.values[index])
+        elif key in self.entries:
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return self._unpack(self.entries[key])
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, key, value):
+        # 插值器可能返回 0 维或单元素数组, 逐分量展平
+        if self.width == 1:
+            packed = np.ravel(np.asarray(value, dtype=np.float64))
+        else:
+            packed = np.concatenate([np.ravel(np.asarray(v, dtype=np.float64)) for v in value])
+        if packed.shape != (self.width,):
+            return
+        if self.mode == "dense":
+            index = self._dense_index(key)
+            if index is not None:
+                self.values[index] = packed
+                self.valid[index] = True
+            return
+        self.entries[key] = packed
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _unpack(self, packed):
+        if self.width == 1:
+            return float(packed[0])
+        return tuple(float(v) for v in packed)
+
+    def __len__(self):
+        if self.mode == "dense":
+            return int(np.count_nonzero(self.valid))
+        return len(self.entries)
+
+    @property
+    def nbytes(self):
+        if self.mode == "dense":
+            return self.values.nbytes + self.valid.nbytes
+        return len(self.entries) * lru_entry_bytes
+
+    def clear(self):
+        if self.mode == "dense":
+            self.valid[...] = False
+        else:
+            self.entries.clear()
+
+    def get_stats(self):
+        total = self.stats['hits'] + self.stats['misses']
+        return {
+            'mode': self.mode,
+            'hits': self.stats['hits'],
+            'misses': self.stats['misses'],
+            'evictions': self.stats['evictions'],
+            'hit_rate': self.stats['hits'] / total if total > 0 else 0,
+            'entries': len(self),
+            'nbytes': self.nbytes,
+        }
@@ -13,12 +13,17 @@ g4b.include("G4VUserActionInitialization.hh")
 from .run_action import GeneralRunAction
 from .event_action import GeneralEventAction
 from .stepping_action import GeneralSteppingAction
+from .stepping_action import STEP_CAPTURES
+from .stepping_action import device_step_capture
 from .primary_generator_action import GeneralPrimaryGeneratorAction
 
 class GeneralActionInitialization(g4b.G4VUserActionInitialization):
     def __init__(self, par_in, par_out, par_randx, par_randy, par_type, par_energy,
-                 eventIDs, edep_devices, p_steps, energy_steps, events_angles, geant4_model,):
+                 eventIDs, edep_devices, p_steps, energy_steps, events_angles, geant4_model, step_capture="python",):
+        """step_capture: "python" calls GeneralSteppingAction on every step, "cpp" filters and collects device steps in C++"""
         super().__init__()
+        if step_capture not in STEP_CAPTURES:
+            raise ValueError("Unsupported step_capture: {}".format(step_capture))
         self.par_in = par_in
         self.par_out = par_out
         self.par_type = par_type
@@ -33,6 +38,7 @@ class GeneralActionInitialization(g4b.G4VUserActionInitialization):
         self.events_angles = events_angles
 
         self.geant4_model=geant4_model
+        self.step_capture = step_capture
         self.actions = []
 
     def Build(self):
@@ -49,10 +55,12 @@ class GeneralActionInitialization(g4b.G4VUserActionInitialization):
         myRA_action = GeneralRunAction()
         self.actions.append(myRA_action)
         self.SetUserAction(myRA_action)
+        capture = device_step_capture() if self.step_capture == "cpp" else None
         myEA = GeneralEventAction(myRA_action, self.par_in, self.par_out, 
-                                  self.eventIDs, self.edep_devices, self.p_steps, self.energy_steps, self.events_angles,)
+                                  self.eventIDs, self.edep_devices, self.p_steps, self.energy_steps, self.events_angles,
+                                  step_capture=capture,)
         self.actions.append(myEA)
         self.SetUserAction(myEA)
-        stepping_action = GeneralSteppingAction(myEA)
+        stepping_action = capture if capture is not None else GeneralSteppingAction(myEA)
         self.actions.append(stepping_action)
         self.SetUserAction(stepping_action)
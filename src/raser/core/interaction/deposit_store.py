@@ -0,0 +1,132 @@
+'''
+Description:  Store Geant4 energy deposits once and replay them for later signal runs
+@Date       : 2026/10/18
+@version    : 1.0
+'''
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from raser.supports.paths import component_candidates
+
+# 只影响可视化, 不影响沉积的 Geant4 配置项
+_VIS_KEYS = ("g4_vis", "g4_vis_driver", "g4_vis_output")
+
+
+def resolve_gdml_path(path_text: str) -> str:
+    if not path_text:
+        raise ValueError('g4experiment json is missing gdml.file')
+    if os.path.isabs(path_text) and os.path.exists(path_text):
+        return path_text
+    candidates = []
+    candidates.extend(str(path) for path in component_candidates(path_text))
+    candidates.extend(str(path) for path in component_candidates('g4experiment', path_text))
+    repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+    candidates.append(os.path.join(repo_root, path_text))
+
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return os.path.abspath(candidate)
+
+    searched = '\n  - '.join(candidates)
+    raise FileNotFoundError(
+        f"Cannot find GDML file: {path_text}\nSearched:\n  - {searched}")
+
+
+def geometry_hash(g4_dic):
+    """Content hash of the imported GDML file, None when the model builds its own geometry"""
+    if g4_dic.get("geant4_model") != "gdml_import":
+        return None
+    with open(resolve_gdml_path(g4_dic.get("gdml", {}).get("file", "")), "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def deposit_key(my_d, g4_dic, g4_seed):
+    """
+    Hash of everything the deposits depend on: sensor geometry and material, Geant4 config,
+    imported GDML content and seed
+    """
+    content = {
+        "device": {
+            "l_x": my_d.l_x,
+            "l_y": my_d.l_y,
+            "l_z": my_d.l_z,
+            "material": my_d.device_dict.get("material"),
+        },
+        "geant4": {key: value for key, value in g4_dic.items() if key not in _VIS_KEYS},
+        # 只记路径的话, 改了 GDML 内容仍会命中旧的沉积
+        "geometry": geometry_hash(g4_dic),
+        "seed": g4_seed,
+    }
+    text = json.dumps(content, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:20], text
+
+
+def deposit_file(cache_path, my_d, g4_dic, g4_seed):
+    key, _ = deposit_key(my_d, g4_dic, g4_seed)
+    return os.path.join(str(cache_path), "g4_deposits_{}.npz".format(key))
+
+
+def save_deposits(file_path, my_g4, my_d, g4_seed):
+    """
+    Ragged per-event steps as flat arrays: steps (n_steps, 3) in um and energy (n_steps,)
+    in MeV, with offsets (n_events + 1,) into them; entry/exit points are the first and
+    last step of each event. Written to a temporary file first, so jobs sharing the cache
+    never read a partial file
+    """
+    lengths = np.array([len(p_step) for p_step in my_g4.p_steps], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    steps = np.array([step for p_step in my_g4.p_steps for step in p_step], dtype=np.float64).reshape(-1, 3)
+    energy = np.array([edep for energy_step in my_g4.energy_steps for edep in energy_step], dtype=np.float64)
+    _, key_text = deposit_key(my_d, my_g4.g4_dic, g4_seed)
+    arrays = {
+        "key": np.array(key_text),
+        "geant4_model": np.array(my_g4.geant4_model),
+        "event_ids": np.array(my_g4.eventIDs, dtype=np.int64),
+        "edep_devices": np.array(my_g4.edep_devices, dtype=np.float64),
+        "events_angles": np.array([np.nan if angle is None else angle for angle in my_g4.events_angles], dtype=np.float64),
+        "offsets": offsets,
+        "steps": steps,
+        "energy_steps": energy,
+        "entry_points": steps[offsets[:-1]] if len(lengths) else np.zeros((0, 3)),
+        "exit_points": steps[offsets[1:] - 1] if len(lengths) else np.zeros((0, 3)),
+    }
+    tmp_path = "{}.{}.tmp".format(file_path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmp_path, file_path)
+
+
+class G4DepositReplay:
+    """
+    Description:
+        Stand-in for GeneralG4Interaction that serves deposits written by save_deposits,
+        with the same eventIDs, edep_devices, p_steps, energy_steps, events_angles and
+        p_steps_current lists, so CalCurrentG4P runs on it without Geant4
+    """
+    def __init__(self, my_d, g4_dic, file_path):
+        self.my_d = my_d
+        self.g4_dic = g4_dic
+        self.geant4_model = g4_dic['geant4_model']
+        self.init_tz_device = 0
+        self.load(file_path)
+
+    def load(self, file_path):
+        with np.load(file_path) as stored:
+            offsets = stored["offsets"]
+            steps = stored["steps"]
+            energy = stored["energy_steps"]
+            self.eventIDs = stored["event_ids"].tolist()
+            self.edep_devices = stored["edep_devices"].tolist()
+            self.events_angles = [None if np.isnan(angle) else angle for angle in stored["events_angles"].tolist()]
+            self.entry_points = stored["entry_points"]
+            self.exit_points = stored["exit_points"]
+        self.p_steps = [steps[start:end].tolist() for start, end in zip(offsets[:-1], offsets[1:])]
+        self.energy_steps = [energy[start:end].tolist() for start, end in zip(offsets[:-1], offsets[1:])]
+        # 与 GeneralG4Interaction 相同, Geant4 坐标转成器件坐标
+        shift = np.array([self.my_d.l_x/2, self.my_d.l_y/2, -self.init_tz_device])
+        current = steps + shift
+        self.p_steps_current = [current[start:end].tolist() for start, end in zip(offsets[:-1], offsets[1:])]
@@ -10,9 +10,12 @@ import g4ppyy as g4b
 g4b.include("G4UserEventAction.hh")
 import numpy as np
 
+from .step_buffers import captured_steps
+
 class GeneralEventAction(g4b.G4UserEventAction):
     "My Event Action"
-    def __init__(self, runAction, point_in, point_out, eventIDs, edep_devices, p_steps, energy_steps, events_angles,):
+    def __init__(self, runAction, point_in, point_out, eventIDs, edep_devices, p_steps, energy_steps, events_angles, step_capture=None,):
+        """step_capture: a device_step_capture stepping action; its steps replace RecordDevice calls"""
         super().__init__()
         self.fRunAction = runAction
         self.point_in = point_in
@@ -23,15 +26,24 @@ class GeneralEventAction(g4b.G4UserEventAction):
         self.p_steps = p_steps
         self.energy_steps = energy_steps
         self.events_angles = events_angles
+        self.step_capture = step_capture
 
     def BeginOfEventAction(self, event):
         self.edep_device= 0.0
         self.event_angle = 0.0
         self.p_step = []
         self.energy_step = []
+        if self.step_capture is not None:
+            if event.GetEventID() == 0:
+                self.step_capture.ResetVolumes()
+            self.step_capture.Clear()
 
     def EndOfEventAction(self, event):
         eventID = event.GetEventID()
+        if self.step_capture is not None:
+            positions, energy, self.edep_device = captured_steps(self.step_capture)
+            self.p_step = positions.tolist()
+            self.energy_step = energy.tolist()
         #print("eventID:%s"%eventID)
         if len(self.p_step):
             point_a = [ b-a for a,b in zip(self.point_in,self.point_out)]
@@ -5,13 +5,12 @@ implementation. It can separately style the imported PCB geometry and the RASER
 Device volume so both can be inspected together in Geant4.
 """
 
-import os
 import xml.etree.ElementTree as ET
 
 import g4ppyy as g4b
 
+from .deposit_store import resolve_gdml_path as _resolve_gdml_path
 from .detector_construction import GeneralDetectorConstruction
-from raser.supports.paths import component_candidates
 
 WRAPPER_WORLD_NAME = 'RASER_GDML_WRAPPER_WORLD'
 WRAPPER_BOX_NAME = 'RASER_GDML_WRAPPER_BOX'
@@ -33,25 +32,6 @@ def _as_bool(value, default=False):
     return default
 
 
-def _resolve_gdml_path(path_text: str) -> str:
-    if not path_text:
-        raise ValueError('g4experiment json is missing gdml.file')
-    if os.path.isabs(path_text) and os.path.exists(path_text):
-        return path_text
-    candidates = []
-    candidates.extend(str(path) for path in component_candidates(path_text))
-    candidates.extend(str(path) for path in component_candidates('g4experiment', path_text))
-    repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
-    candidates.append(os.path.join(repo_root, path_text))
-
-    for candidate in candidates:
-        if os.path.exists(candidate):
-            return os.path.abspath(candidate)
-
-    searched = '\n  - '.join(candidates)
-    raise FileNotFoundError(
-        f"Cannot find GDML file: {path_text}\nSearched:\n  - {searched}")
-
 def _gdml_structure_has_volume_name(gdml_path: str, name: str) -> bool:
     if not name:
         return False
@@ -90,6 +90,8 @@ class GeneralG4Interaction:
             g4_dic['par_randy'] = 0
 
         self.geant4_model = g4_dic['geant4_model']
+        self.g4_dic = g4_dic
+        self.my_d = my_d
         detector_material=my_d.device_dict['material']
 
         if (self.geant4_model == 'gdml_import'
@@ -125,10 +127,14 @@ class GeneralG4Interaction:
         ) = [],[],[],[],[]
 
         #define action
+        # "step_capture": "cpp" 时器件内的步在 C++ 中筛选累积 (见 stepping_action.device_step_capture)
+        action_options = {}
+        if 'step_capture' in g4_dic:
+            action_options['step_capture'] = g4_dic['step_capture']
         self.action_initialization = MyActionInitialization(
                                           g4_dic['par_in'], g4_dic['par_out'], g4_dic['par_randx'], g4_dic['par_randy'], g4_dic['par_type'], g4_dic['par_energy'],
                                           self.eventIDs, self.edep_devices, self.p_steps, self.energy_steps, self.events_angles,
-                                          self.geant4_model,)
+                                          self.geant4_model, **action_options,)
         self.g4RunManager.SetUserInitialization(self.action_initialization)
         
         if g4_vis:  
@@ -176,12 +182,29 @@ class GeneralG4Interaction:
             del ui
 
         self.init_tz_device = 0    
+        self._update_steps_current()
+
+    def _update_steps_current(self):
+        my_d = self.my_d
         self.p_steps_current=[[[single_step[0]+my_d.l_x/2,
                                 single_step[1]+my_d.l_y/2,
                                 single_step[2]-self.init_tz_device,]\
             for single_step in p_step] for p_step in self.p_steps]
         # change the coordinate system from Geant4 to device
 
+    def beam_on(self, g4_seed=None):
+        """
+        Description:
+            Simulate another batch of total_events particles with the geometry
+            and physics list already initialised, replacing the recorded steps
+        """
+        if g4_seed is not None:
+            g4b.cppyy.gbl.CLHEP.HepRandom.setTheSeed(g4_seed)
+        # the action classes keep references to these lists, so clear them in place
+        for records in (self.eventIDs, self.edep_devices, self.p_steps, self.energy_steps, self.events_angles):
+            del records[:]
+        self.g4RunManager.BeamOn(int(self.g4_dic['total_events']))
+        self._update_steps_current()
         
     def __del__(self):
         pass
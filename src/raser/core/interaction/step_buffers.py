@@ -0,0 +1,23 @@
+'''
+Description:  Copy the per-event buffers of the C++ step capture into NumPy arrays
+@Date       : 2026/10/18
+@version    : 1.0
+'''
+
+import numpy as np
+
+
+def _vector_array(vector):
+    """Copy of a std::vector<double> as a NumPy array through its buffer"""
+    n = vector.size()
+    if n == 0:
+        return np.zeros(0)
+    view = vector.data()
+    view.reshape((n,))
+    return np.frombuffer(view, dtype=np.float64, count=n).copy()
+
+
+def captured_steps(capture):
+    """(positions (n_steps, 3) in um, energy deposits (n_steps,), total energy deposit) of the current event"""
+    positions = _vector_array(capture.Positions()).reshape(-1, 3)
+    return positions, _vector_array(capture.Edep()), float(capture.TotalEdep())
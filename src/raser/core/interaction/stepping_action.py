@@ -1,6 +1,65 @@
 import g4ppyy as g4b
 
 g4b.include("G4UserSteppingAction.hh")
+g4b.include("G4Step.hh")
+g4b.include("G4LogicalVolume.hh")
+g4b.include("G4VPhysicalVolume.hh")
+
+STEP_CAPTURES = ("python", "cpp")
+
+# 器件体积内的步在 C++ 里筛选和累积, 每个事件结束时整块取回, 不再每步回调 Python
+_DEVICE_STEP_CAPTURE_CODE = """
+#include <string>
+#include <unordered_map>
+#include <vector>
+
+namespace raser {
+class DeviceStepCapture : public G4UserSteppingAction {
+public:
+    explicit DeviceStepCapture(const std::string& volume_name) : fVolumeName(volume_name) {}
+
+    void UserSteppingAction(const G4Step* step) override {
+        const G4StepPoint* pre = step->GetPreStepPoint();
+        const G4VPhysicalVolume* physical = pre->GetTouchableHandle()->GetVolume();
+        if (physical == nullptr) return;
+        const G4LogicalVolume* logical = physical->GetLogicalVolume();
+        auto known = fIsDevice.find(logical);
+        if (known == fIsDevice.end()) {
+            known = fIsDevice.emplace(logical, logical->GetName() == fVolumeName).first;
+        }
+        if (!known->second) return;
+        const G4double edep = step->GetTotalEnergyDeposit();
+        const G4ThreeVector& position = pre->GetPosition();
+        // mm -> um
+        fPositions.push_back(position.x()*1000);
+        fPositions.push_back(position.y()*1000);
+        fPositions.push_back(position.z()*1000);
+        fEdep.push_back(edep);
+        fTotalEdep += edep;
+    }
+
+    void Clear() {
+        fPositions.clear();
+        fEdep.clear();
+        fTotalEdep = 0;
+    }
+
+    // 几何只会在两次 BeamOn 之间重建: 每个 run 开始时清空按体积指针缓存的判断
+    void ResetVolumes() { fIsDevice.clear(); }
+
+    const std::vector<double>& Positions() const { return fPositions; }
+    const std::vector<double>& Edep() const { return fEdep; }
+    double TotalEdep() const { return fTotalEdep; }
+
+private:
+    std::string fVolumeName;
+    std::unordered_map<const G4LogicalVolume*, bool> fIsDevice;
+    std::vector<double> fPositions;
+    std::vector<double> fEdep;
+    double fTotalEdep = 0;
+};
+}
+"""
 
 class GeneralSteppingAction(g4b.G4UserSteppingAction):
     "My Stepping Action"
@@ -19,3 +78,11 @@ class GeneralSteppingAction(g4b.G4UserSteppingAction):
 
         if self.volume_name == "Device": # important, no if => no signal
             self.fEventAction.RecordDevice(edep,point_in,point_out)
+
+
+def device_step_capture(volume_name="Device"):
+    """C++ stepping action recording the steps in volume_name; see GeneralEventAction.step_capture"""
+    if not hasattr(g4b.cppyy.gbl, "raser") or not hasattr(g4b.cppyy.gbl.raser, "DeviceStepCapture"):
+        g4b.cppyy.cppdef(_DEVICE_STEP_CAPTURE_CODE)
+    return g4b.cppyy.gbl.raser.DeviceStepCapture(volume_name)
+
@@ -0,0 +1,164 @@
+'''
+Description:  Waveform metrics over (events, electrodes, bins) NumPy blocks
+@Date       : 2026/10/18
+@version    : 1.0
+'''
+
+import numpy as np
+
+CFD = 0.5
+CFD_LABEL = "CFD50"
+# 事件级 ToT 合并阈值 (s)
+TOT_CLUSTER_THRESHOLD = 10e-9
+
+
+def _last_true(mask):
+    """沿最后一维最后一个 True 的下标, 没有则为 -1"""
+    n = mask.shape[-1]
+    index = n - 1 - np.argmax(mask[..., ::-1], axis=-1)
+    return np.where(mask.any(axis=-1), index, -1)
+
+
+def _first_true(mask):
+    index = np.argmax(mask, axis=-1)
+    return np.where(mask.any(axis=-1), index, -1)
+
+
+def _take(values, index):
+    return np.take_along_axis(values, np.maximum(index, 0)[..., None], axis=-1)[..., 0]
+
+
+def electrode_metrics(waveforms, centers, threshold, CFD=CFD):
+    """
+    每个事件每个电极的 amplitude, peak_bin, ToA, ToT, charge, CFD50, 形状 (n_events, n_electrodes)
+
+    与 waveform_stats.get_amplitude/get_ToA/get_ToT/get_charge/get_CFD50 逐 bin 算法一致:
+    peak_bin 从 1 开始 (全零波形为 0); 幅度低于 threshold 的电极 amplitude/ToT/charge 置 0,
+    ToA/CFD50 置 NaN; 找不到过阈点时 ToA/CFD50 为 NaN, ToT 为 0
+    """
+    signal = np.abs(np.asarray(waveforms, dtype=np.float64))
+    centers = np.asarray(centers, dtype=np.float64)
+    n_bins = signal.shape[-1]
+    bins = np.arange(n_bins)
+
+    peak = np.argmax(signal, axis=-1)
+    amplitude = _take(signal, peak)
+    has_peak = amplitude > 0
+    peak_bin = np.where(has_peak, peak + 1, 0)
+    charge = signal.sum(axis=-1)
+
+    below = signal < threshold
+    start = _last_true(below & (bins <= peak[..., None]) & has_peak[..., None])
+    end = _first_true(below & (bins >= peak[..., None]) & has_peak[..., None])
+    toa = np.where(start >= 0, centers[np.maximum(start, 0)], np.nan)
+    tot = np.where((start >= 0) & (end >= 0), centers[np.maximum(end, 0)] - centers[np.maximum(start, 0)], 0.0)
+
+    # CFD: 峰前最后一个 |v[i-1]| <= target <= |v[i]| 的区间内线性插值
+    target = amplitude * CFD
+    previous = signal[..., :-1]
+    current = signal[..., 1:]
+    crossing = (previous <= target[..., None]) & (target[..., None] <= current)
+    crossing &= bins[1:] <= peak[..., None]
+    j = _last_true(crossing) + 1
+    found = (j > 0) & has_peak
+    previous_value = _take(signal, j - 1)
+    value = _take(signal, j)
+    previous_time = centers[np.maximum(j - 1, 0)]
+    time = centers[np.maximum(j, 0)]
+    step = value - previous_value
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where(step != 0, (target - previous_value) / step, 0.0)
+    cfd = np.where(found, previous_time + fraction * (time - previous_time), np.nan)
+
+    cut = amplitude < threshold
+    return {
+        "amplitude": np.where(cut, 0.0, amplitude),
+        "peak_bin": peak_bin,
+        "ToA": np.where(cut, np.nan, toa),
+        "ToT": np.where(cut, 0.0, tot),
+        "charge": np.where(cut, 0.0, charge),
+        CFD_LABEL: np.where(cut, np.nan, cfd),
+    }
+
+
+def cluster(values, threshold):
+    """
+    相邻电极成团: 超过 threshold 的电极及其值大于 0 的左右邻居
+    返回 (团内求和, 重心电极号, 团大小); 没有成团的事件求和与重心为 NaN, 团大小为 0
+    """
+    values = np.asarray(values, dtype=np.float64)
+    seeds = values > threshold
+    members = seeds.copy()
+    members[:, 1:] |= seeds[:, :-1] & (values[:, 1:] > 0)
+    members[:, :-1] |= seeds[:, 1:] & (values[:, :-1] > 0)
+    valid = (values.max(axis=1) != 0) & seeds.any(axis=1)
+    members &= valid[:, None]
+
+    weights = np.where(members, values, 0.0)
+    total = weights.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        center = (weights * np.arange(values.shape[1])).sum(axis=1) / total
+    return (
+        np.where(valid, total, np.nan),
+        np.where(valid, center, np.nan),
+        members.sum(axis=1),
+    )
+
+
+def conjoined_time(times):
+    """每个事件各电极时间的最小值, 忽略 NaN"""
+    return np.fmin.reduce(np.asarray(times, dtype=np.float64), axis=1)
+
+
+def event_metrics(electrodes, amplitude_threshold, original_x, pitch_x):
+    """
+    由 electrode_metrics 的结果得到 InputWaveform.data 的各事件量, 每个键一个 (n_events,) 数组
+    单电极探测器没有空间分辨, 重心为 0, 团大小为 1
+    """
+    amplitude = electrodes["amplitude"]
+    n_events, n_electrodes = amplitude.shape
+    original_x = np.asarray(original_x, dtype=np.float64)
+    silent = amplitude.max(axis=1) < amplitude_threshold
+    nan = np.full(n_events, np.nan)
+
+    if n_electrodes == 1:
+        data = {
+            "ToA": electrodes["ToA"][:, 0],
+            "ToT": electrodes["ToT"][:, 0],
+            "amplitude": amplitude[:, 0],
+            "charge": electrodes["charge"][:, 0],
+            CFD_LABEL: electrodes[CFD_LABEL][:, 0],
+        }
+        for label in ("ToT", "amplitude", "charge"):
+            data["gravity_center_" + label] = np.zeros(n_events)
+            data["gravity_center_%s_error"%label] = np.zeros(n_events)
+        data["cluster_size_ToT"] = np.ones(n_events, dtype=np.int64)
+        data["cluster_size_amplitude"] = np.ones(n_events, dtype=np.int64)
+        data["cluster_charge"] = np.ones(n_events, dtype=np.int64)
+    else:
+        tot, center_tot, size_tot = cluster(electrodes["ToT"], TOT_CLUSTER_THRESHOLD)
+        amp, center_amp, size_amp = cluster(amplitude, amplitude_threshold)
+        charge, center_charge, size_charge = cluster(electrodes["charge"], 0.0)
+        data = {
+            "ToA": conjoined_time(electrodes["ToA"]),
+            "ToT": tot,
+            "amplitude": amp,
+            "charge": charge,
+            CFD_LABEL: conjoined_time(electrodes[CFD_LABEL]),
+            "gravity_center_ToT": center_tot,
+            "gravity_center_amplitude": center_amp,
+            "gravity_center_charge": center_charge,
+            "cluster_size_ToT": size_tot,
+            "cluster_size_amplitude": size_amp,
+            "cluster_charge": size_charge,
+        }
+        for label in ("ToT", "amplitude", "charge"):
+            data["gravity_center_%s_error"%label] = data["gravity_center_" + label] - original_x / pitch_x
+
+    for key, value in data.items():
+        if value.dtype.kind == "i":
+            data[key] = np.where(silent, 0, value)
+        else:
+            data[key] = np.where(silent, nan, value)
+    data["original_x"] = original_x
+    return data
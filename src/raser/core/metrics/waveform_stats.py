@@ -12,6 +12,7 @@ import json
 from array import array
 from pathlib import Path
 
+import numpy as np
 import ROOT
 
 from raser.core.device import build_device as bdv
@@ -20,11 +21,19 @@ from raser.supports.math import is_number, fit_data_normal, fit_data_landau
 from raser.supports.paths import component_path
 from raser.supports.paths import project_path
 from raser.supports import runs
+from raser.supports import waveform_columns
+from . import batch_metrics
 
-CFD = 0.5 # partition
-CFD_LABEL = "CFD50"
+CFD = batch_metrics.CFD # partition
+CFD_LABEL = batch_metrics.CFD_LABEL
 #TODO: get threshold and CFD from electronics setting
 
+def _none_list(values):
+    """NumPy 结果转为列表, NaN 记为 None (与逐事件接口一致)"""
+    if values.dtype.kind != "f":
+        return values.tolist()
+    return [None if value != value else value for value in values.tolist()]
+
 class InputWaveform:
     """
     ToA : time of arrival
@@ -32,19 +41,14 @@ class InputWaveform:
     amplitude : peak amplitude for charge sensitive preamp
     charge : total charge for current sensitive preamp
     CFD50 : time at 50% constant-fraction discriminator crossing
+
+    One event read from a TH1F waveform tree; the metrics come from batch_metrics
     """
     def __init__(self, input_entry, threshold, amplitude_threshold, read_ele_num, pitch_x, pitch_y, CFD=CFD,):
-        self.waveforms = [None for _ in range(read_ele_num)]
         self.read_ele_num = read_ele_num
         self.pitch_x = pitch_x
         self.pitch_y = pitch_y
         self.CFD = CFD
-        self.peak_time = [0 for i in range(read_ele_num)]
-        self.ToA = [0 for i in range(read_ele_num)]
-        self.ToT = [0 for i in range(read_ele_num)]
-        self.amplitude = [0 for i in range(read_ele_num)] # for charge sensitive pre amp
-        self.charge = [0 for i in range(read_ele_num)] # for current sensitive pre amp
-        self.CFD50 = [0 for i in range(read_ele_num)]
         self.threshold = threshold
         self.amplitude_threshold = amplitude_threshold
 
@@ -52,87 +56,23 @@ class InputWaveform:
         par_out = input_entry.par_out
         self.original_x = (par_in[0]+par_out[0])/2
 
-        for i in range(read_ele_num):
-            # only available for strip detector
-            self.waveforms[i] = eval(f"input_entry.amplified_waveform_{i}")
-            self.amplitude[i], self.peak_time[i] = get_amplitude(self.waveforms[i])
-            if self.amplitude[i] < self.threshold:
-                self.amplitude[i] = 0
-                self.ToA[i] = None
-                self.ToT[i] = 0
-                self.charge[i] = 0
-                self.CFD50[i] = None
-            else:
-                self.ToA[i] = get_ToA(self.waveforms[i], self.threshold, self.peak_time[i])
-                self.ToT[i] = get_ToT(self.waveforms[i], self.threshold, self.peak_time[i])
-                self.charge[i] = get_charge(self.waveforms[i])
-                self.CFD50[i] = get_CFD50(self.waveforms[i], CFD, self.peak_time[i])
-
-        self.get_total_data()
-
-    def get_total_data(self):
-        self.data = {}
-        if max(self.amplitude) < self.amplitude_threshold:
-            self.data["ToA"] = None
-            self.data["ToT"] = None
-            self.data["amplitude"] = None
-            self.data["charge"] = None
-            self.data[CFD_LABEL] = None
-            self.data["gravity_center_ToT"] = None
-            self.data["gravity_center_amplitude"] = None
-            self.data["gravity_center_charge"] = None
-            self.data["cluster_size_ToT"] = 0
-            self.data["cluster_size_amplitude"] = 0
-            self.data["cluster_charge"] = 0
-            self.data["gravity_center_ToT_error"] = None
-            self.data["gravity_center_amplitude_error"] = None
-            self.data["gravity_center_charge_error"] = None
-        elif self.read_ele_num == 1:
-            self.data["ToA"] = self.ToA[0]
-            self.data["ToT"] = self.ToT[0]
-            self.data["amplitude"] = self.amplitude[0]
-            self.data["charge"] = self.charge[0]
-            self.data[CFD_LABEL] = self.CFD50[0]
-            self.data["gravity_center_ToT"] = 0 # No spacial resolution
-            self.data["gravity_center_amplitude"] = 0
-            self.data["gravity_center_charge"] = 0
-            self.data["cluster_size_ToT"] = 1
-            self.data["cluster_size_amplitude"] = 1
-            self.data["cluster_charge"] = 1
-            self.data["gravity_center_ToT_error"] = 0
-            self.data["gravity_center_amplitude_error"] = 0
-            self.data["gravity_center_charge_error"] = 0
-        else:
-            # assume strip, one dimensional spacial resolution
-            self.data["ToA"] = get_conjoined_time(self.ToA) # TODO: conjoint measurement
-            self.data["ToT"] = get_total_amp(self.ToT, 10e-9)
-            self.data["amplitude"] = get_total_amp(self.amplitude, self.amplitude_threshold)
-            self.data["charge"] = get_total_amp(self.charge, 0.0)
-            self.data[CFD_LABEL] = get_conjoined_time(self.CFD50) # TODO: conjoint measurement
-            self.data["gravity_center_ToT"], self.data["cluster_size_ToT"] = ( get_gravity_center_and_cluster_size(self.ToT, 10e-9)
-            )  # TODO: assign a proper value for all DAQ systems
-            ( # TODO: assign a proper value for all DAQ systems
-            self.data["gravity_center_amplitude"], self.data["cluster_size_amplitude"],
-            ) = get_gravity_center_and_cluster_size(self.amplitude, self.amplitude_threshold)
-            self.data["gravity_center_charge"], self.data["cluster_charge"] = ( get_gravity_center_and_cluster_size(self.charge, 0.0)) # TODO: assign a proper value for all DAQ systems
-
-            if self.data["gravity_center_ToT"] != None:
-                self.data["gravity_center_ToT_error"] = ( self.data["gravity_center_ToT"] - self.original_x/self.pitch_x
-                )
-            else:
-                self.data["gravity_center_ToT_error"] = None
-            if self.data["gravity_center_amplitude"] != None:
-                self.data["gravity_center_amplitude_error"] = ( self.data["gravity_center_amplitude"] - self.original_x/self.pitch_x
-                )
-            else:
-                self.data["gravity_center_amplitude_error"] = None
-            if self.data["gravity_center_charge"] != None:
-                self.data["gravity_center_charge_error"] = ( self.data["gravity_center_charge"] - self.original_x/self.pitch_x
-                )
-            else:
-                self.data["gravity_center_charge_error"] = None
+        # only available for strip detector
+        self.waveforms = [getattr(input_entry, f"amplified_waveform_{i}") for i in range(read_ele_num)]
+        block = np.stack([waveform_columns.hist_bin_array(hist) for hist in self.waveforms])[None]
+        electrodes = batch_metrics.electrode_metrics(block, _hist_centers(self.waveforms[0]), threshold, CFD)
+        self.peak_time = electrodes["peak_bin"][0].tolist()
+        self.amplitude = electrodes["amplitude"][0].tolist() # for charge sensitive pre amp
+        self.charge = electrodes["charge"][0].tolist() # for current sensitive pre amp
+        self.ToT = electrodes["ToT"][0].tolist()
+        self.ToA = _none_list(electrodes["ToA"][0])
+        self.CFD50 = _none_list(electrodes[CFD_LABEL][0])
+
+        data = batch_metrics.event_metrics(electrodes, amplitude_threshold, [self.original_x], pitch_x)
+        self.data = {key: _none_list(value)[0] for key, value in data.items()}
 
-        self.data["original_x"] = self.original_x
+def _hist_centers(hist):
+    axis = hist.GetXaxis()
+    return np.array([axis.GetBinCenter(i) for i in range(1, hist.GetNbinsX() + 1)])
 
 def get_ToA(hist, threshold, peak_time_bin):
     for i in range(peak_time_bin, 0, -1):
@@ -300,29 +240,73 @@ class WaveformStatistics:
             file_pointer = ROOT.TFile(str(path), "READ")
             if file_pointer is None or file_pointer.IsZombie():
                 raise OSError("Cannot open waveform ROOT file {}".format(path))
+            if waveform_columns.is_waveform_column_file(file_pointer):
+                n = self.read_columns(file_pointer, vis=vis)
+                print("read {n} events from {file}".format(n=n, file=path.name))
+                file_pointer.Close()
+                continue
             tree = file_pointer.Get("tree")
             if tree is None:
                 file_pointer.Close()
                 raise ValueError("Missing tree TTree in {}".format(path))
-            n = tree.GetEntries()
-            for i in range(n):
-                tree.GetEntry(i) 
-                iw = InputWaveform(
-                    tree,
-                    self.threshold,
-                    self.amplitude_threshold,
-                    self.detector.read_ele_num,
-                    self.pitch_x,
-                    self.pitch_y,
-                )
-                self.fill_data(iw.data)
-                if vis == True:
-                    for j in range(self.detector.read_ele_num):
-                        self.waveforms[j].append(iw.waveforms[j])
-
+            n = self.read_tree(tree, vis=vis)
             print("read {n} events from {file}".format(n=n, file=path.name))
             file_pointer.Close()
 
+    def read_tree(self, tree, vis=False, block_size=4096):
+        """Read a TH1F waveform tree, copying the histograms into NumPy blocks"""
+        n = tree.GetEntries()
+        read_ele_num = self.detector.read_ele_num
+        centers = None
+        for start in range(0, n, block_size):
+            n_block = min(block_size, n - start)
+            par_in = np.empty((n_block, 3))
+            par_out = np.empty((n_block, 3))
+            waveforms = None
+            for row in range(n_block):
+                tree.GetEntry(start + row)
+                hists = [getattr(tree, f"amplified_waveform_{j}") for j in range(read_ele_num)]
+                if waveforms is None:
+                    centers = _hist_centers(hists[0])
+                    waveforms = np.empty((n_block, read_ele_num, len(centers)), dtype=np.float32)
+                par_in[row] = list(tree.par_in)
+                par_out[row] = list(tree.par_out)
+                for j, hist in enumerate(hists):
+                    waveforms[row, j] = waveform_columns.hist_bin_array(hist)
+            self.fill_block(waveforms, centers, par_in, par_out, vis=vis)
+        return n
+
+    def read_columns(self, file_pointer, vis=False, block_size=4096):
+        """Read a columnar waveform file block by block; returns the number of events"""
+        axis = waveform_columns.read_waveform_axis(file_pointer)
+        if axis["read_ele_num"] != self.detector.read_ele_num:
+            raise ValueError(
+                "Waveform file has {} electrodes, detector has {}".format(
+                    axis["read_ele_num"], self.detector.read_ele_num
+                )
+            )
+        centers = waveform_columns.bin_centers(axis)
+        n = 0
+        for block in waveform_columns.read_waveform_blocks(
+            file_pointer,
+            ("par_in", "par_out", "amplified_waveform"),
+            block_size=block_size,
+        ):
+            self.fill_block(block["amplified_waveform"], centers, block["par_in"], block["par_out"], vis=vis)
+            n += len(block["par_in"])
+        return n
+
+    def fill_block(self, waveforms, centers, par_in, par_out, vis=False):
+        """Metrics of a (events, electrodes, bins) block, appended to self.data"""
+        electrodes = batch_metrics.electrode_metrics(waveforms, centers, self.threshold, CFD)
+        original_x = (par_in[:, 0] + par_out[:, 0]) / 2
+        data = batch_metrics.event_metrics(electrodes, self.amplitude_threshold, original_x, self.pitch_x)
+        for key, value in data.items():
+            self.data.setdefault(key, []).extend(_none_list(value))
+        if vis == True:
+            for j in range(self.detector.read_ele_num):
+                self.waveforms[j].extend(np.column_stack((centers, row)) for row in waveforms[:, j])
+
     def draw(self, output_path, tag, vis=False):
         if tag is None:
             raise ValueError("Waveform statistics output tag must be explicit")
@@ -2,11 +2,15 @@
 
 from __future__ import annotations
 
+import multiprocessing
 import os
 import subprocess
 import sys
 from concurrent.futures import ProcessPoolExecutor
 
+# context returned by the worker's prepare function, one per persistent worker process
+_worker_context = None
+
 
 def command_tail(argv, command_prefix, remove_options):
     tail = list(argv)
@@ -42,7 +46,36 @@ def _run_local_job(args):
     )
 
 
-def run_indexed_jobs(command_prefix, tail, count, *, use_cluster, mem, destination):
+def _init_persistent_worker(prepare, kwargs):
+    global _worker_context
+    _worker_context = prepare(kwargs)
+
+
+def _run_persistent_job(args):
+    run, index = args
+    print("job %s in worker %s" % (index, os.getpid()), flush=True)
+    run(_worker_context, index)
+
+
+def run_persistent_jobs(prepare, run, kwargs, count, max_processes=None):
+    """Run job indices 0..count-1 in long-lived local worker processes.
+
+    Each worker calls ``prepare(kwargs)`` once when it starts, then
+    ``run(context, index)`` for every index it pulls from the pool queue,
+    so the startup cost is paid once per worker instead of once per job.
+    """
+    max_processes = min(count, max_processes or os.cpu_count() or 4)
+    task_args = [(run, index) for index in range(count)]
+    with ProcessPoolExecutor(
+        max_workers=max_processes,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_persistent_worker,
+        initargs=(prepare, kwargs),
+    ) as executor:
+        list(executor.map(_run_persistent_job, task_args))
+
+
+def run_indexed_jobs(command_prefix, tail, count, *, use_cluster, mem, destination, worker=None):
     if use_cluster:
         from raser.supports import batchjob
 
@@ -53,6 +86,11 @@ def run_indexed_jobs(command_prefix, tail, count, *, use_cluster, mem, destinati
             batchjob.main(destination, command, mem, is_test=False)
         return
 
+    if worker is not None:
+        prepare, run, kwargs = worker
+        run_persistent_jobs(prepare, run, kwargs, count)
+        return
+
     max_processes = min(count, os.cpu_count() or 4)
     task_args = [(index, command_prefix, tail) for index in range(count)]
     with ProcessPoolExecutor(max_workers=max_processes) as executor:
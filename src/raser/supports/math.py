@@ -14,7 +14,6 @@ from typing import Callable
 
 import numpy as np
 from scipy.interpolate import interp1d as p1d
-from scipy.interpolate import interp2d as p2d
 from scipy.interpolate import interpn as pn
 from scipy.interpolate import griddata, RegularGridInterpolator
 import ROOT
@@ -27,6 +26,10 @@ x_bin_3d = 50
 y_bin_3d = 50
 z_bin_3d = 50
 
+def get_common_interpolate_key():
+    """get_common_interpolate_* 的重采样设置, 作为已编译场网格的缓存键"""
+    return {'bins_2d': [x_bin_2d, y_bin_2d], 'bins_3d': [x_bin_3d, y_bin_3d, z_bin_3d]}
+
 class Vector:
     def __init__(self,a1,a2,a3):
         self.components = [a1,a2,a3]
@@ -68,9 +71,17 @@ def get_common_interpolate_1d(data):
     values = data['values']
     points = data['points']
     interpolator = p1d(points, values)
+    # out-of-range points give NaN instead of failing the whole batch
+    interpolator_many = p1d(points, values, bounds_error=False, fill_value=np.nan)
 
     def f(x):
         return interpolator(x)
+
+    def many(x):
+        return np.asarray(interpolator_many(np.asarray(x, dtype=np.float64)), dtype=np.float64)
+    f.many = many
+    grid_points, grid_index = np.unique(np.asarray(points, dtype=np.float64), return_index=True)
+    f.grid = ((grid_points,), np.asarray(values, dtype=np.float64)[grid_index])
     return f
 
 def get_common_interpolate_2d(data):
@@ -84,10 +95,43 @@ def get_common_interpolate_2d(data):
     new_y = np.linspace(min(points_y), max(points_y), y_bin_2d)
     new_points = np.array(np.meshgrid(new_x, new_y)).T.reshape(-1, 2)
     new_values = griddata((points_x, points_y), values, new_points, method='linear')
-    interpolator = p2d(new_x, new_y, new_values)
+    return _get_grid_interpolate_2d((new_x, new_y), new_values.reshape(len(new_x), len(new_y)))
+
+def _get_grid_interpolate_1d(axes, values):
+    """Regular-grid version of get_common_interpolate_1d; values (e.g. a memory map) are not copied"""
+    new_x, = axes
+    interpolator = RegularGridInterpolator((new_x,), values, method='linear')
+    # out-of-range points give NaN instead of failing the whole batch
+    interpolator_many = RegularGridInterpolator((new_x,), values, method='linear', bounds_error=False, fill_value=np.nan)
+
+    def f(x):
+        x = np.asarray(x, dtype=np.float64)
+        return interpolator(x.reshape(-1, 1)).reshape(x.shape)
+
+    def many(x):
+        x = np.asarray(x, dtype=np.float64)
+        return interpolator_many(x.reshape(-1, 1)).reshape(x.shape)
+    f.many = many
+    f.grid = ((new_x,), interpolator.values)
+    return f
+
+def _get_grid_interpolate_2d(axes, values):
+    new_x, new_y = axes
+    # RegularGridInterpolator keeps a view of values, so a memory-mapped grid is not copied
+    grid_interpolator = RegularGridInterpolator(
+        (new_x, new_y), values, method='linear',
+    )
+
+    def many(x, y):
+        # extrapolate with the nearest grid value (as interp2d did): clip before the grid lookup
+        x_c = np.clip(np.asarray(x, dtype=np.float64), new_x[0], new_x[-1])
+        y_c = np.clip(np.asarray(y, dtype=np.float64), new_y[0], new_y[-1])
+        return grid_interpolator(np.column_stack((x_c.ravel(), y_c.ravel())))
 
     def f(x, y):
-        return interpolator(x, y)[0]
+        return many(x, y)[0]
+    f.many = many
+    f.grid = ((new_x, new_y), grid_interpolator.values)
     return f
 
 
@@ -108,8 +152,15 @@ def get_common_interpolate_3d(data):
         (points_x, points_y, points_z), values, (grid_x, grid_y, grid_z),
         method='linear', fill_value=0.0,
     )
+    return _get_grid_interpolate_3d((new_x, new_y, new_z), new_values.transpose(1, 0, 2))
+
+def _get_grid_interpolate_3d(axes, values):
+    new_x, new_y, new_z = axes
+    x_min, x_max = new_x[0], new_x[-1]
+    y_min, y_max = new_y[0], new_y[-1]
+    z_min, z_max = new_z[0], new_z[-1]
     interpolator = RegularGridInterpolator(
-        (new_x, new_y, new_z), new_values.transpose(1, 0, 2),
+        (new_x, new_y, new_z), values,
         method='linear', bounds_error=False, fill_value=0.0,
     )
     
@@ -118,9 +169,111 @@ def get_common_interpolate_3d(data):
         y_c = np.clip(y, y_min, y_max)
         z_c = np.clip(z, z_min, z_max)
         return interpolator([[x_c, y_c, z_c]])[0]
+
+    def many(x, y, z):
+        x_c = np.clip(np.asarray(x, dtype=np.float64), x_min, x_max)
+        y_c = np.clip(np.asarray(y, dtype=np.float64), y_min, y_max)
+        z_c = np.clip(np.asarray(z, dtype=np.float64), z_min, z_max)
+        return interpolator(np.column_stack((x_c.ravel(), y_c.ravel(), z_c.ravel())))
+    f.many = many
+    f.grid = ((new_x, new_y, new_z), interpolator.values)
     return f
 
-def signal_convolution(signal_original: ROOT.TH1F, signal_convolved: ROOT.TH1F, pulse_responce_function_list: list[Callable[[float],float]],):
+def get_grid_interpolate(axes, values):
+    """
+    Rebuild a get_common_interpolate_* function from its stored .grid (axes, values),
+    skipping the griddata resampling; values may be a read-only memory map.
+    """
+    if len(axes) == 1:
+        return _get_grid_interpolate_1d(axes, values)
+    elif len(axes) == 2:
+        return _get_grid_interpolate_2d(axes, values)
+    elif len(axes) == 3:
+        return _get_grid_interpolate_3d(axes, values)
+    raise ValueError("Unsupported grid dimension: {}".format(len(axes)))
+
+def get_common_gradient(function):
+    """
+    Differentiate a get_common_interpolate_* result once on its own grid with np.gradient.
+    Returns one function per grid axis, called like the input function and with .many;
+    points outside the grid take the value at the nearest grid edge.
+    """
+    axes, values = function.grid
+    gradients = np.gradient(values, *axes)
+    if len(axes) == 1:
+        gradients = [gradients]
+    return [_get_grid_function(axes, gradient) for gradient in gradients]
+
+def _get_grid_function(axes, values):
+    interpolator = RegularGridInterpolator(axes, values, method='linear')
+
+    def many(*coordinate):
+        clipped = [np.clip(np.asarray(c, dtype=np.float64).ravel(), axis[0], axis[-1]) for c, axis in zip(coordinate, axes)]
+        return interpolator(np.column_stack(clipped))
+
+    def f(*coordinate):
+        return many(*coordinate)[0]
+    f.many = many
+    f.grid = (axes, values)
+    return f
+
+# 小于这个长度时直接卷积比 FFT 快
+DIRECT_CONVOLUTION_BINS = 256
+# 响应核缓存: key -> [(kernel, {nfft: kernel spectrum})]; 同一放大器和分bin会被成百万波形复用
+_KERNEL_CACHE = {}
+_KERNEL_CACHE_SIZE = 64
+
+def sample_response(response: Callable, times: np.ndarray) -> np.ndarray:
+    """Evaluate a response function on a time array; scalar-only functions are evaluated point by point"""
+    try:
+        values = np.asarray(response(times), dtype=np.float64)
+    except (TypeError, ValueError):
+        values = None
+    if values is None or values.shape != times.shape:
+        values = np.array([response(time) for time in times], dtype=np.float64)
+    return values
+
+def cached_kernels(cache_key, times: np.ndarray, pulse_responce_function_list: list[Callable]):
+    """
+    Response kernels sampled on times, one (kernel, spectra) pair per response function;
+    spectra collects the kernel FFTs by length. With a cache_key (hashable, must identify
+    the responses) the pairs are kept for later calls
+    """
+    if cache_key is None:
+        return [(sample_response(pr, times), {}) for pr in pulse_responce_function_list]
+    key = (cache_key, len(times), float(times[0]), float(times[-1]))
+    kernels = _KERNEL_CACHE.get(key)
+    if kernels is None:
+        if len(_KERNEL_CACHE) >= _KERNEL_CACHE_SIZE:
+            _KERNEL_CACHE.clear()
+        kernels = [(sample_response(pr, times), {}) for pr in pulse_responce_function_list]
+        _KERNEL_CACHE[key] = kernels
+    return kernels
+
+def fft_convolve(values: np.ndarray, kernel: np.ndarray, spectra: dict | None = None) -> np.ndarray:
+    """
+    Full linear convolution along the last axis (same as np.convolve(mode="full") per row).
+    Above DIRECT_CONVOLUTION_BINS one real FFT covers the whole window;
+    the kernel spectrum is stored in spectra by FFT length
+    """
+    from scipy import fft
+
+    values = np.asarray(values, dtype=np.float64)
+    n_full = values.shape[-1] + len(kernel) - 1
+    if max(values.shape[-1], len(kernel)) <= DIRECT_CONVOLUTION_BINS:
+        if values.ndim == 1:
+            return np.convolve(values, kernel, mode="full")
+        return np.stack([np.convolve(row, kernel, mode="full") for row in values])
+    nfft = fft.next_fast_len(n_full, real=True)
+    if spectra is None:
+        spectra = {}
+    kernel_spectrum = spectra.get(nfft)
+    if kernel_spectrum is None:
+        kernel_spectrum = fft.rfft(kernel, nfft)
+        spectra[nfft] = kernel_spectrum
+    return fft.irfft(fft.rfft(values, nfft, axis=-1) * kernel_spectrum, nfft, axis=-1)[..., :n_full]
+
+def signal_convolution(signal_original: ROOT.TH1F, signal_convolved: ROOT.TH1F, pulse_responce_function_list: list[Callable[[float],float]], cache_key=None,):
     so = signal_original
     sc = signal_convolved
     n_bin = so.GetNbinsX()
@@ -133,26 +286,14 @@ def signal_convolution(signal_original: ROOT.TH1F, signal_convolved: ROOT.TH1F,
     if t_bin <= 0:
         raise ValueError(f"Histogram bin width must be positive, got {t_bin}")
 
-    axis = so.GetXaxis()
-    centers = np.array(
-        [axis.GetBinCenter(bin_idx) for bin_idx in range(1, n_bin + 1)],
-        dtype=np.float64,
-    )
     source = np.array(
         [so.GetBinContent(bin_idx) for bin_idx in range(1, n_bin + 1)],
         dtype=np.float64,
     )
-    for pr in pulse_responce_function_list:
-        target = np.zeros(n_bin, dtype=np.float64)
-        for source_bin, source_value in enumerate(source):
-            if source_value == 0.0:
-                continue
-            response = np.array(
-                [pr(time - centers[source_bin]) for time in centers],
-                dtype=np.float64,
-            )
-            target += source_value * response * t_bin
-        source = target
+    # 响应不一定因果: 核覆盖 -(n-1)..(n-1) 个 bin 的时间差
+    lags = (np.arange(2 * n_bin - 1, dtype=np.float64) - (n_bin - 1)) * t_bin
+    for kernel, spectra in cached_kernels(cache_key, lags, pulse_responce_function_list):
+        source = fft_convolve(source, kernel, spectra)[n_bin - 1:2 * n_bin - 1] * t_bin
 
     sc.Reset()
     for bin_idx, value in enumerate(source, start=1):
@@ -182,6 +323,30 @@ def calculate_gradient(function: Callable, component: list, coordinate: list):
     
     return gradient
 
+def calculate_gradient_many(function: Callable, coordinate: list):
+    """
+    Batched calculate_gradient: coordinate is a list of equal-length arrays, one per component.
+    function must return NaN instead of raising for out-of-bound points; those points are
+    retried with one-sided differences and stay NaN if no difference step fits.
+    """
+    diff_res = 1e-5 # difference resolution in cm
+    diff_steps = [(diff_res / 2, diff_res / 2), (diff_res, 0), (0, diff_res)]
+    coordinate = [np.asarray(c, dtype=np.float64) for c in coordinate]
+
+    gradient = []
+    for i in range(len(coordinate)):
+        component = np.full(coordinate[i].shape, np.nan)
+        for diff1, diff2 in diff_steps:
+            missing = np.isnan(component)
+            if not missing.any():
+                break
+            args_plus = [c[missing] + diff1 if i == j else c[missing] for j, c in enumerate(coordinate)]
+            args_minus = [c[missing] - diff2 if i == j else c[missing] for j, c in enumerate(coordinate)]
+            component[missing] = (np.asarray(function(*args_plus)) - np.asarray(function(*args_minus))) / diff_res
+        gradient.append(component)
+
+    return gradient
+
 def inversed_fast_fourier_transform():
     pass
 
@@ -0,0 +1,199 @@
+'''
+Description:  Columnar waveform files: fixed-length float32 arrays per event and electrode
+@Date       : 2026/10/18
+@version    : 1.0
+'''
+
+import numpy as np
+import ROOT
+
+WAVEFORM_TREE = "waveforms"
+RUN_TREE = "run"
+WAVEFORM_STAGES = ("current", "cross_talked_current", "amplified_waveform")
+# ZSTD, level 5
+DEFAULT_COMPRESSION = 100 * int(ROOT.RCompressionSetting.EAlgorithm.kZSTD) + 5
+DEFAULT_ROW_GROUP = 1000
+
+_SCALAR_LEAVES = {
+    "event": ("event/I", np.int32, ()),
+    "e_dep": ("e_dep/D", np.float64, ()),
+    "par_in": ("par_in[3]/D", np.float64, (3,)),
+    "par_out": ("par_out[3]/D", np.float64, (3,)),
+}
+
+
+def hist_bin_array(hist, dtype=np.float32):
+    """TH1F/TH1D 的 1..n 号 bin 内容 (不含上下溢出), 直接读内部数组"""
+    n_bins = hist.GetNbinsX()
+    view = hist.GetArray()
+    view.reshape((n_bins + 2,))
+    source_dtype = np.float64 if hist.InheritsFrom("TH1D") else np.float32
+    return np.frombuffer(view, dtype=source_dtype, count=n_bins + 2)[1:n_bins + 1].astype(dtype)
+
+
+def _same_axis(hist, n_bins, t_start, t_end):
+    axis = hist.GetXaxis()
+    return hist.GetNbinsX() == n_bins and axis.GetXmin() == t_start and axis.GetXmax() == t_end
+
+
+class WaveformColumnSink:
+    """
+    Description:
+        Write one entry per event into a flat TTree: event, e_dep, par_in[3],
+        par_out[3] and one `stage[read_ele_num][n_bins]/F` branch per waveform
+        stage. Baskets are flushed every row_group_size events with the file
+        compression; the time axis and run constants go into a one-entry run tree
+    """
+    def __init__(
+        self,
+        file_path,
+        read_ele_num,
+        n_bins,
+        t_start,
+        t_end,
+        run_info=None,
+        stages=WAVEFORM_STAGES,
+        row_group_size=DEFAULT_ROW_GROUP,
+        compression=DEFAULT_COMPRESSION,
+    ):
+        self.file_path = str(file_path)
+        self.read_ele_num = int(read_ele_num)
+        self.n_bins = int(n_bins)
+        self.t_start = float(t_start)
+        self.t_end = float(t_end)
+        self.stages = tuple(stages)
+        self.entries = 0
+
+        # 新建的 TTree 挂在当前目录上; 建完切回 gROOT, 避免事件循环里的直方图被写进文件或随文件关闭而删除
+        self.file = ROOT.TFile(self.file_path, "RECREATE", "", int(compression))
+        if self.file is None or self.file.IsZombie():
+            raise OSError("Cannot create waveform file {}".format(self.file_path))
+        self.file.cd()
+        self.tree = ROOT.TTree(WAVEFORM_TREE, "Columnar waveform data")
+        self.tree.SetAutoFlush(int(row_group_size))
+        self.scalars = {}
+        for name, (leaf, dtype, shape) in _SCALAR_LEAVES.items():
+            self.scalars[name] = np.zeros(shape or (1,), dtype=dtype)
+            self.tree.Branch(name, self.scalars[name], leaf)
+        self.buffers = {}
+        for stage in self.stages:
+            self.buffers[stage] = np.zeros((self.read_ele_num, self.n_bins), dtype=np.float32)
+            self.tree.Branch(
+                stage,
+                self.buffers[stage],
+                "%s[%d][%d]/F"%(stage, self.read_ele_num, self.n_bins),
+            )
+        self.run_tree = self._run_tree(run_info or {})
+        ROOT.gROOT.cd()
+
+    def _run_tree(self, run_info):
+        run_tree = ROOT.TTree(RUN_TREE, "Waveform axis and run constants")
+        values = {
+            "read_ele_num": np.array([self.read_ele_num], dtype=np.int32),
+            "n_bins": np.array([self.n_bins], dtype=np.int32),
+            "t_start": np.array([self.t_start]),
+            "t_end": np.array([self.t_end]),
+        }
+        strings = {}
+        for name, value in run_info.items():
+            if isinstance(value, str) or value is None:
+                strings[name] = ROOT.std.string(str(value))
+            else:
+                values[name] = np.array([float(value)])
+        for name, value in values.items():
+            run_tree.Branch(name, value, "%s/%s"%(name, "I" if value.dtype == np.int32 else "D"))
+        for name, value in strings.items():
+            run_tree.Branch(name, value)
+        run_tree.Fill()
+        self._run_values = (values, strings)
+        return run_tree
+
+    def fill(self, event, e_dep, par_in, par_out, waveforms):
+        """waveforms: {stage: [TH1 或一维数组, 每个读出电极一个]}"""
+        self.scalars["event"][0] = event
+        self.scalars["e_dep"][0] = e_dep
+        self.scalars["par_in"][:] = par_in
+        self.scalars["par_out"][:] = par_out
+        for stage in self.stages:
+            buffer = self.buffers[stage]
+            for i, waveform in enumerate(waveforms[stage]):
+                if isinstance(waveform, np.ndarray):
+                    buffer[i] = waveform
+                    continue
+                if not _same_axis(waveform, self.n_bins, self.t_start, self.t_end):
+                    raise ValueError(
+                        f"Cannot store histogram {waveform.GetName()} as {stage}_{i}: binning differs"
+                    )
+                buffer[i] = hist_bin_array(waveform)
+        self.tree.Fill()
+        self.entries += 1
+
+    def close(self):
+        self.file.cd()
+        self.tree.Write()
+        self.run_tree.Write()
+        self.file.Close()
+        ROOT.gROOT.cd()
+
+
+def is_waveform_column_file(file_pointer):
+    return bool(file_pointer.GetListOfKeys().FindObject(WAVEFORM_TREE))
+
+
+def read_waveform_axis(file_pointer):
+    """读 run 树: read_ele_num, n_bins, t_start, t_end 以及写入时的运行常数"""
+    run_tree = file_pointer.Get(RUN_TREE)
+    if not run_tree:
+        raise ValueError("Missing {} TTree in {}".format(RUN_TREE, file_pointer.GetName()))
+    run_tree.GetEntry(0)
+    info = {}
+    for branch in run_tree.GetListOfBranches():
+        name = branch.GetName()
+        value = getattr(run_tree, name)
+        info[name] = str(value) if not isinstance(value, (int, float)) else value
+    info["read_ele_num"] = int(info["read_ele_num"])
+    info["n_bins"] = int(info["n_bins"])
+    return info
+
+
+def bin_centers(axis):
+    t_bin = (axis["t_end"] - axis["t_start"]) / axis["n_bins"]
+    return axis["t_start"] + (np.arange(axis["n_bins"]) + 0.5) * t_bin
+
+
+def read_waveform_blocks(file_pointer, columns=("amplified_waveform",), block_size=4096):
+    """
+    按块读列式波形文件, 每块是一个 dict:
+    标量列 (event, e_dep, par_in, par_out) 形状 (n,) 或 (n, 3),
+    波形列形状 (n, read_ele_num, n_bins), float32
+    只打开需要的分支
+    """
+    axis = read_waveform_axis(file_pointer)
+    tree = file_pointer.Get(WAVEFORM_TREE)
+    if not tree:
+        raise ValueError("Missing {} TTree in {}".format(WAVEFORM_TREE, file_pointer.GetName()))
+    columns = tuple(columns)
+    tree.SetBranchStatus("*", 0)
+    buffers = {}
+    for name in columns:
+        if name in _SCALAR_LEAVES:
+            _, dtype, shape = _SCALAR_LEAVES[name]
+            buffers[name] = np.zeros(shape or (1,), dtype=dtype)
+        else:
+            buffers[name] = np.zeros((axis["read_ele_num"], axis["n_bins"]), dtype=np.float32)
+        tree.SetBranchStatus(name, 1)
+        tree.SetBranchAddress(name, buffers[name])
+
+    n_entries = tree.GetEntries()
+    for start in range(0, n_entries, block_size):
+        n = min(block_size, n_entries - start)
+        block = {}
+        for name, buffer in buffers.items():
+            shape = () if name in _SCALAR_LEAVES and not _SCALAR_LEAVES[name][2] else buffer.shape
+            block[name] = np.empty((n,) + shape, dtype=buffer.dtype)
+        for row in range(n):
+            tree.GetEntry(start + row)
+            for name, buffer in buffers.items():
+                block[name][row] = buffer if block[name].ndim > 1 else buffer[0]
+        yield block
+    tree.ResetBranchAddresses()
@@ -41,3 +41,132 @@ def test_set_tmp_cir_rewrites_pwl_raw_and_noise_lines(tmp_path):
     assert "* skipped: setplot noise1" in lines
     assert "* skipped: onoise_spectrum" in lines
     assert "R1 2 0 50" in lines
+
+
+def write_batch_circuit(path):
+    path.write_text(
+        "\n".join(
+            [
+                "test circuit",
+                ".subckt AMP 1 2",
+                "R1 1 2 10",
+                ".ends AMP",
+                "I1 2 0 pulse(0 -10u 0 0.1n 1n 0.00000001n 20n 0)",
+                "* input current source",
+                "C6 2 0 20p",
+                "x1 2 out AMP",
+                "R4 out 0 50",
+                ".model gain_block gain(",
+                "+ gain=-100)",
+                ".control",
+                "noise v(out) I1 dec 10 1 1e6",
+                "setplot noise1",
+                "wrdata noise.raw onoise_spectrum",
+                "tran 0.1p 20n",
+                "wrdata output/fig/amp.raw v(out)",
+                ".endc",
+                ".end",
+            ]
+        )
+        + "\n",
+        encoding="utf-8",
+    )
+
+
+def write_binary_raw(path, names, data):
+    import numpy as np
+
+    header = [
+        "Title: test circuit",
+        "Plotname: Transient Analysis",
+        "Flags: real",
+        f"No. Variables: {len(names)}",
+        f"No. Points: {len(data)}",
+        "Variables:",
+    ]
+    header += [f"\t{i}\t{name}\tvoltage" for i, name in enumerate(names)]
+    header.append("Binary:")
+    path.write_bytes(("\n".join(header) + "\n").encode("ascii") + np.asarray(data, dtype="<f8").tobytes())
+
+
+def test_batch_netlist_puts_one_channel_per_input(tmp_path):
+    from raser.core.analog.ngspice import BatchNetlist
+
+    circuit = tmp_path / "amp.cir"
+    write_batch_circuit(circuit)
+
+    netlist = BatchNetlist(str(circuit))
+    netlist.write(str(tmp_path / "batch.cir"), "out.raw", ["0,0,1e-9,1e-6", "0,0,2e-9,2e-6"])
+
+    lines = (tmp_path / "batch.cir").read_text(encoding="utf-8").splitlines()
+    assert lines[0] == "test circuit"
+    assert lines[1:7] == [".subckt AMP 1 2", "R1 1 2 10", ".ends AMP", ".model gain_block gain(", "+ gain=-100)", ".subckt raser_channel 2"]
+    assert lines[7:11] == ["C6 2 0 20p", "x1 2 out AMP", "R4 out 0 50", ".ends raser_channel"]
+    assert "Ich0 ch0_2 0 PWL(0,0,1e-9,1e-6)" in lines
+    assert "Xch1 ch1_2 raser_channel" in lines
+    control = lines[lines.index(".control") + 1:lines.index(".endc")]
+    assert control == ["tran 0.1p 20n", "set filetype=binary", "write out.raw v(xch0.out) v(xch1.out)"]
+    assert lines[-1] == ".end"
+
+
+def test_batch_netlist_rejects_circuit_without_voltage_probe(tmp_path):
+    from raser.core.analog.ngspice import BatchNetlist
+
+    circuit = tmp_path / "amp.cir"
+    circuit.write_text("title\nI1 2 0 pulse(0 1 0)\nR1 2 0 50\n.control\ntran 1p 1n\nwrdata a.raw i(V1)\n.endc\n.end\n")
+
+    with pytest.raises(ValueError, match="wrdata"):
+        BatchNetlist(str(circuit))
+
+
+def test_read_spice_raw_reads_binary_and_ascii(tmp_path):
+    import numpy as np
+
+    from raser.core.analog.ngspice import read_spice_raw
+
+    data = np.array([[0.0, 1.0, -1.0], [1e-12, 2.0, -2.0], [3e-12, 4.0, -4.0]])
+    write_binary_raw(tmp_path / "binary.raw", ["time", "v(xch0.out)", "v(xch1.out)"], data)
+    ascii_lines = ["Title: t", "Flags: real", "No. Variables: 3", "No. Points: 3", "Variables:",
+                   "\t0\ttime\ttime", "\t1\tv(a)\tvoltage", "\t2\tv(b)\tvoltage", "Values:"]
+    for i, row in enumerate(data):
+        ascii_lines += [f" {i}\t{float(row[0])!r}"] + [f"\t{float(value)!r}" for value in row[1:]]
+    (tmp_path / "ascii.raw").write_text("\n".join(ascii_lines) + "\n")
+
+    names, binary = read_spice_raw(str(tmp_path / "binary.raw"))
+    _, ascii_data = read_spice_raw(str(tmp_path / "ascii.raw"))
+
+    assert names == ["time", "v(xch0.out)", "v(xch1.out)"]
+    np.testing.assert_array_equal(binary, data)
+    np.testing.assert_array_equal(ascii_data, data)
+
+
+def test_run_ngspice_batch_splits_inputs_into_parallel_runs(monkeypatch, tmp_path):
+    import subprocess
+
+    import numpy as np
+
+    from raser.core.analog import ngspice
+
+    circuit = tmp_path / "amp.cir"
+    write_batch_circuit(circuit)
+    commands = []
+
+    def fake_ngspice(command, **kwargs):
+        commands.append(command)
+        lines = open(command[2]).read().splitlines()
+        write_line = next(line for line in lines if line.startswith("write "))
+        _, raw, *probes = write_line.split()
+        channels = [int(probe.split(".")[0][len("v(xch"):]) for probe in probes]
+        data = np.column_stack([[0.0, 1e-12]] + [[channel, -channel] for channel in channels])
+        write_binary_raw(tmp_path / raw, ["time"] + probes, data)
+
+    monkeypatch.setattr(subprocess, "run", fake_ngspice)
+
+    times, volts = ngspice.run_ngspice_batch(
+        ngspice.BatchNetlist(str(circuit)), ["0,0,1e-9,1e-6"] * 5, str(tmp_path), "case", channels_per_run=2,
+    )
+
+    assert sorted(command[2] for command in commands) == [str(tmp_path / f"case_run{m}_tmp.cir") for m in range(3)]
+    assert len(times) == 5
+    assert [list(volt) for volt in volts] == [[0, 0], [1, -1], [0, 0], [1, -1], [0, 0]]
+    assert not list(tmp_path.glob("case_*"))
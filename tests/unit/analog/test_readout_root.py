@@ -1,3 +1,5 @@
+import importlib
+
 import numpy as np
 import pytest
 
@@ -90,3 +92,255 @@ def test_amplifier_requires_detector_capacitance():
 
     with pytest.raises(ValueError, match="Detector capacitance"):
         Amplifier([source], "Broad_Band_UCSC")
+
+
+def test_fft_convolution_matches_direct_convolution_for_long_windows():
+    from raser.core.analog.readout import _convolve_samples
+
+    rng = np.random.default_rng(3)
+    values = rng.normal(size=(3, 1200))
+
+    def pulse_response(time):
+        return np.where(time < 0, 0.0, np.exp(-np.maximum(time, 0) / 40.0))
+
+    convolved = _convolve_samples(values, 1.0, [pulse_response])
+
+    kernel = np.exp(-np.arange(1200) / 40.0)
+    expected = [np.convolve(row, kernel)[:1200] for row in values]
+    np.testing.assert_allclose(convolved, expected, rtol=1e-9, atol=1e-9)
+
+
+def test_amplifier_kernels_are_cached_per_amplifier_and_capacitance():
+    import ROOT
+
+    from raser.core.analog.readout import Amplifier
+    from raser.supports.math import cached_kernels
+
+    source = ROOT.TH1F("source_for_cached_kernels", "", 300, 0.0, 3e-9)
+    source.SetDirectory(0)
+    source.SetBinContent(20, 1e-6)
+    amplifier = Amplifier([source], "Broad_Band_UCSC", CDet=3.0)
+    times = np.arange(300) * source.GetBinWidth(1)
+
+    kernels = cached_kernels(amplifier.kernel_key, times, amplifier.pulse_responce_list)
+
+    assert kernels is cached_kernels(amplifier.kernel_key, times, amplifier.pulse_responce_list)
+    assert kernels[0][1]
+    response = amplifier.pulse_responce_list[0]
+    assert kernels[0][0] == pytest.approx([float(response(float(time))) for time in times])
+    assert Amplifier([source], "Broad_Band_UCSC", CDet=4.0).kernel_key != amplifier.kernel_key
+
+
+def test_root_signal_convolution_handles_non_causal_response():
+    import ROOT
+
+    from raser.supports.math import signal_convolution
+
+    n_bins = 400
+    source = ROOT.TH1F("source_for_non_causal_convolution", "", n_bins, 0.0, 4.0)
+    target = ROOT.TH1F("target_for_non_causal_convolution", "", n_bins, 0.0, 4.0)
+    for bin_idx in (100, 101, 250):
+        source.SetBinContent(bin_idx, 1.0)
+
+    def pulse_response(time):
+        return np.exp(-0.5 * (time / 0.05) ** 2)
+
+    signal_convolution(source, target, [pulse_response], cache_key=("gaussian", 0.05))
+
+    centers = np.array([source.GetBinCenter(i) for i in range(1, n_bins + 1)])
+    expected = sum(pulse_response(centers - centers[i - 1]) * 0.01 for i in (100, 101, 250))
+    result = [target.GetBinContent(i) for i in range(1, n_bins + 1)]
+    assert result == pytest.approx(expected, rel=1e-5, abs=1e-7)
+
+
+def make_amplifier(n_electrodes=3, n_bins=2000):
+    import ROOT
+
+    from raser.core.analog.readout import Amplifier
+
+    currents = []
+    for i in range(n_electrodes):
+        current = ROOT.TH1F(f"source_for_noise_{n_electrodes}_{n_bins}_{i}", "", n_bins, 0.0, n_bins * 1e-11)
+        current.SetDirectory(0)
+        current.SetBinContent(50 + i, 1e-6 * (i + 1))
+        currents.append(current)
+    return Amplifier(currents, "Broad_Band_UCSC", seed=7, CDet=3.0)
+
+
+def test_amplifier_noise_is_reproducible_and_has_configured_moments():
+    amplifier = make_amplifier()
+    amplifier.amplifier_parameters.update(noise_avg=0.5, noise_rms=2.0)
+
+    noise = amplifier.noise(11)
+
+    np.testing.assert_array_equal(noise, amplifier.noise(11))
+    assert noise.shape == (3, 2000)
+    assert noise.mean() == pytest.approx(0.5, abs=0.1)
+    assert noise.std() == pytest.approx(2.0, rel=0.05)
+
+
+def test_amplifier_noise_supports_common_mode_and_spectral_shape():
+    amplifier = make_amplifier()
+    amplifier.amplifier_parameters.update(
+        noise_avg=0.0,
+        noise_rms=1.5,
+        noise_correlation=0.6,
+        noise_psd=[[0.0, 1.0], [5e9, 1.0], [6e9, 0.0], [1e12, 0.0]],
+    )
+
+    noise = amplifier.noise(3)
+
+    assert noise.std() == pytest.approx(1.5, rel=0.1)
+    assert np.corrcoef(noise)[0, 1] == pytest.approx(0.6, abs=0.1)
+    lag_correlation = np.corrcoef(noise[0, :-1], noise[0, 1:])[0, 1]
+    assert lag_correlation > 0.8
+
+
+def test_amplifier_threshold_clears_electrodes_before_first_hit():
+    amplifier = make_amplifier()
+    amplifier.amplifier_parameters["threshold"] = 5.0
+    amplifier.amplified_waveforms[:] = 0.0
+    amplifier.amplified_waveforms[0, 10] = 1.0
+    amplifier.amplified_waveforms[1, 10] = -1e6
+    amplifier.amplified_waveforms[2, 10] = 2.0
+
+    amplifier.judge_threshold_CFD()
+
+    assert not amplifier.amplified_waveforms[0].any()
+    assert amplifier.amplified_waveforms[1, 10] == -1e6
+    assert amplifier.amplified_waveforms[2, 10] == 2.0
+
+
+def test_amplifier_histograms_are_built_from_waveforms_on_request():
+    amplifier = make_amplifier(n_electrodes=2, n_bins=100)
+
+    assert amplifier._amplified_currents is None
+    hists = amplifier.amplified_currents
+
+    assert hists is amplifier.amplified_currents
+    assert hists[1].GetNbinsX() == 100
+    assert hists[1].GetXaxis().GetXmax() == pytest.approx(1e-9)
+    contents = [hists[1].GetBinContent(i) for i in range(1, 101)]
+    assert contents == pytest.approx(amplifier.amplified_waveforms[1], rel=1e-6, abs=1e-6)
+
+
+def test_raw_binning_matches_histogram_filling():
+    import ROOT
+
+    from raser.core.analog.readout import _raw_bins
+
+    rng = np.random.default_rng(4)
+    time = np.concatenate([[0.0], np.sort(rng.uniform(0, 20e-9, 3000)), [20e-9]])
+    time[100:110] = time[100]
+    volt = rng.normal(0, 5, len(time))
+    n_bins = 10000
+
+    hist = ROOT.TH1F("raw_binning_reference", "", n_bins, 0, time[-1])
+    hist.SetDirectory(0)
+    filled = set()
+    for t, v in zip(time, volt):
+        k = hist.FindBin(t)
+        hist.SetBinContent(k, v)
+        filled.add(k)
+    for k in range(1, int(time[-1] / 10e-12) - 1):
+        if k not in filled:
+            hist.SetBinContent(k, hist.GetBinContent(k - 1))
+    expected = [hist.GetBinContent(i) for i in range(1, n_bins + 1)]
+
+    np.testing.assert_array_equal(_raw_bins(time, volt, n_bins, 10e-12), expected)
+
+
+def fake_rc_ngspice(saturation=None, calls=None):
+    grid = np.arange(0, 20e-9, 1e-12)
+    response = 2e3 * np.exp(-grid / 0.5e-9)
+
+    def run(netlist, input_current_strs, path, label, **kwargs):
+        if calls is not None:
+            calls.append(label)
+        times, volts = [], []
+        for pwl in input_current_strs:
+            points = np.array(pwl.split(","), dtype=np.float64).reshape(-1, 2)
+            current = np.interp(grid, points[:, 0], points[:, 1])
+            volt = 0.1 + np.convolve(current, response)[:len(grid)] * 1e-12 * 1e9
+            if saturation is not None:
+                volt = 0.1 + saturation * np.tanh((volt - 0.1) / saturation)
+            times.append(grid)
+            volts.append(volt)
+        return times, volts
+
+    return run
+
+
+def make_cir_amplifier(monkeypatch, tmp_path, run, amplitude=1e-6):
+    import ROOT
+
+    from raser.core.analog import ngspice
+
+    readout = importlib.import_module("raser.core.analog.readout")
+    monkeypatch.setattr(ngspice, "_IMPULSE_CACHE", {})
+    monkeypatch.setattr(ngspice, "_LINEARITY_STATE", {})
+    monkeypatch.setattr(ngspice, "run_ngspice_batch", run)
+    monkeypatch.setattr(readout, "run_ngspice_batch", run)
+    monkeypatch.setattr(readout, "output", lambda *args: str(tmp_path))
+
+    def build(scale=1.0):
+        currents = []
+        for i in range(2):
+            current = ROOT.TH1F(f"cir_source_{id(currents)}_{i}", "", 200, 0.0, 2e-9)
+            current.SetDirectory(0)
+            for j in range(20, 40):
+                current.SetBinContent(j + 10 * i, -scale * amplitude * np.sin(np.pi * (j - 20) / 20))
+            currents.append(current)
+        return readout.Amplifier(currents, "ucsc", spice_mode="linear"), currents
+
+    return build
+
+
+def test_linear_spice_mode_reuses_impulse_response(monkeypatch, tmp_path):
+    from raser.core.analog import ngspice
+
+    calls = []
+    build = make_cir_amplifier(monkeypatch, tmp_path, fake_rc_ngspice(calls=calls))
+
+    first, currents = build()
+    second, _ = build(scale=2.0)
+
+    assert [label.startswith("impulse_") for label in calls] == [True, False]
+    assert calls[1].endswith("_check")
+    assert list(tmp_path.glob("impulse_*.npz"))
+    assert not list(tmp_path.glob("*.tmp"))
+    assert first.waveform_axis == (200, 0.0, 2e-9)
+    np.testing.assert_allclose(second.amplified_waveforms - 100, 2 * (first.amplified_waveforms - 100), rtol=1e-9, atol=1e-9)
+    grid = np.arange(0, 20e-9, 1e-12)
+    _, full = fake_rc_ngspice()(None, ngspice.set_ngspice_input(currents), "", "")
+    for i in range(2):
+        expected = 1e3 * np.interp(np.arange(200) * 1e-11, grid, full[i])
+        np.testing.assert_allclose(first.amplified_waveforms[i], expected, rtol=0, atol=0.02 * np.abs(expected - 100).max())
+
+    monkeypatch.setattr(ngspice, "_IMPULSE_CACHE", {})
+    calls.clear()
+    build()
+    assert not any(label.startswith("impulse_") for label in calls)
+
+
+def test_linear_spice_mode_keeps_current_axis_after_nonlinear_fallback(monkeypatch, tmp_path):
+    from raser.core.analog import ngspice
+
+    calls = []
+    run = fake_rc_ngspice(saturation=1e-3, calls=calls)
+    build = make_cir_amplifier(monkeypatch, tmp_path, run, amplitude=1e-5)
+
+    amplifiers = [build(scale=scale) for scale in (1.0, 0.5, 2.0)]
+
+    (key,) = ngspice._LINEARITY_STATE
+    assert not ngspice.is_linear(key)
+    assert len(calls) == 4 and calls[1].endswith("_check")
+    assert not any(label.endswith("_check") or label.startswith("impulse_") for label in calls[2:])
+    grid = np.arange(0, 20e-9, 1e-12)
+    for amplifier, currents in amplifiers:
+        assert amplifier.waveform_axis == (200, 0.0, 2e-9)
+        assert amplifier.amplified_waveforms.shape == (2, 200)
+        _, full = run(None, ngspice.set_ngspice_input(currents), "", "")
+        expected = np.stack([1e3 * np.interp(np.arange(200) * 1e-11, grid, volt) for volt in full])
+        np.testing.assert_allclose(amplifier.amplified_waveforms, expected, rtol=1e-12)
+        assert np.abs(amplifier.amplified_waveforms - 100).max() <= 1.0 + 1e-9
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+from raser.apps.lumi import pileup
+
+
+def write_event(folder, hit_time, label, blocks):
+    lines = []
+    for pixel, currents in blocks.items():
+        lines.append(f"{pixel}:\n")
+        lines += [f"{j * 5e-11} {value}\n" for j, value in enumerate(currents)]
+    (folder / f"{hit_time}_{label}.txt").write_text("".join(lines))
+
+
+def test_bunch_times_follow_the_sampling_time_table():
+    times = pileup.bunch_times()
+
+    assert len(times) == 3 * 268
+    assert times[1] == pytest.approx(600e-9)
+    assert times[268] == pytest.approx(333373e-9)
+
+
+def test_add_shifted_matches_loop(monkeypatch):
+    monkeypatch.setattr(pileup, "ADD_CHUNK", 50)
+    rng = np.random.default_rng(0)
+    templates = rng.normal(size=(30, 12))
+    starts = rng.integers(0, 100, 30)
+    buffer = np.zeros(105)
+
+    pileup.add_shifted(buffer, starts, templates)
+
+    expected = np.zeros(105 + 12)
+    for start, template in zip(starts, templates):
+        expected[start:start + 12] += template
+    np.testing.assert_allclose(buffer, expected[:105])
+
+
+def test_rebin_conserves_charge():
+    rng = np.random.default_rng(7)
+    samples = rng.normal(size=37)
+
+    rebinned = pileup.rebin(samples, 3e-11, 1e-10)
+
+    assert len(rebinned) == 12
+    assert rebinned.sum() * 1e-10 == pytest.approx(samples.sum() * 3e-11)
+    np.testing.assert_allclose(pileup.rebin([1.0, 3.0, 2.0, 2.0], 5e-11, 1e-10), [2.0, 2.0])
+
+
+def test_library_reads_event_folders_once(tmp_path):
+    (tmp_path / "PossionHit.txt").write_text("2 [] 0\n0 999 600\n4 [] 1200\n")
+    (tmp_path / "event_0").mkdir()
+    (tmp_path / "event_1").mkdir()
+    (tmp_path / "event_2").mkdir()
+    write_event(tmp_path / "event_0", 0, "I", {"detector_I_0_1": [0, 2e-6, 1e-6, 0], "detector_I_-1_0": [0, 1e-6]})
+    write_event(tmp_path / "event_2", 1200, "II", {"detector_II_0_0": [0, 4e-6, 0, 0, 0, 0]})
+    write_event(tmp_path / "event_2", 1200, "I", {"detector_I_0_1": [0, 3e-6]})
+
+    library = pileup.CrossingLibrary.from_event_folders(str(tmp_path), t_bin=1e-10)
+
+    assert library.primaries == [2, 0, 4]
+    assert library.recorded_mu == pytest.approx(2.0)
+    assert library.pixels == ["detector_II_0_0", "detector_I_-1_0", "detector_I_0_1"]
+    np.testing.assert_allclose(library.currents("detector_I_0_1"), [[1e-6, 5e-7], [0, 0], [1.5e-6, 0]])
+    np.testing.assert_allclose(library.currents("detector_II_0_0"), [[0, 0, 0], [0, 0, 0], [2e-6, 0, 0]])
+
+
+def make_library():
+    library = pileup.CrossingLibrary(t_bin=1e-9)
+    library.add(library.add_crossing(1), "detector_I_0_0", [1.0, 0.5, 0.25])
+    library.add_crossing(1)
+    library.add(library.add_crossing(1), "detector_I_0_1", [2.0])
+    crossing = library.add_crossing(3)
+    library.add(crossing, "detector_I_0_0", [7.0])
+    library.add(crossing, "detector_I_0_1", [7.0])
+    return library
+
+
+def test_synthesised_train_adds_single_primary_templates_at_bunch_crossings(tmp_path):
+    library = make_library()
+    times = np.arange(50) * 10e-9
+
+    waveforms, hits = pileup.synthesise(library, 3.0, times, duration=500e-9, rng=np.random.default_rng(2))
+
+    assert waveforms.shape == (2, 500) and waveforms.dtype == np.float32
+    np.testing.assert_array_equal(library.single_hits(), [0, 1, 2])
+    rng = np.random.default_rng(2)
+    np.testing.assert_array_equal(hits, rng.poisson(3.0, 50))
+    drawn = rng.integers(3, size=hits.sum())
+    expected = np.zeros((2, 500))
+    for start, template in zip(np.repeat(np.arange(0, 500, 10), hits), drawn):
+        if template == 0:
+            expected[0, start:start + 3] += [1.0, 0.5, 0.25]
+        elif template == 2:
+            expected[1, start] += 2.0
+    np.testing.assert_allclose(waveforms, expected)
+
+    file_path = tmp_path / "pileup.npz"
+    pileup.save_train(file_path, library, 3.0, times, waveforms, hits)
+    with np.load(file_path) as stored:
+        np.testing.assert_array_equal(stored["waveforms"], waveforms)
+        np.testing.assert_array_equal(stored["hits"], hits)
+        assert stored["pixels"].tolist() == library.pixels
+        assert float(stored["mu"]) == 3.0
+
+
+@pytest.mark.parametrize("mu", [0.5, 3.06, 8.0])
+def test_hits_per_bunch_follow_poisson_mu(mu):
+    library = make_library()
+    times = np.arange(4000) * 100e-9
+
+    waveforms, hits = pileup.synthesise(library, mu, times, duration=400e-6, rng=np.random.default_rng(5))
+
+    assert hits.mean() == pytest.approx(mu, rel=0.05)
+    assert hits.var() == pytest.approx(mu, rel=0.1)
+    per_template = waveforms.sum(axis=1, dtype=np.float64) / [1.75, 2.0]
+    assert per_template.sum() / len(times) == pytest.approx(2 * mu / 3, rel=0.08)
+
+
+def test_library_without_single_primary_crossings_is_rejected():
+    library = pileup.CrossingLibrary(t_bin=1e-9)
+    library.add(library.add_crossing(2), "detector_I_0_0", [1.0])
+
+    with pytest.raises(ValueError):
+        pileup.synthesise(library, 1.0, np.zeros(3), duration=10e-9)
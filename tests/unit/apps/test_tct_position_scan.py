@@ -0,0 +1,82 @@
+import csv
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import ROOT
+
+from raser.apps.tct import tct_signal_position_scan as scan
+
+
+pytestmark = pytest.mark.root
+
+
+class FakeDetector(SimpleNamespace):
+    def is_plugin(self):
+        return False
+
+    def gain_rate_cal(self, my_f):
+        raise AssertionError("planar detector must not compute gain")
+
+
+def strip_amplitudes(fx_rel):
+    x = 420 * fx_rel
+    return [np.exp(-((x - 60 - 120 * j) / 90.0) ** 2) + 0.01 for j in range(3)]
+
+
+class FakeCurrent:
+    def __init__(self, my_d, my_f, my_l):
+        self.sum_cu = []
+        for j, amplitude in enumerate(strip_amplitudes(my_l.fx_rel)):
+            hist = ROOT.TH1F(f"position_scan_{id(self)}_{j}", "", 4, 0, 4)
+            hist.SetDirectory(0)
+            hist.SetBinContent(2, -amplitude)
+            hist.SetBinContent(3, 0.5 * amplitude)
+            self.sum_cu.append(hist)
+
+
+class FakeAmplifier:
+    def __init__(self, currents, amplifier_name, CDet=None):
+        self.amplified_waveforms = np.array([
+            [hist.GetBinContent(i) for i in range(1, hist.GetNbinsX() + 1)] for hist in currents
+        ])
+
+
+def test_position_scan_reuses_field_and_writes_one_table(monkeypatch, tmp_path):
+    fields = []
+    lasers = []
+    detector = FakeDetector(
+        device="strip", dimension=2, read_out_contact=[], mesher=None, irradiation_flux=0,
+        bound={}, e_field_mode="difference", field_cache_max_mb=64.0, det_model="strip", amplifier="fake", capacitance=1.0,
+        voltage=-200.0,
+    )
+    laser_dic = {"laser_model": "fake", "pos_start_fx": 0.0, "pos_end_fx": 1.0, "pos_points_num": 20}
+
+    monkeypatch.setattr(scan.bdv, "Detector", lambda name: detector)
+    monkeypatch.setattr(scan.devfield, "DevsimField", lambda *args, **kwargs: fields.append((args, kwargs)) or object())
+    laser_json = tmp_path / "laser.json"
+    laser_json.write_text(json.dumps(laser_dic))
+    monkeypatch.setattr(scan, "component_path", lambda *parts: str(laser_json))
+    monkeypatch.setattr(
+        scan, "LaserInjection",
+        lambda my_d, dic: lasers.append(dic) or SimpleNamespace(fx_rel=dic["fx_rel"], model=dic["laser_model"]),
+    )
+    monkeypatch.setattr(scan.ccrt, "CalCurrentLaser", FakeCurrent)
+    monkeypatch.setattr(scan, "Amplifier", FakeAmplifier)
+    monkeypatch.setattr(scan, "output", lambda *args: str(tmp_path))
+
+    scan.job_main({"det_name": "strip", "voltage": None, "amplifier": None, "laser": "fake", "scan": 1, "job": 0})
+
+    assert len(fields) == 1
+    assert fields[0][0][2] == -200.0
+    assert fields[0][1]["cache_max_mb"] == 64.0
+    assert [dic["fx_rel"] for dic in lasers] == [fx for _, fx in scan.scan_positions(laser_dic)]
+    assert len(lasers) == 18
+
+    with open(tmp_path / "position-scan.csv") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 18
+    assert float(rows[3]["position_um"]) == pytest.approx(63.0)
+    assert float(rows[3]["volt1_mV"]) == pytest.approx(strip_amplitudes(0.15)[1], rel=1e-6)
+    assert (tmp_path / "position_resolution.pdf").exists()
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from raser.apps.telescope.clustering import cluster_hits, neighbour_offsets
+
+
+def reference_clusters(hits, pixelsize_x, pixelsize_y):
+    hits = sorted(hits)
+    limit = pixelsize_x**2 + pixelsize_y**2 + 1e-7
+    seen = set()
+    clusters = []
+    for start in range(len(hits)):
+        if start in seen:
+            continue
+        seen.add(start)
+        stack, members = [start], []
+        while stack:
+            i = stack.pop()
+            members.append(i)
+            for j in range(len(hits)):
+                dx = (hits[i][0] - hits[j][0]) * pixelsize_x
+                dy = (hits[i][1] - hits[j][1]) * pixelsize_y
+                if j not in seen and dx**2 + dy**2 <= limit:
+                    seen.add(j)
+                    stack.append(j)
+        x = sum((hits[i][0] + 0.5) * pixelsize_x for i in members) / len(members)
+        y = sum((hits[i][1] + 0.5) * pixelsize_y for i in members) / len(members)
+        clusters.append((x, y, len(members)))
+    return clusters
+
+
+def test_square_pixels_are_eight_connected():
+    assert sorted(neighbour_offsets(25.0, 25.0)) == [(0, 1), (1, -1), (1, 0), (1, 1)]
+    assert (0, 2) in neighbour_offsets(50.0, 20.0)
+
+
+@pytest.mark.parametrize("pitch", [(25.0, 25.0), (50.0, 20.0)])
+def test_clusters_match_pairwise_search(pitch):
+    rng = np.random.default_rng(4)
+    events = []
+    for _ in range(30):
+        n = rng.integers(0, 25)
+        events.append(sorted({(int(c), int(r)) for c, r in rng.integers(0, 12, (n, 2))}))
+
+    group = np.concatenate([np.full(len(hits), i) for i, hits in enumerate(events)])
+    column = np.concatenate([[c for c, _ in hits] for hits in events])
+    row = np.concatenate([[r for _, r in hits] for hits in events])
+    clusters = cluster_hits(group, column, row, None, *pitch)
+
+    for i, hits in enumerate(events):
+        selected = clusters["group"] == i
+        expected = reference_clusters(hits, *pitch)
+        assert selected.sum() == len(expected)
+        np.testing.assert_allclose(clusters["center_x"][selected], [x for x, _, _ in expected])
+        np.testing.assert_allclose(clusters["center_y"][selected], [y for _, y, _ in expected])
+        np.testing.assert_array_equal(clusters["size"][selected], [n for _, _, n in expected])
+
+
+def test_charge_weighted_centres_and_duplicate_hits():
+    clusters = cluster_hits(
+        [0, 0, 0, 0, 1], [3, 4, 4, 9, 3], [5, 5, 5, 9, 5], [1.0, 2.0, 1.0, 4.0, 3.0], 10.0, 20.0
+    )
+
+    np.testing.assert_array_equal(clusters["group"], [0, 0, 1])
+    np.testing.assert_array_equal(clusters["size"], [3, 1, 1])
+    np.testing.assert_array_equal(clusters["hit_label"], [0, 0, 0, 1, 2])
+    np.testing.assert_allclose(clusters["charge"], [4.0, 4.0, 3.0])
+    assert clusters["center_x"][0] == pytest.approx((35 + 45 + 45) / 3)
+    assert clusters["charge_center_x"][0] == pytest.approx((35 + 2 * 45 + 45) / 4)
+    assert clusters["charge_center_y"][0] == pytest.approx(110.0)
+
+
+def test_large_cluster_is_one_component():
+    column, row = np.meshgrid(np.arange(200), np.arange(200), indexing="ij")
+
+    clusters = cluster_hits(np.zeros(column.size), column.ravel(), row.ravel(), None, 25.0, 25.0)
+
+    np.testing.assert_array_equal(clusters["size"], [40000])
+    assert clusters["center_x"][0] == pytest.approx(100 * 25.0)
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+import ROOT
+
+from raser.apps.telescope.tracking import leave_one_out_residuals, select_tracks, track_chisquare
+
+
+pytestmark = pytest.mark.root
+
+LAYER_Z = np.array([0.0, 20000.0, 40000.0, 120000.0, 140000.0, 160000.0])
+SIGMA = [25.0 / np.sqrt(12), 25.0 / np.sqrt(12)]
+
+
+def root_fit(z, values):
+    graph = ROOT.TGraph()
+    for i, (zi, value) in enumerate(zip(z, values)):
+        graph.SetPoint(i, zi, value)
+    fit_func = ROOT.TF1("tracking_fit", "[0] + [1]*x", 0, 300000)
+    fit_func.SetParameters(400 * 25, 0)
+    graph.Fit(fit_func, "Q")
+    return fit_func.GetParameter(1), fit_func.GetParameter(0)
+
+
+def make_tracks(n_events, rng):
+    slopes = rng.uniform(-0.01, 0.01, (n_events, 1, 2))
+    intercepts = rng.uniform(5000, 8000, (n_events, 1, 2))
+    return slopes * LAYER_Z[:, None] + intercepts + rng.normal(0, 8, (n_events, len(LAYER_Z), 2))
+
+
+def test_leave_one_out_residuals_match_root_fits():
+    positions = make_tracks(5, np.random.default_rng(3))
+    mask = np.ones(positions.shape[:2], dtype=bool)
+
+    residual, chisquare = leave_one_out_residuals(positions, LAYER_Z, mask, SIGMA, 50.0)
+
+    for event in range(5):
+        expected_chisquare = 0.0
+        for dut in range(len(LAYER_Z)):
+            others = np.arange(len(LAYER_Z)) != dut
+            for coord in range(2):
+                slope, intercept = root_fit(LAYER_Z[others], positions[event, others, coord])
+                expected = slope * (LAYER_Z[dut] + 50.0) + intercept - positions[event, dut, coord]
+                assert residual[event, dut, coord] == pytest.approx(expected, abs=1e-6)
+                expected_chisquare += expected**2 / SIGMA[coord] ** 2
+        assert chisquare[event] == pytest.approx(expected_chisquare, rel=1e-9)
+
+
+def test_masked_layers_are_left_out():
+    positions = make_tracks(4, np.random.default_rng(8))
+    mask = np.ones(positions.shape[:2], dtype=bool)
+    mask[1, 2] = False
+    mask[3, :4] = False
+
+    residual, _ = leave_one_out_residuals(positions, LAYER_Z, mask, SIGMA)
+    reference, _ = leave_one_out_residuals(positions[1:2, [0, 1, 3, 4, 5]], LAYER_Z[[0, 1, 3, 4, 5]], mask[0:1, :5], SIGMA)
+
+    assert np.isnan(residual[1, 2]).all()
+    np.testing.assert_allclose(residual[1, [0, 1, 3, 4, 5]], reference[0])
+    assert np.isnan(residual[3]).all()
+
+
+def test_select_tracks_picks_the_straightest_combination():
+    rng = np.random.default_rng(5)
+    tracks = make_tracks(3, rng)
+    clusters = [{layer: [tracks[event, layer].tolist()] for layer in range(6)} for event in range(3)]
+    clusters[1][2] = [[100.0, 100.0], tracks[1, 2].tolist(), [9000.0, 3000.0]]
+    clusters[1][4] = [tracks[1, 4].tolist(), [0.0, 0.0]]
+    clusters[2][5] = []
+    clusters[2][0] = [[1.0, 1.0]] * 7
+
+    positions, mask, events = select_tracks(clusters, LAYER_Z, SIGMA, max_combinations=6)
+
+    np.testing.assert_array_equal(events, [0, 1])
+    np.testing.assert_allclose(positions, tracks[:2])
+    assert mask.all()
+
+    positions, mask, events = select_tracks(clusters, LAYER_Z, SIGMA)
+    np.testing.assert_array_equal(events, [0, 1, 2])
+    np.testing.assert_array_equal(mask[2], [True] * 5 + [False])
+
+
+def test_track_chisquare_is_zero_on_straight_lines():
+    positions = LAYER_Z[None, :, None] * np.array([0.002, -0.001]) + 300.0
+
+    assert track_chisquare(positions, LAYER_Z, np.ones((1, 6), dtype=bool), SIGMA)[0] == pytest.approx(0.0, abs=1e-12)
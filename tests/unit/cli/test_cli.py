@@ -94,6 +94,20 @@ def test_bmos_requires_sensor_before_command(monkeypatch):
     assert called == ["HPK-Si-PiN"]
 
 
+def test_lumi_pileup_passes_mu_values(monkeypatch):
+    called = []
+
+    def fake_import_module(name, package=None):
+        return SimpleNamespace(main=lambda mu: called.append(mu))
+
+    monkeypatch.setattr(importlib, "import_module", fake_import_module)
+
+    assert raser.main(["lumi", "pileup", "--mu", "1", "3.06"]) == 0
+    assert raser.main(["lumi", "pileup"]) == 0
+
+    assert called == [[1.0, 3.06], None]
+
+
 def test_bmos_rejects_legacy_command_without_sensor():
     with pytest.raises(SystemExit) as excinfo:
         raser.main(["bmos", "GetSignal"])
@@ -1,5 +1,6 @@
 from types import SimpleNamespace
 
+import numpy as np
 import pytest
 
 import raser.core.current.carrier as carrier_module
@@ -93,3 +94,61 @@ def test_drift_can_skip_full_path_while_keeping_reduced_path(monkeypatch):
 
     assert system.paths == []
     assert len(system.paths_reduced[0]) == 2
+
+
+class ZeroNormalGenerator:
+    def normal(self, loc, scale, size):
+        return np.zeros(size)
+
+
+def make_system(detector, positions, drift_mode, rng=None):
+    return carrier_module.VectorizedCarrierSystem(
+        positions,
+        [-10.0] * len(positions),
+        [0] * len(positions),
+        [[] for _ in positions],
+        "Si",
+        "electron",
+        detector.read_out_contact,
+        detector,
+        drift_mode=drift_mode,
+        rng=rng,
+    )
+
+
+@pytest.mark.root
+def test_array_drift_matches_scalar_drift_without_diffusion(monkeypatch):
+    detector = make_detector()
+    detector.vector_max_steps = 50
+    field = FakePlanarField(detector.l_z)
+    monkeypatch.setattr(carrier_module.random, "gauss", lambda mu, sigma: 0.0)
+    positions = [[50.0, 50.0, 5.0], [20.0, 70.0, 25.0], [80.0, 10.0, 45.0]]
+
+    scalar = make_system(detector, positions, "scalar")
+    array = make_system(detector, positions, "array", rng=ZeroNormalGenerator())
+    scalar.drift_batch(detector, field, delta_t=detector.vector_delta_t)
+    array.drift_batch(detector, field, delta_t=detector.vector_delta_t)
+
+    assert np.allclose(array.positions, scalar.positions)
+    assert array.end_conditions.tolist() == scalar.end_conditions.tolist()
+    for array_path, scalar_path in zip(array.paths_reduced, scalar.paths_reduced):
+        assert np.allclose(array_path, scalar_path)
+
+
+@pytest.mark.root
+def test_array_drift_diffusion_is_seeded_and_has_expected_spread():
+    detector = make_detector()
+    detector.vector_random_seed = 7
+    field = FakePlanarField(detector.l_z)
+    positions = [[50.0, 50.0, 25.0]] * 4000
+
+    first = make_system(detector, positions, "array")
+    second = make_system(detector, positions, "array")
+    first.drift_batch(detector, field, delta_t=detector.vector_delta_t)
+    second.drift_batch(detector, field, delta_t=detector.vector_delta_t)
+
+    assert np.array_equal(first.positions, second.positions)
+    mu = first.mobility(300.0, 1.0e12, -10.0, 2.0e4)
+    sigma = np.sqrt(2.0 * first.kboltz * 300.0 * mu * detector.vector_delta_t) * 1e4
+    assert np.std(first.positions[:, 0]) == pytest.approx(sigma, rel=0.05)
+    assert np.mean(first.positions[:, 0]) == pytest.approx(50.0, abs=5 * sigma / np.sqrt(4000))
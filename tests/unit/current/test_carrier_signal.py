@@ -0,0 +1,91 @@
+import math
+from types import SimpleNamespace
+
+import pytest
+
+from raser.core.current.carrier import VectorizedCarrierSystem
+
+
+pytestmark = pytest.mark.root
+
+E0 = 1.60217733e-19
+
+
+class FakeSignalField:
+    def get_w_p_cached(self, x, y, z, electrode_idx):
+        return z / 50.0 + 0.001 * x + 0.002 * y + 0.1 * electrode_idx
+
+    def get_trap_h_cached(self, x, y, z):
+        return 1.0e9 * (1.0 + z / 50.0)
+
+    def get_trap_e_cached(self, x, y, z):
+        return 2.0e9
+
+
+class FakeSignalDetector(SimpleNamespace):
+    def is_plugin(self):
+        return False
+
+
+def make_system(read_out_contact, charges):
+    detector = FakeSignalDetector(
+        dimension=3, l_x=150.0, l_y=150.0, l_z=50.0, p_x=50.0, p_y=50.0,
+        x_ele_num=3, y_ele_num=3, read_ele_num=3, read_out_contact=read_out_contact,
+        field_shift_x=0.0, field_shift_y=0.0, material="Si", irradiation_model="trap",
+    )
+    system = VectorizedCarrierSystem(
+        [[75.0, 75.0, 10.0]] * len(charges), charges, [0] * len(charges), [[]] * len(charges),
+        "Si", "hole", read_out_contact, detector,
+    )
+    system.paths_reduced = [
+        [[10.0, 20.0, 10.0, 0, 1, 1], [12.0, 21.0, 20.0, 1, 1, 1], [-24.0, 22.0, 30.0, 2, 2, 1]],
+        [[0.0, 0.0, 5.0, 0, 1, 1]],
+        [[5.0, 5.0, 40.0, 0, 0, 2], [6.0, 4.0, 45.0, 3, 0, 2]],
+    ]
+    return system, detector
+
+
+def expected_signals(path, charge, x_shift, y_shift, electrode_idx, delta_t):
+    field = FakeSignalField()
+    signals = []
+    exponent = 0.0
+    for start, end in zip(path[:-1], path[1:]):
+        dn_x = (end[4] - start[4]) * 50.0
+        dn_y = (end[5] - start[5]) * 50.0
+        u_1 = field.get_w_p_cached(start[0] - x_shift + dn_x, start[1] - y_shift + dn_y, start[2], electrode_idx)
+        u_2 = field.get_w_p_cached(end[0] - x_shift + dn_x, end[1] - y_shift + dn_y, end[2], electrode_idx)
+        exponent += field.get_trap_h_cached(*start[:3]) * (end[3] - start[3]) * delta_t
+        signals.append(charge * math.exp(-exponent) * E0 * (u_2 - u_1))
+    return signals
+
+
+def test_single_contact_signal_matches_segment_by_segment_ramo_sum():
+    system, detector = make_system([{"name": "top", "x_span": 1, "y_span": 0}], [1.0, 2.0, 3.0])
+
+    system.get_signal_batch(detector, FakeSignalField(), delta_t=1e-10)
+
+    assert system.signals[1] == []
+    for carrier_idx in (0, 2):
+        path = system.paths_reduced[carrier_idx]
+        for j in range(3):
+            expected = expected_signals(path, system.charges[carrier_idx], (j - 1) * 50.0, 0.0, 0, 1e-10)
+            assert system.signals[carrier_idx][j] == pytest.approx(expected, rel=1e-12)
+
+    segments = system.segment_signals
+    assert segments["electrodes"].tolist() == [0, 1, 2]
+    for j in range(3):
+        assert segments["signals"][j].tolist() == system.signals[0][j] + system.signals[2][j]
+    assert len(segments["nodes"]) == segments["signals"].shape[1]
+
+
+def test_multi_contact_signal_is_stored_per_carrier_and_electrode():
+    contacts = [{"name": "a", "x_span": 0, "y_span": 0}, {"name": "b", "x_span": 0, "y_span": 0}]
+    system, detector = make_system(contacts, [1.0, 2.0, 3.0])
+
+    system.get_signal_batch(detector, FakeSignalField(), delta_t=1e-10)
+
+    unshifted_path = [point[:4] + [0, 0] for point in system.paths_reduced[0]]
+    for electrode_idx in range(2):
+        expected = expected_signals(unshifted_path, 1.0, 0.0, 0.0, electrode_idx, 1e-10)
+        assert system.signals[0][electrode_idx] == pytest.approx(expected, rel=1e-12)
+    assert len(system.signals[2]) == 2
@@ -0,0 +1,148 @@
+import re
+
+import numpy as np
+import pytest
+import ROOT
+
+from raser.core.analog import ngspice
+from raser.core.current import cross_talk as ct
+
+
+pytestmark = pytest.mark.root
+
+T_BIN = 1e-11
+N_BINS = 300
+GAINS = (0.8, -0.15, 0.04)
+TAUS = (5e-11, 2e-10, 4e-10)
+
+CIR = """.title cross talk
+R3 main 0 1kOhm
+R2 left_1 0 1kOhm
+R5 left_2 0 1kOhm
+I1 0 IN PULSE( 0 0.3uA 1n 10p 3n 10p )
+C1 IN main 1p
+.control
+tran 10p 4n
+wrdata output/cross_talk.raw v(main)/1k v(left_1)/1k v(left_2)/1k
+.endc
+.end
+"""
+
+
+def network_response(pwl):
+    values = np.array(pwl.split(","), dtype=np.float64)
+    grid = np.arange(int(4e-9 / T_BIN) + 1) * T_BIN
+    current = np.interp(grid, values[0::2], values[1::2], right=0.0)
+    outputs = []
+    for gain, tau in zip(GAINS, TAUS):
+        decay = np.exp(-T_BIN / tau)
+        out = np.zeros_like(current)
+        previous = 0.0
+        for n in range(len(current)):
+            out[n] = previous = decay * previous + gain * (1 - decay) * current[n]
+        outputs.append(out + 1e-9)
+    return grid, outputs
+
+
+def fake_ngspice(calls, original=ct.subprocess.run):
+    def run(command, **kwargs):
+        if "ngspice" not in str(command):
+            return original(command, **kwargs)
+        calls.append(command)
+        with open(command[-1].split()[-1]) as f:
+            text = f.read()
+        pwl = re.search(r"PWL\((.*)\)", text).group(1)
+        raw = re.search(r"wrdata (\S+)", text).group(1)
+        grid, outputs = network_response(pwl)
+        np.savetxt(raw, np.column_stack([column for out in outputs for column in (grid, out)]))
+
+    return run
+
+
+def make_currents(n_electrodes):
+    rng = np.random.default_rng(6)
+    currents = []
+    for i in range(n_electrodes):
+        hist = ROOT.TH1F(f"cross_talk_input_{i}", "", N_BINS, 0, N_BINS * T_BIN)
+        hist.SetDirectory(0)
+        t = np.arange(N_BINS)
+        values = -rng.uniform(0, 2e-6) * np.exp(-0.5 * ((t - rng.uniform(20, 80)) / 8.0) ** 2)
+        for j, value in enumerate(values, start=1):
+            hist.SetBinContent(j, float(value))
+        currents.append(hist)
+    return currents
+
+
+@pytest.fixture
+def cir(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(ct, "_COUPLING_CACHE", {})
+    monkeypatch.setattr(ct.subprocess, "run", fake_ngspice(calls))
+    monkeypatch.setattr(ct, "output", lambda *args: str(tmp_path))
+    path = tmp_path / "strip_cross_talk.cir"
+    path.write_text(CIR)
+    return str(path), calls
+
+
+def test_linear_cross_talk_matches_coupled_network(cir):
+    cir_path, calls = cir
+    currents = make_currents(5)
+
+    result = ct.cross_talk("strip", cir_path, currents, mode="linear")
+
+    responses = [network_response(pwl)[1] for pwl in ngspice.set_ngspice_input(currents)]
+    for j in range(5):
+        expected = np.zeros(N_BINS)
+        for i in range(5):
+            if abs(i - j) < len(GAINS):
+                expected += responses[i][abs(i - j)][:N_BINS]
+        actual = [result[j].GetBinContent(k) for k in range(1, N_BINS + 1)]
+        np.testing.assert_allclose(actual, expected, rtol=1e-4, atol=1e-3 * np.abs(expected).max())
+    assert result[0].GetXaxis().GetXmax() == pytest.approx(N_BINS * T_BIN)
+    assert len(calls) == 1
+
+
+def test_linear_and_transient_cross_talk_agree(cir):
+    cir_path, calls = cir
+    currents = make_currents(5)
+
+    transient = ct.cross_talk("strip", cir_path, currents)
+    linear = ct.cross_talk("strip", cir_path, currents, mode="linear")
+
+    assert len(calls) == 6
+    for j in range(5):
+        expected = np.array([transient[j].GetBinContent(k) for k in range(1, N_BINS - 1)])
+        actual = np.array([linear[j].GetBinContent(k) for k in range(1, N_BINS - 1)])
+        np.testing.assert_allclose(actual, expected, atol=1e-4 * np.abs(expected).max())
+
+
+def test_coupling_matrix_is_stored_next_to_the_cir(cir, tmp_path):
+    cir_path, calls = cir
+    baseline, kernels, _ = ct.coupling_matrix(cir_path, 4, T_BIN, str(tmp_path))
+
+    assert kernels.shape[:2] == (4, 4)
+    np.testing.assert_array_equal(kernels[0, 3], 0)
+    np.testing.assert_allclose(kernels[1, 2], kernels[2, 1])
+    np.testing.assert_allclose(baseline[0, :3], 1e-9)
+    assert len(list(tmp_path.glob("strip_cross_talk_coupling_*.npz"))) == 1
+
+    ct._COUPLING_CACHE.clear()
+    stored_baseline, stored_kernels, _ = ct.coupling_matrix(cir_path, 4, T_BIN, str(tmp_path))
+
+    assert len(calls) == 1
+    np.testing.assert_array_equal(stored_kernels, kernels)
+    np.testing.assert_array_equal(stored_baseline, baseline)
+
+
+def test_cross_talk_many_handles_event_batches():
+    rng = np.random.default_rng(1)
+    kernels = rng.normal(size=(3, 3, 40))
+    baseline = rng.normal(size=(3, 3))
+    samples = rng.normal(size=(4, 3, 500))
+
+    result = ct.cross_talk_many(samples, baseline, kernels)
+
+    for event in range(4):
+        for j in range(3):
+            expected = sum(np.convolve(samples[event, i], kernels[j, i])[:500] for i in range(3)) + baseline[j].sum()
+            np.testing.assert_allclose(result[event, j], expected, atol=1e-9)
@@ -1,5 +1,6 @@
 from types import SimpleNamespace
 
+import numpy as np
 import pytest
 import ROOT
 
@@ -29,9 +30,11 @@ def test_system_current_histogram_matches_root_fill_for_fixed_signal_input():
         [0.0, 0.0, 3.0, 3, 0, 0],
     ]
     carrier_system = SimpleNamespace(
-        positions=[[0.0, 0.0, 0.0]],
-        signals=[[fixed_signals]],
-        paths_reduced=[fixed_path],
+        segment_signals={
+            "electrodes": np.array([0]),
+            "signals": np.array([fixed_signals]),
+            "nodes": np.array(fixed_path[:-1]),
+        },
     )
 
     signals_found = current._process_system_current(
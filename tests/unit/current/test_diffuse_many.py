@@ -0,0 +1,87 @@
+import random
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import ROOT
+
+from raser.core.current import cal_current_diffuse as diffuse
+
+
+pytestmark = pytest.mark.root
+
+
+def make_detector():
+    return SimpleNamespace(
+        l_x=250.0, l_y=125.0, l_z=50.0, material="Si", temperature=300.0,
+        doping={"Donors": "1e12", "Acceptors": "0"},
+    )
+
+
+def loop_diffusion(x, y, z, charge, my_d):
+    rows = []
+    for i in range(len(x)):
+        electron = diffuse.CarrierCluster(x[i], y[i], z[i], 0, charge[i], 1)
+        if electron.diffuse_not_in_sensor(my_d):
+            continue
+        while not electron.diffuse_not_in_sensor(my_d) and electron.t <= diffuse.t_end:
+            electron.diffuse_single_step(my_d)
+            electron.diffuse_end()
+        row, column, _ = electron.pixel_position(my_d)
+        if row != -1 and column != -1:
+            rows.append((row, column))
+    return rows
+
+
+def test_diffuse_many_matches_carrier_loop_statistics():
+    my_d = make_detector()
+    n = 200
+    x = np.full(n, 100.0)
+    y = np.full(n, 50.0)
+    z = np.full(n, 25.0)
+    charge = -np.ones(n)
+    random.seed(3)
+
+    expected = loop_diffusion(x, y, z, charge, my_d)
+    row, column, collected = diffuse.diffuse_many(x, y, z, charge, my_d, np.random.default_rng(3))
+
+    assert len(row) == pytest.approx(len(expected), rel=0.2)
+    expected_rows = np.array(expected)
+    for value in (3.0, 4.0):
+        assert np.mean(row == value) == pytest.approx(np.mean(expected_rows[:, 0] == value), abs=0.1)
+        assert np.mean(column == value - 2) == pytest.approx(np.mean(expected_rows[:, 1] == value - 2), abs=0.1)
+    np.testing.assert_array_equal(collected, np.ones(len(row)))
+
+
+def test_diffuse_many_end_conditions():
+    my_d = make_detector()
+    x = np.array([12.5, 3.0, 100.0])
+    y = np.array([12.5, 50.0, 60.0])
+    z = np.array([10.0, 10.0, 0.0])
+
+    row, column, charge = diffuse.diffuse_many(x, y, z, [-2.0, -3.0, -4.0], my_d, np.random.default_rng(0))
+
+    assert 4.0 in charge.tolist()
+    assert 2.0 not in charge.tolist()
+    assert len(charge) <= 2
+
+
+def test_pixel_matrix_matches_th2f_fill():
+    rng = np.random.default_rng(1)
+    row = rng.integers(0, 11, 500).astype(float)
+    column = rng.integers(0, 6, 500).astype(float)
+    charge = rng.uniform(0, 0.3, 500)
+    Xbins, Ybins = 10, 5
+
+    matrix = diffuse.pixel_charge_matrix(row, column, charge, Xbins, Ybins)
+    hist = ROOT.TH2F("diffuse_matrix_reference", "", Xbins, 0, float(Xbins), Ybins, 0, float(Ybins))
+    hist.SetDirectory(0)
+    for r, c, q in zip(row, column, charge):
+        hist.Fill(r, c, q)
+
+    expected = [[hist.GetBinContent(x, y) for y in range(Ybins + 2)] for x in range(Xbins + 2)]
+    np.testing.assert_array_equal(matrix, expected)
+    index, fired = diffuse.CalCurrentDiffuse.pixel_fired(None, matrix, Xbins, Ybins)
+    expected_index = [[x, y] for x in range(Xbins) for y in range(Ybins) if hist.GetBinContent(x, y) > 0.2]
+    assert index == expected_index
+    assert fired == [hist.GetBinContent(x, y) for x, y in expected_index]
@@ -1,8 +1,9 @@
 import math
 
+import numpy as np
 import pytest
 
-from raser.core.current.model import Material
+from raser.core.current.model import Material, MobilityTable
 
 
 def test_silicon_defaults_are_configured():
@@ -86,3 +87,51 @@ def test_avalanche_coefficient_rejects_unknown_model():
 
     with pytest.raises(ValueError, match="Unsupported avalanche model"):
         material.cal_coefficient(3e5, -1, 300)
+
+
+@pytest.mark.parametrize(
+    ("material_name", "mobility_model"),
+    [("Si", None), ("Si", "Reggiani"), ("SiC", None)],
+)
+def test_array_mobility_matches_scalar_mobility(material_name, mobility_model):
+    material = Material(material_name, mobility_model=mobility_model)
+    doping = np.array([1e12, -3e14, 1e16, 5e17])
+    charge = np.array([-1, 1, -1, 1])
+    field = np.array([1e2, 1e3, 3e4, 2e5])
+
+    values = material.cal_mobility_many(300, doping, charge, field)
+
+    expected = [
+        material.cal_mobility(300, n, q, e) for n, q, e in zip(doping, charge, field)
+    ]
+    assert values == pytest.approx(expected, rel=1e-12)
+
+
+@pytest.mark.parametrize(
+    ("material_name", "avalanche_model"),
+    [("Si", None), ("Si", "Okuto"), ("SiC", None)],
+)
+def test_array_coefficient_matches_scalar_coefficient(material_name, avalanche_model):
+    material = Material(material_name, avalanche_model=avalanche_model)
+    field = np.array([5e3, 5e4, 1.5e5, 3e5, 6e5, 3e5])
+    charge = np.array([-1, 1, -1, 1, 1, -1])
+
+    values = material.cal_coefficient_many(field, charge, 280)
+
+    expected = [material.cal_coefficient(e, q, 280) for e, q in zip(field, charge)]
+    assert values == pytest.approx(expected, rel=1e-12)
+
+
+@pytest.mark.parametrize("mobility_model", [None, "Reggiani"])
+def test_mobility_table_interpolates_analytic_mobility(mobility_model):
+    material = Material("Si", mobility_model=mobility_model)
+    table = MobilityTable(material, 300)
+    doping = np.array([1e12, -3e14, 1e16, -5e17, 2e12, 1e12])
+    charge = np.array([-1, 1, -1, 1, 1, -1])
+    field = np.array([1e2, 1e3, 3e4, 2e5, 7e3, 2e6])
+
+    values = table(300, doping, charge, field)
+
+    expected = material.cal_mobility_many(300, doping, charge, field)
+    assert values == pytest.approx(expected, rel=1e-3)
+    assert values[-1] == expected[-1]
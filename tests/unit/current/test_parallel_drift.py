@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from raser.core.current.carrier import VectorizedCarrierSystem
+from raser.core.current.parallel_drift import chunk_seed, drift_systems_parallel, fork_available
+from raser.core.current.signal_stream import SignalStream
+
+
+pytestmark = [
+    pytest.mark.root,
+    pytest.mark.skipif(not fork_available(), reason="parallel drift needs the fork start method"),
+]
+
+STREAM_ARGS = (9, 40, -0.5e-9, 1.5e-9, 5.0e-11, 5.0e-11, 1e-20)
+
+
+class FakePixelField:
+    def get_e_field_cached(self, x, y, z):
+        return (3.0e3, -2.0e3, 2.0e4)
+
+    def get_doping_cached(self, x, y, z):
+        return 1.0e12
+
+    def get_w_p_cached(self, x, y, z, electrode_idx):
+        return float(np.clip((z / 50.0) * np.exp(-((x - 25) ** 2 + (y - 25) ** 2) / 900.0), 0, 1))
+
+
+class FakePixelDetector(SimpleNamespace):
+    def is_plugin(self):
+        return False
+
+
+def make_pixel_detector():
+    return FakePixelDetector(
+        dimension=3, det_model="pixel", l_x=150.0, l_y=150.0, l_z=50.0, p_x=50.0, p_y=50.0,
+        x_ele_num=3, y_ele_num=3, read_ele_num=9,
+        read_out_contact=[{"name": "top", "x_span": 1, "y_span": 1}],
+        field_shift_x=0.0, field_shift_y=0.0, material="Si", irradiation_model=None,
+        vector_max_steps=40, vector_min_field_strength=0.1, vector_boundary_tolerance=0.1,
+        vector_drift_mode="array", vector_random_seed=3,
+    )
+
+
+def make_positions():
+    rng = np.random.default_rng(1)
+    return np.column_stack([rng.uniform(40, 110, 20), rng.uniform(40, 110, 20), rng.uniform(5, 45, 20)])
+
+
+def make_systems(detector):
+    positions = make_positions().tolist()
+    return [
+        VectorizedCarrierSystem(
+            positions, [sign * float(i + 1) for i in range(20)], [0] * 20, [[]] * 20,
+            "Si", carrier_type, detector.read_out_contact, detector,
+        )
+        for carrier_type, sign in (("electron", -1.0), ("hole", 1.0))
+    ]
+
+
+def run_parallel(workers):
+    detector = make_pixel_detector()
+    systems = make_systems(detector)
+    drift_systems_parallel(systems, detector, FakePixelField(), 5.0e-11, STREAM_ARGS, workers, 7)
+    return systems
+
+
+def test_parallel_drift_is_independent_of_worker_count():
+    serial = run_parallel(1)
+    parallel = run_parallel(3)
+
+    for expected, system in zip(serial, parallel):
+        np.testing.assert_array_equal(system.positions, expected.positions)
+        np.testing.assert_array_equal(system.end_conditions, expected.end_conditions)
+        np.testing.assert_array_equal(system.signal_stream.accumulator, expected.signal_stream.accumulator)
+        assert system.signal_stream.signals_found == expected.signal_stream.signals_found > 0
+        assert system.paths.stacked()[0].shape == expected.paths.stacked()[0].shape
+
+
+def test_parallel_drift_merges_chunk_accumulators():
+    detector = make_pixel_detector()
+    field = FakePixelField()
+    hole = run_parallel(2)[1]
+
+    positions = make_positions()
+    charges = np.arange(1.0, 21.0)
+    accumulator = np.zeros_like(hole.signal_stream.accumulator)
+    for chunk_idx, start in enumerate(range(0, 20, 7)):
+        rows = slice(start, start + 7)
+        stream = SignalStream(detector, field, *STREAM_ARGS)
+        system = VectorizedCarrierSystem(
+            positions[rows], charges[rows], [0] * len(charges[rows]), [[]] * len(charges[rows]),
+            "Si", "hole", detector.read_out_contact, detector,
+            rng=np.random.default_rng(chunk_seed(3, "hole", chunk_idx)), signal_stream=stream,
+        )
+        system.drift_batch(detector, field, delta_t=5.0e-11)
+        accumulator += stream.accumulator
+        np.testing.assert_array_equal(hole.positions[rows], system.positions)
+
+    np.testing.assert_allclose(hole.signal_stream.accumulator, accumulator, rtol=1e-12)
+    nodes, counts = hole.paths.stacked()
+    assert counts.sum() == len(nodes) and np.all(counts >= 1)
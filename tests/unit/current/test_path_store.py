@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from raser.core.current.path_store import REDUCED_PATH_DTYPES
+from raser.core.current.path_store import PathStore
+from raser.core.current.path_store import segment_starts
+from raser.core.current.path_store import stack_paths
+
+
+def test_path_store_groups_interleaved_steps_by_carrier_across_chunks():
+    store = PathStore(3, REDUCED_PATH_DTYPES, chunk_rows=4)
+
+    store.append([0, 1, 2], [0.5, 1.5, 2.5], [0.0, 0.0, 0.0], [1.0, 2.0, 3.0], 0, [1, 1, 2], [0, 0, 0])
+    store.append([2, 0], [2.6, 0.6], [0.1, 0.1], [3.5, 1.5], 1, [2, 1], [0, 0])
+    store.append_row(0, (0.7, 0.2, 2.0, 2, -1, 3))
+
+    nodes, counts = store.stacked()
+
+    assert counts.tolist() == [3, 1, 2]
+    assert store[0].tolist() == [
+        [0.5, 0.0, 1.0, 0.0, 1.0, 0.0],
+        [0.6, 0.1, 1.5, 1.0, 1.0, 0.0],
+        [0.7, 0.2, 2.0, 2.0, -1.0, 3.0],
+    ]
+    assert store[-1][:, 0].tolist() == [2.5, 2.6]
+    assert len(nodes) == 6
+    assert [len(path) for path in store] == [3, 1, 2]
+    assert store.nbytes == 2 * 4 * (4 + 3 * 8 + 4 + 2 * 2)
+
+
+def test_stack_paths_accepts_plain_lists_and_segment_starts_skip_path_ends():
+    nodes, counts = stack_paths([[[0.0, 1.0], [0.0, 2.0]], [], [[1.0, 3.0]], [[2.0, 4.0], [2.0, 5.0], [2.0, 6.0]]])
+
+    assert counts.tolist() == [2, 0, 1, 3]
+    assert nodes[:, 1].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+    assert segment_starts(counts).tolist() == [0, 3, 4]
+    with pytest.raises(IndexError):
+        PathStore(1, REDUCED_PATH_DTYPES)[1]
+    assert np.array_equal(PathStore(2, REDUCED_PATH_DTYPES).stacked()[1], [0, 0])
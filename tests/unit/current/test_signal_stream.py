@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import ROOT
+
+from raser.core.current.cal_current import CalCurrent, t_tol
+from raser.core.current.carrier import VectorizedCarrierSystem
+from raser.core.current.signal_stream import SignalStream
+
+
+pytestmark = pytest.mark.root
+
+
+class FakePixelField:
+    def get_e_field_cached(self, x, y, z):
+        return (3.0e3, -2.0e3, 2.0e4)
+
+    def get_doping_cached(self, x, y, z):
+        return 1.0e12
+
+    def get_w_p_cached(self, x, y, z, electrode_idx):
+        return float(np.clip((z / 50.0) * np.exp(-((x - 25) ** 2 + (y - 25) ** 2) / 900.0), 0, 1))
+
+    def get_trap_h_cached(self, x, y, z):
+        return 1.0e9 * (1 + z / 50.0)
+
+    def get_trap_e_cached(self, x, y, z):
+        return 2.0e9 * (1 + x / 50.0)
+
+
+class FakePixelDetector(SimpleNamespace):
+    def is_plugin(self):
+        return False
+
+
+def make_pixel_detector():
+    return FakePixelDetector(
+        dimension=3, det_model="pixel", l_x=150.0, l_y=150.0, l_z=50.0, p_x=50.0, p_y=50.0,
+        x_ele_num=3, y_ele_num=3, read_ele_num=9,
+        read_out_contact=[{"name": "top", "x_span": 1, "y_span": 1}],
+        field_shift_x=0.0, field_shift_y=0.0, material="Si", irradiation_model="trap",
+        vector_max_steps=40, vector_min_field_strength=0.1, vector_boundary_tolerance=0.1,
+        vector_drift_mode="array", vector_random_seed=3,
+    )
+
+
+def make_current(name):
+    current = object.__new__(CalCurrent)
+    current.read_ele_num = 9
+    current.n_bin = 40
+    current.t_start = -0.5e-9
+    current.t_end = 1.5e-9
+    current.t_bin = (current.t_end - current.t_start) / current.n_bin
+    current.delta_t = 5.0e-11
+    current.positive_cu = [
+        ROOT.TH1F(f"{name}_{id(current)}_{i}", "", current.n_bin, current.t_start, current.t_end)
+        for i in range(current.read_ele_num)
+    ]
+    return current
+
+
+def make_system(detector, signal_stream=None):
+    rng = np.random.default_rng(1)
+    positions = np.column_stack([rng.uniform(40, 110, 20), rng.uniform(40, 110, 20), rng.uniform(5, 45, 20)])
+    return VectorizedCarrierSystem(
+        positions.tolist(), [float(i + 1) for i in range(20)], [0] * 20, [[]] * 20,
+        "Si", "hole", detector.read_out_contact, detector, signal_stream=signal_stream,
+    )
+
+
+def histogram_contents(current):
+    return np.array([
+        [hist.GetBinContent(i) for i in range(current.n_bin + 2)] for hist in current.positive_cu
+    ])
+
+
+def test_streamed_current_matches_stored_path_current():
+    detector = make_pixel_detector()
+    field = FakePixelField()
+
+    stored = make_current("stored")
+    system = make_system(detector)
+    system.drift_batch(detector, field, delta_t=stored.delta_t)
+    system.get_signal_batch(detector, field)
+    stored_found = stored._process_system_current(system, 3, 3, 1, 1, 9, "hole")
+
+    streamed = make_current("streamed")
+    stream = SignalStream(
+        detector, field, streamed.read_ele_num, streamed.n_bin, streamed.t_start, streamed.t_end,
+        streamed.t_bin, streamed.delta_t, t_tol,
+    )
+    streamed_system = make_system(detector, signal_stream=stream)
+    streamed_system.drift_batch(detector, field, delta_t=streamed.delta_t)
+    streamed_found = streamed._process_system_current(streamed_system, 3, 3, 1, 1, 9, "hole")
+
+    np.testing.assert_allclose(streamed_system.positions, system.positions)
+    assert streamed_found == stored_found > 0
+    np.testing.assert_allclose(histogram_contents(streamed), histogram_contents(stored), rtol=1e-9, atol=1e-30)
+    assert streamed_system.paths_reduced.stacked()[0].shape[0] == 20
+
+
+def test_streamed_current_drops_full_paths_by_default(monkeypatch):
+    monkeypatch.setattr(CalCurrent, "_run_current_calculation", lambda *args: None)
+    detector = make_pixel_detector()
+
+    assert CalCurrent(detector, None, [], []).keep_drift_paths
+
+    detector.vector_signal_mode = "stream"
+    assert not CalCurrent(detector, None, [], []).keep_drift_paths
+    assert CalCurrent(detector, None, [], [], keep_drift_paths=True).keep_drift_paths
@@ -1,3 +1,4 @@
+import os
 import pickle
 
 import numpy as np
@@ -45,3 +46,45 @@ def test_weighting_potential_uses_numeric_voltage_resolution(tmp_path, monkeypat
         result = pickle.load(file)
     assert result["metadata"] == {"dimension": 1, "voltage": 1}
     assert result["values"].tolist() == [2.0, 3.0]
+
+
+def test_field_grid_round_trip_is_memory_mapped(tmp_path):
+    pickle_path = tmp_path / "Potential_200V.pkl"
+    _write_field(pickle_path, np.array([1.0, 2.0]))
+    axes = (np.array([0.0, 1.0, 2.0]), np.array([0.0, 0.5]))
+    values = np.arange(6.0).reshape(3, 2)
+
+    assets.save_field_grid(pickle_path, axes, values, {"dimension": 2, "voltage": np.int64(200)})
+    loaded_axes, loaded_values, metadata = assets.load_field_grid(pickle_path)
+
+    assert [axis.tolist() for axis in loaded_axes] == [axis.tolist() for axis in axes]
+    assert isinstance(loaded_values, np.memmap)
+    assert loaded_values.tolist() == values.tolist()
+    assert metadata == {"dimension": 2, "voltage": 200}
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "Potential_200V.npy",
+        "Potential_200V.npz",
+        "Potential_200V.pkl",
+    ]
+
+
+def test_field_grid_older_than_pickle_is_ignored(tmp_path):
+    pickle_path = tmp_path / "Potential_200V.pkl"
+    _write_field(pickle_path, np.array([1.0, 2.0]))
+    assets.save_field_grid(pickle_path, (np.array([0.0, 1.0]),), np.array([1.0, 2.0]), {"dimension": 1})
+    grid_mtime = min(path.stat().st_mtime for path in assets.field_grid_paths(pickle_path))
+    os.utime(pickle_path, (grid_mtime + 10, grid_mtime + 10))
+
+    assert assets.load_field_grid(pickle_path) is None
+    assert assets.load_field_grid(tmp_path / "Missing_200V.pkl") is None
+
+
+def test_field_grid_with_other_resampling_key_is_ignored(tmp_path):
+    pickle_path = tmp_path / "Potential_200V.pkl"
+    _write_field(pickle_path, np.array([1.0, 2.0]))
+    key = {"bins_2d": [200, 200]}
+    assets.save_field_grid(pickle_path, (np.array([0.0, 1.0]),), np.array([1.0, 2.0]), {"dimension": 1}, key)
+
+    assert assets.load_field_grid(pickle_path, {"bins_2d": [200, 200]}) is not None
+    assert assets.load_field_grid(pickle_path, {"bins_2d": [100, 200]}) is None
+    assert assets.load_field_grid(pickle_path) is None
@@ -0,0 +1,137 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from raser.core.field.devsim_field import DevsimField
+from raser.supports.math import get_common_interpolate_1d
+from raser.supports.math import get_common_interpolate_2d
+from raser.supports.math import get_common_interpolate_3d
+
+
+pytestmark = pytest.mark.root
+
+
+def _grid_data(dimension, function):
+    axes = [np.linspace(0.0, 0.01, 6)] * dimension
+    points = np.array(np.meshgrid(*axes, indexing="ij")).reshape(dimension, -1).T
+    values = np.array([function(*point) for point in points])
+    if dimension == 1:
+        return {"points": points[:, 0], "values": values}
+    return {"points": points, "values": values}
+
+
+def make_field(dimension, is_plugin=False, mesher=None):
+    interpolate = {
+        1: get_common_interpolate_1d,
+        2: get_common_interpolate_2d,
+        3: get_common_interpolate_3d,
+    }[dimension]
+    field = DevsimField.__new__(DevsimField)
+    field.dimension = dimension
+    field.is_plugin = is_plugin
+    field.mesher = mesher
+    field._cache_stats = {"fallbacks": 0}
+    field.e_field_grid = None
+    field.Potential = interpolate(_grid_data(dimension, lambda *c: 100.0 * sum((i + 1) * v for i, v in enumerate(c))))
+    field.Doping = interpolate(_grid_data(dimension, lambda *c: 1e12 + 1e14 * c[0]))
+    field.WeightingPotential = [interpolate(_grid_data(dimension, lambda *c: 50.0 * c[-1]))]
+    field.TrappingRate_p = interpolate(_grid_data(dimension, lambda *c: 1e8 * (1.0 + c[0])))
+    field.TrappingRate_n = interpolate(_grid_data(dimension, lambda *c: 2e8 * (1.0 + c[0])))
+    return field
+
+
+@pytest.mark.parametrize(
+    ("dimension", "is_plugin", "mesher"),
+    [(1, False, None), (2, False, None), (2, True, None), (3, False, None), (3, False, "sde")],
+)
+def test_batch_queries_match_single_point_queries(dimension, is_plugin, mesher):
+    field = make_field(dimension, is_plugin, mesher)
+    xyz = np.array([[12.0, 31.0, 44.0], [63.0, 7.0, 18.0], [25.0, 55.0, 71.0]])
+
+    e_field = field.get_e_field_many(xyz)
+    doping = field.get_doping_many(xyz)
+    w_p = field.get_w_p_many(xyz, 0)
+    trap_h = field.get_trap_h_many(xyz)
+    trap_e = field.get_trap_e_many(xyz)
+
+    assert e_field.shape == (3, 3)
+    for row, (x, y, z) in enumerate(xyz):
+        assert e_field[row] == pytest.approx(np.ravel(field._get_e_field(x, y, z)).astype(float), rel=1e-6)
+        assert doping[row] == pytest.approx(float(np.ravel(field._get_doping(x, y, z))[0]))
+        assert w_p[row] == pytest.approx(float(np.ravel(field._get_w_p(x, y, z, 0))[0]))
+        assert trap_h[row] == pytest.approx(float(np.ravel(field._get_trap_h(x, y, z))[0]))
+        assert trap_e[row] == pytest.approx(float(np.ravel(field._get_trap_e(x, y, z))[0]))
+
+
+def test_batch_weighting_potential_is_clipped_like_single_point_query():
+    field = make_field(1)
+    field.WeightingPotential = [get_common_interpolate_1d({"points": [0.0, 0.01], "values": [-1.0, 2.0]})]
+
+    w_p = field.get_w_p_many([[0.0, 0.0, 0.0], [0.0, 0.0, 100.0]], 0)
+
+    assert w_p.tolist() == [0.0, 1.0]
+
+
+@pytest.mark.parametrize(
+    ("dimension", "is_plugin", "mesher"),
+    [(1, False, None), (2, False, None), (2, True, None), (3, False, None), (3, False, "sde")],
+)
+def test_grid_e_field_matches_finite_difference_for_linear_potential(dimension, is_plugin, mesher):
+    field = make_field(dimension, is_plugin, mesher)
+    xyz = np.array([[12.0, 31.0, 44.0], [0.0, 0.0, 0.0], [100.0, 100.0, 100.0]])
+    expected = field.get_e_field_many(xyz)
+
+    field.set_e_field_grid()
+    e_field = field.get_e_field_many(xyz)
+
+    assert field.e_field_grid is not None
+    assert e_field[0] == pytest.approx(expected[0], rel=1e-6)
+    assert e_field[1] == pytest.approx(expected[0], rel=1e-6)
+    assert e_field[2] == pytest.approx(expected[0], rel=1e-6)
+    assert np.ravel(field._get_e_field(*xyz[0])).astype(float) == pytest.approx(expected[0], rel=1e-6)
+
+
+@pytest.mark.parametrize("dimension", [1, 2, 3])
+def test_load_field_reuses_compiled_grid(tmp_path, dimension):
+    field = make_field(dimension)
+    data = _grid_data(dimension, lambda *c: 100.0 * sum((i + 1) * v for i, v in enumerate(c)))
+    data["metadata"] = {"dimension": dimension, "voltage": 200}
+    pickle_path = tmp_path / "Potential_200V.pkl"
+    with open(pickle_path, "wb") as file:
+        pickle.dump(data, file)
+
+    metadata, built = field._load_field(pickle_path)
+    pickle_path.write_bytes(b"")
+    os.utime(pickle_path, (0, 0))
+    reloaded_metadata, reloaded = field._load_field(pickle_path)
+
+    args = [np.array([0.001, 0.0042, 0.009])] * dimension
+    assert reloaded_metadata == metadata
+    assert isinstance(reloaded.grid[1], np.memmap)
+    assert reloaded.many(*args) == pytest.approx(built.many(*args))
+    assert reloaded(*[a[1] for a in args]) == pytest.approx(built(*[a[1] for a in args]))
+
+
+def test_cached_queries_report_per_quantity_stats():
+    field = make_field(1)
+    field.bounds = {"x": (0, 100), "y": (0, 100), "z": (0, 100)}
+    field.resolution = {"x": 10000.0, "y": 10000.0, "z": 0.05}
+    field.read_out_contact = [{"name": "top"}]
+    field.cache_max_mb = 1
+    field._cache_stats = {"errors": 0, "fallbacks": 0}
+    field._init_caches()
+
+    first = field.get_e_field_cached(10.0, 10.0, 50.0)
+    second = field.get_e_field_cached(10.0, 10.0, 50.0)
+    field.get_w_p_cached(10.0, 10.0, 50.0, 0)
+    stats = field.get_cache_stats()
+
+    assert second == pytest.approx(np.ravel(first).astype(float))
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["e_field"]["mode"] == "dense"
+    assert stats["e_field"]["entries"] == 1
+    assert stats["w_p"][0]["misses"] == 1
+    assert stats["doping"]["entries"] == 0
@@ -0,0 +1,46 @@
+import numpy as np
+
+from raser.core.field.voxel_cache import VoxelCache
+
+
+def test_dense_cache_uses_preallocated_arrays():
+    cache = VoxelCache(lower=(0, 0, -2), shape=(2, 3, 4), width=3, max_bytes=1024**2)
+
+    assert cache.get((1, 2, -1)) is None
+    cache.put((1, 2, -1), (np.array([1.0]), 2.0, np.float64(3.0)))
+    cache.put((5, 0, 0), (4.0, 5.0, 6.0))
+
+    assert cache.mode == "dense"
+    assert cache.values.shape == (2, 3, 4, 3)
+    assert cache.get((1, 2, -1)) == (1.0, 2.0, 3.0)
+    assert cache.get((5, 0, 0)) is None
+    assert len(cache) == 1
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 2
+
+
+def test_cache_falls_back_to_bounded_lru_when_grid_exceeds_memory_cap():
+    cache = VoxelCache(lower=(0, 0, 0), shape=(1000, 1000, 1000), max_bytes=2 * 256)
+
+    cache.put((0, 0, 0), 1.0)
+    cache.put((0, 0, 1), 2.0)
+    assert cache.get((0, 0, 0)) == 1.0
+    cache.put((0, 0, 2), 3.0)
+
+    stats = cache.get_stats()
+    assert stats["mode"] == "lru"
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    assert cache.get((0, 0, 1)) is None
+    assert cache.get((0, 0, 0)) == 1.0
+
+
+def test_unbounded_grid_uses_lru_and_clear_empties_cache():
+    cache = VoxelCache(max_bytes=1024)
+
+    cache.put((1, 2, 3), np.array(0.5))
+    cache.clear()
+
+    assert cache.mode == "lru"
+    assert len(cache) == 0
+    assert cache.get((1, 2, 3)) is None
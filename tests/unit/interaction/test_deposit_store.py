@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from raser.core.interaction.carrier_list import CarrierListFromG4P
+from raser.core.interaction.deposit_store import G4DepositReplay, deposit_file, deposit_key, save_deposits
+
+
+def make_detector(l_z=100.0):
+    return SimpleNamespace(l_x=1000.0, l_y=500.0, l_z=l_z, device_dict={"material": "Si", "voltage": -200})
+
+
+def make_g4(my_d):
+    p_steps = [
+        [[-10.5, 3.25, 0.0], [-10.0, 3.5, 20.0], [-9.5, 3.75, 40.0]],
+        [[0, 0, 0]],
+        [[1.0, 2.0, 3.0]],
+    ]
+    return SimpleNamespace(
+        geant4_model="time_resolution",
+        g4_dic={"geant4_model": "time_resolution", "total_events": 3, "par_energy": 2.28, "g4_vis": False},
+        eventIDs=[0, 1, 2],
+        edep_devices=[0.03, 0.0, 1e-3],
+        p_steps=p_steps,
+        energy_steps=[[0.01, 0.01, 0.01], [0], [1e-3]],
+        events_angles=[1.5, None, 9999],
+        p_steps_current=[
+            [[step[0] + my_d.l_x / 2, step[1] + my_d.l_y / 2, step[2]] for step in p_step] for p_step in p_steps
+        ],
+    )
+
+
+def test_deposit_key_ignores_voltage_and_visualization():
+    my_d = make_detector()
+    g4_dic = {"geant4_model": "time_resolution", "total_events": 3}
+
+    key, _ = deposit_key(my_d, g4_dic, 30)
+    other_voltage = make_detector()
+    other_voltage.device_dict["voltage"] = -500
+
+    assert deposit_key(other_voltage, dict(g4_dic, g4_vis_driver="VRML2FILE"), 30)[0] == key
+    assert deposit_key(my_d, g4_dic, 31)[0] != key
+    assert deposit_key(make_detector(l_z=50.0), g4_dic, 30)[0] != key
+    assert deposit_key(my_d, dict(g4_dic, total_events=4), 30)[0] != key
+
+
+def test_deposit_key_follows_the_imported_gdml_content(tmp_path):
+    gdml = tmp_path / "board.gdml"
+    gdml.write_text("<gdml><solids/></gdml>")
+    my_d = make_detector()
+    g4_dic = {"geant4_model": "gdml_import", "gdml": {"file": str(gdml)}}
+
+    key, _ = deposit_key(my_d, g4_dic, 30)
+    assert deposit_key(my_d, g4_dic, 30)[0] == key
+    gdml.write_text("<gdml><solids><box/></solids></gdml>")
+
+    assert deposit_key(my_d, g4_dic, 30)[0] != key
+    assert '"geometry": null' in deposit_key(my_d, {"geant4_model": "time_resolution"}, 30)[1]
+
+
+def test_replay_serves_the_recorded_events(tmp_path):
+    my_d = make_detector()
+    my_g4 = make_g4(my_d)
+    path = deposit_file(tmp_path, my_d, my_g4.g4_dic, 30)
+
+    save_deposits(path, my_g4, my_d, 30)
+    replay = G4DepositReplay(my_d, my_g4.g4_dic, path)
+
+    for name in ("eventIDs", "edep_devices", "p_steps", "energy_steps", "events_angles", "p_steps_current"):
+        assert getattr(replay, name) == getattr(my_g4, name), name
+    np.testing.assert_array_equal(replay.entry_points[0], [-10.5, 3.25, 0.0])
+    np.testing.assert_array_equal(replay.exit_points[0], [-9.5, 3.75, 40.0])
+    assert replay.geant4_model == "time_resolution"
+    assert not list(tmp_path.glob("*.tmp"))
+
+    carriers = CarrierListFromG4P("Si", replay, 0)
+    expected = CarrierListFromG4P("Si", my_g4, 0)
+    assert carriers.track_position == expected.track_position
+    assert carriers.ionized_pairs == expected.ionized_pairs
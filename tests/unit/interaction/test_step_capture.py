@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from raser.core.interaction.step_buffers import captured_steps
+
+pytestmark = pytest.mark.root
+
+
+class FakeCapture:
+    def __init__(self, positions, edep):
+        import ROOT
+
+        self.positions = ROOT.std.vector("double")(positions)
+        self.edep = ROOT.std.vector("double")(edep)
+
+    def Positions(self):
+        return self.positions
+
+    def Edep(self):
+        return self.edep
+
+    def TotalEdep(self):
+        return sum(self.edep)
+
+
+def test_captured_steps_copies_event_buffers():
+    capture = FakeCapture([1.0, 2.0, 3.0, 4.0, 5.0, 6.0], [0.25, 0.5])
+
+    positions, energy, total = captured_steps(capture)
+
+    np.testing.assert_array_equal(positions, [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+    np.testing.assert_array_equal(energy, [0.25, 0.5])
+    assert total == 0.75
+    capture.positions.clear()
+    assert positions[0, 0] == 1.0
+
+
+def test_captured_steps_handles_events_without_device_steps():
+    positions, energy, total = captured_steps(FakeCapture([], []))
+
+    assert positions.shape == (0, 3) and energy.shape == (0,) and total == 0.0
+
+
+@pytest.fixture
+def g4b():
+    return pytest.importorskip("g4ppyy")
+
+
+def slab_setup(g4b):
+    class SlabConstruction(g4b.G4VUserDetectorConstruction):
+        def Construct(self):
+            nist = g4b.G4NistManager.Instance()
+            self.solids = [
+                g4b.G4Box("world", 1 * g4b.mm, 1 * g4b.mm, 1 * g4b.mm),
+                g4b.G4Box("Device", 0.5 * g4b.mm, 0.5 * g4b.mm, 50 * g4b.um),
+            ]
+            self.world = g4b.G4LogicalVolume(self.solids[0], nist.FindOrBuildMaterial("G4_Galactic"), "world")
+            self.device = g4b.G4LogicalVolume(self.solids[1], nist.FindOrBuildMaterial("G4_Si"), "Device")
+            self.device_placement = g4b.G4PVPlacement(
+                g4b.cppyy.nullptr, g4b.G4ThreeVector(0, 0, 0), self.device, "Device", self.world, False, 0, True
+            )
+            self.world_placement = g4b.G4PVPlacement(
+                g4b.cppyy.nullptr, g4b.G4ThreeVector(0, 0, 0), self.world, "world", g4b.cppyy.nullptr, False, 0, True
+            )
+            return self.world_placement
+
+    class ProtonGun(g4b.G4VUserPrimaryGeneratorAction):
+        def __init__(self):
+            super().__init__()
+            self.gun = g4b.G4ParticleGun(1)
+            self.gun.SetParticleDefinition(g4b.G4ParticleTable.GetParticleTable().FindParticle("proton"))
+            self.gun.SetParticleEnergy(100 * g4b.MeV)
+            self.gun.SetParticlePosition(g4b.G4ThreeVector(0, 0, -0.9 * g4b.mm))
+            self.gun.SetParticleMomentumDirection(g4b.G4ThreeVector(0, 0, 1))
+
+        def GeneratePrimaries(self, event):
+            self.gun.GeneratePrimaryVertex(event)
+
+    return SlabConstruction(), ProtonGun()
+
+
+def run_events(g4b, run_manager, capture, n_events, seed, actions):
+    from raser.core.interaction import stepping_action
+    from raser.core.interaction.event_action import GeneralEventAction
+
+    records = {"ids": [], "edep": [], "steps": [], "energy": [], "angles": []}
+    event_action = GeneralEventAction(
+        None, [0, 0, -900], [0, 0, 900], records["ids"], records["edep"], records["steps"], records["energy"],
+        records["angles"], step_capture=capture,
+    )
+    stepping = capture if capture is not None else stepping_action.GeneralSteppingAction(event_action)
+    actions += [event_action, stepping]
+    run_manager.SetUserAction(event_action)
+    run_manager.SetUserAction(stepping)
+    g4b.cppyy.gbl.CLHEP.HepRandom.setTheSeed(seed)
+    run_manager.BeamOn(n_events)
+    return records
+
+
+def test_compiled_capture_records_the_same_device_steps_as_python(g4b):
+    from raser.core.interaction import stepping_action
+
+    run_manager = g4b.G4RunManager.GetRunManager() or g4b.G4RunManager()
+    construction, gun = slab_setup(g4b)
+    run_manager.SetUserInitialization(construction)
+    run_manager.SetUserInitialization(g4b.FTFP_BERT())
+    run_manager.SetUserAction(gun)
+    run_manager.Initialize()
+
+    actions = [gun]
+    capture = stepping_action.device_step_capture()
+    expected = run_events(g4b, run_manager, None, 3, 11, actions)
+    captured = run_events(g4b, run_manager, capture, 3, 11, actions)
+    repeated = run_events(g4b, run_manager, capture, 3, 11, actions)
+
+    assert type(capture).__name__ == "DeviceStepCapture"
+    assert captured["ids"] == expected["ids"] == [0, 1, 2]
+    for records in (captured, repeated):
+        assert all(len(steps) > 1 for steps in records["steps"])
+        for steps, energy, expected_steps, expected_energy in zip(
+            records["steps"], records["energy"], expected["steps"], expected["energy"]
+        ):
+            np.testing.assert_allclose(steps, expected_steps)
+            np.testing.assert_allclose(energy, expected_energy)
+        np.testing.assert_allclose(records["edep"], expected["edep"])
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+import ROOT
+
+from raser.core.metrics import batch_metrics
+from raser.core.metrics import waveform_stats
+
+
+pytestmark = pytest.mark.root
+
+N_BINS = 60
+THRESHOLD = 5.0
+
+
+def make_waveforms(n_events, n_electrodes):
+    rng = np.random.default_rng(11)
+    t = np.arange(N_BINS)
+    amplitudes = rng.uniform(0, 60, (n_events, n_electrodes, 1))
+    peaks = rng.uniform(0, N_BINS, (n_events, n_electrodes, 1))
+    widths = rng.uniform(1, 8, (n_events, n_electrodes, 1))
+    waveforms = -amplitudes * np.exp(-0.5 * ((t - peaks) / widths) ** 2)
+    waveforms += rng.normal(0, 2, waveforms.shape)
+    waveforms[::7, 0] = 0
+    waveforms[::5, :, :4] = 30
+    waveforms[::9, :, -3:] = -70
+    return waveforms.astype(np.float32)
+
+
+def make_hist(values):
+    hist = ROOT.TH1F(f"batch_metrics_{id(values)}", "", N_BINS, 0, 6e-9)
+    hist.SetDirectory(0)
+    for i, value in enumerate(values, start=1):
+        hist.SetBinContent(i, float(value))
+    return hist
+
+
+def scalar_metrics(hist):
+    amplitude, peak_bin = waveform_stats.get_amplitude(hist)
+    if amplitude < THRESHOLD:
+        return [0.0, peak_bin, None, 0.0, 0.0, None]
+    return [
+        amplitude,
+        peak_bin,
+        waveform_stats.get_ToA(hist, THRESHOLD, peak_bin),
+        waveform_stats.get_ToT(hist, THRESHOLD, peak_bin),
+        waveform_stats.get_charge(hist),
+        waveform_stats.get_CFD50(hist, batch_metrics.CFD, peak_bin),
+    ]
+
+
+def test_electrode_metrics_match_bin_by_bin_metrics():
+    waveforms = make_waveforms(40, 3)
+    centers = 0.05e-9 + 0.1e-9 * np.arange(N_BINS)
+
+    metrics = batch_metrics.electrode_metrics(waveforms, centers, THRESHOLD)
+
+    names = ("amplitude", "peak_bin", "ToA", "ToT", "charge", batch_metrics.CFD_LABEL)
+    for event in range(40):
+        for electrode in range(3):
+            expected = scalar_metrics(make_hist(waveforms[event, electrode]))
+            for name, value in zip(names, expected):
+                result = metrics[name][event, electrode]
+                if value is None:
+                    assert np.isnan(result), (event, electrode, name)
+                else:
+                    assert result == pytest.approx(value, rel=1e-9, abs=1e-20), (event, electrode, name)
+
+
+@pytest.mark.parametrize("threshold", [0.0, 10.0])
+def test_cluster_matches_list_clustering(threshold):
+    rng = np.random.default_rng(2)
+    values = np.where(rng.random((200, 5)) < 0.5, 0.0, rng.uniform(0, 30, (200, 5)))
+
+    total, center, size = batch_metrics.cluster(values, threshold)
+
+    for row, amp_list in enumerate(values.tolist()):
+        expected_total = waveform_stats.get_total_amp(amp_list, threshold)
+        expected_center, expected_size = waveform_stats.get_gravity_center_and_cluster_size(amp_list, threshold)
+        if expected_total is None:
+            assert np.isnan(total[row]) and np.isnan(center[row]) and size[row] == 0
+        else:
+            assert total[row] == pytest.approx(expected_total)
+            assert center[row] == pytest.approx(expected_center)
+            assert size[row] == expected_size
+
+
+def test_event_metrics_marks_silent_events():
+    electrodes = {
+        "amplitude": np.array([[1.0, 2.0], [0.0, 40.0]]),
+        "ToA": np.array([[np.nan, 1e-9], [np.nan, 2e-9]]),
+        "ToT": np.array([[0.0, 0.0], [0.0, 3e-9]]),
+        "charge": np.array([[1.0, 3.0], [0.0, 50.0]]),
+        batch_metrics.CFD_LABEL: np.array([[np.nan, np.nan], [np.nan, 1.5e-9]]),
+    }
+
+    data = batch_metrics.event_metrics(electrodes, 10.0, [50.0, 150.0], 100.0)
+
+    assert np.isnan(data["amplitude"][0]) and data["cluster_size_amplitude"][0] == 0
+    assert data["amplitude"][1] == 40.0
+    assert data["ToA"][1] == 2e-9
+    assert data["gravity_center_amplitude"][1] == 1.0
+    assert data["gravity_center_amplitude_error"][1] == pytest.approx(-0.5)
+    assert data["cluster_size_ToT"][1] == 0
+    np.testing.assert_array_equal(data["original_x"], [50.0, 150.0])
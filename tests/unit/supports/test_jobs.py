@@ -1,4 +1,6 @@
+import os
 import subprocess
+import time
 
 import pytest
 
@@ -40,3 +42,38 @@ def test_local_job_uses_current_python_module(monkeypatch):
             {"shell": False, "check": True},
         )
     ]
+
+
+def _prepare_worker(kwargs):
+    return {"output": kwargs["output"], "pid": os.getpid(), "prepared": time.time_ns()}
+
+
+def _run_worker_job(context, index):
+    with open(os.path.join(context["output"], "%s.txt" % index), "w") as f:
+        f.write("%s %s" % (context["pid"], context["prepared"]))
+
+
+def test_persistent_jobs_prepare_once_per_worker(tmp_path):
+    jobs.run_persistent_jobs(_prepare_worker, _run_worker_job, {"output": str(tmp_path)}, 6, max_processes=2)
+
+    contexts = {(tmp_path / ("%s.txt" % index)).read_text() for index in range(6)}
+    assert 1 <= len(contexts) <= 2
+    assert len({context.split()[0] for context in contexts}) == len(contexts)
+
+
+def test_indexed_jobs_use_persistent_worker_when_given(monkeypatch):
+    calls = []
+    monkeypatch.setattr(jobs, "run_persistent_jobs", lambda *args: calls.append(args))
+    monkeypatch.setattr(jobs.subprocess, "run", lambda *args, **kwargs: calls.append("subprocess"))
+
+    jobs.run_indexed_jobs(
+        ("signal",),
+        ["HPK-Si-PiN"],
+        3,
+        use_cluster=False,
+        mem=1,
+        destination="signal",
+        worker=(_prepare_worker, _run_worker_job, {"output": "out"}),
+    )
+
+    assert calls == [(_prepare_worker, _run_worker_job, {"output": "out"}, 3)]
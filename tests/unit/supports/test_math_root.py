@@ -28,6 +28,22 @@ def test_calculate_gradient_uses_finite_difference():
     )
 
 
+def test_batched_gradient_retries_one_sided_at_grid_edges():
+    from raser.supports.math import calculate_gradient
+    from raser.supports.math import calculate_gradient_many
+    from raser.supports.math import get_common_interpolate_1d
+
+    interpolate = get_common_interpolate_1d(
+        {"points": [0.0, 1.0, 2.0], "values": [0.0, 10.0, 40.0]}
+    )
+    points = [0.0, 0.5, 1.5, 2.0]
+
+    gradient = calculate_gradient_many(interpolate.many, [points])
+
+    expected = [calculate_gradient(interpolate, ["z"], [point])[0] for point in points]
+    assert gradient[0] == pytest.approx(expected)
+
+
 def test_common_interpolate_1d_reuses_constructed_interpolator():
     from raser.supports.math import get_common_interpolate_1d
 
@@ -0,0 +1,137 @@
+from array import array
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import ROOT
+
+from raser.core.metrics.waveform_stats import WaveformStatistics
+from raser.supports.waveform_columns import (
+    WAVEFORM_STAGES,
+    WaveformColumnSink,
+    bin_centers,
+    hist_bin_array,
+    read_waveform_axis,
+    read_waveform_blocks,
+)
+
+
+pytestmark = pytest.mark.root
+
+N_BINS = 50
+T_START = 0.0
+T_END = 5e-9
+
+
+def make_hist(name, values):
+    hist = ROOT.TH1F(name, name, N_BINS, T_START, T_END)
+    hist.SetDirectory(0)
+    for i, value in enumerate(values, start=1):
+        hist.SetBinContent(i, float(value))
+    return hist
+
+
+def make_events(n_events, read_ele_num=3):
+    rng = np.random.default_rng(5)
+    t = np.arange(N_BINS)
+    events = []
+    for event in range(n_events):
+        peak = rng.uniform(10, 30)
+        amplitudes = rng.uniform(0, 80, read_ele_num)
+        waveforms = -amplitudes[:, None] * np.exp(-0.5 * ((t - peak) / 4.0) ** 2)
+        par_in = rng.uniform(0, 300, 3)
+        events.append((event, float(amplitudes.sum()), par_in, par_in + 1.0, waveforms))
+    return events
+
+
+def write_columns(path, events, read_ele_num=3, row_group_size=4):
+    sink = WaveformColumnSink(
+        path, read_ele_num, N_BINS, T_START, T_END,
+        run_info={"voltage": -200.0, "amplifier": "fake"}, row_group_size=row_group_size,
+    )
+    for event, e_dep, par_in, par_out, waveforms in events:
+        hists = [make_hist(f"col_{event}_{i}", waveforms[i]) for i in range(read_ele_num)]
+        sink.fill(event, e_dep, par_in, par_out, {stage: hists for stage in WAVEFORM_STAGES})
+    sink.close()
+
+
+def write_th1f_tree(path, events, read_ele_num=3):
+    root_file = ROOT.TFile(str(path), "RECREATE")
+    tree = ROOT.TTree("tree", "Waveform Data")
+    par_in_array = array("d", [0.0, 0.0, 0.0])
+    par_out_array = array("d", [0.0, 0.0, 0.0])
+    tree.Branch("par_in", par_in_array, "par_in[3]/D")
+    tree.Branch("par_out", par_out_array, "par_out[3]/D")
+    amplified = [make_hist(f"amplified_waveform_{i}", np.zeros(N_BINS)) for i in range(read_ele_num)]
+    for i in range(read_ele_num):
+        tree.Branch(f"amplified_waveform_{i}", amplified[i])
+    for _, _, par_in, par_out, waveforms in events:
+        par_in_array[0], par_in_array[1], par_in_array[2] = par_in
+        par_out_array[0], par_out_array[1], par_out_array[2] = par_out
+        for i in range(read_ele_num):
+            for j, value in enumerate(waveforms[i], start=1):
+                amplified[i].SetBinContent(j, float(value))
+        tree.Fill()
+    tree.Write()
+    root_file.Close()
+
+
+def test_hist_bin_array_reads_th1f_and_th1d():
+    values = np.linspace(-1, 1, N_BINS)
+    th1d = ROOT.TH1D("bin_array_d", "", N_BINS, T_START, T_END)
+    th1d.SetDirectory(0)
+    for i, value in enumerate(values, start=1):
+        th1d.SetBinContent(i, value)
+
+    np.testing.assert_array_equal(hist_bin_array(make_hist("bin_array_f", values)), values.astype(np.float32))
+    np.testing.assert_allclose(hist_bin_array(th1d, dtype=np.float64), values)
+
+
+def test_column_sink_round_trips_blocks(tmp_path):
+    events = make_events(11)
+    path = tmp_path / "signal_0.root"
+    write_columns(path, events)
+
+    root_file = ROOT.TFile(str(path), "READ")
+    axis = read_waveform_axis(root_file)
+    blocks = list(read_waveform_blocks(root_file, ("event", "par_in", "amplified_waveform", "current"), block_size=4))
+    root_file.Close()
+
+    assert (axis["read_ele_num"], axis["n_bins"], axis["t_start"], axis["t_end"]) == (3, N_BINS, T_START, T_END)
+    assert axis["voltage"] == -200.0 and axis["amplifier"] == "fake"
+    assert bin_centers(axis)[0] == pytest.approx(0.05e-9)
+    assert [len(block["event"]) for block in blocks] == [4, 4, 3]
+    waveforms = np.concatenate([block["amplified_waveform"] for block in blocks])
+    assert waveforms.dtype == np.float32 and waveforms.shape == (11, 3, N_BINS)
+    np.testing.assert_array_equal(waveforms, np.array([event[4] for event in events], dtype=np.float32))
+    np.testing.assert_array_equal(np.concatenate([block["current"] for block in blocks]), waveforms)
+    np.testing.assert_array_equal(np.concatenate([block["event"] for block in blocks]), np.arange(11))
+    np.testing.assert_allclose(np.concatenate([block["par_in"] for block in blocks]), [event[2] for event in events])
+
+
+def test_column_sink_rejects_other_binning(tmp_path):
+    sink = WaveformColumnSink(tmp_path / "signal_0.root", 1, N_BINS, T_START, T_END)
+    hist = ROOT.TH1F("other_binning", "", N_BINS + 1, T_START, T_END)
+    hist.SetDirectory(0)
+
+    with pytest.raises(ValueError, match="binning differs"):
+        sink.fill(0, 0.0, (0, 0, 0), (0, 0, 0), {stage: [hist] for stage in WAVEFORM_STAGES})
+    sink.close()
+
+
+def test_waveform_statistics_reads_columns_like_th1f_trees(tmp_path):
+    events = make_events(12)
+    (tmp_path / "th1f").mkdir()
+    (tmp_path / "columnar").mkdir()
+    write_th1f_tree(tmp_path / "th1f" / "signal_0.root", events)
+    write_columns(tmp_path / "columnar" / "signal_0.root", events)
+
+    def detector():
+        return SimpleNamespace(det_model="strip", read_ele_num=3, p_x=100.0, l_y=1000.0)
+
+    expected = WaveformStatistics.from_batch(tmp_path / "th1f", detector(), 5.0, 10.0)
+    columnar = WaveformStatistics.from_batch(tmp_path / "columnar", detector(), 5.0, 10.0)
+
+    assert columnar.data.keys() == expected.data.keys()
+    for key, values in expected.data.items():
+        assert columnar.data[key] == pytest.approx(values, nan_ok=True), key